@@ -0,0 +1,581 @@
+# local mock of the shopify admin api for the benchmarks; serves orders, products and
+# customers from /admin/api/2020-04/{orders,products,customers}.json with link header
+# cursor pagination and count.json, with optional latency and leaky bucket rate limiting,
+# and /admin/api/2020-04/graphql.json for bulk operations and the metafields of records
+#
+# usage: python benchmarks/mock_shopify.py [--port 8000] [--latency 0.05] [--rate-limit]
+#
+# then use http://localhost:8000 as the api_base_uri of the shopify connection
+
+import re
+import json
+import time
+import base64
+import random
+import argparse
+import threading
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+START = datetime(2020, 1, 1, tzinfo=timezone(timedelta(hours=-5)))
+
+def get_timestamp(seconds):
+    return (START + timedelta(seconds=seconds)).isoformat()
+
+def get_address(rnd, i):
+    return {
+        'id': i, 'first_name': 'First%d' % i, 'last_name': 'Last%d' % i, 'name': 'First%d Last%d' % (i, i),
+        'phone': '555-%04d' % (i % 10000), 'company': rnd.choice(['Acme', 'Globex', None]),
+        'address1': '%d Main St' % (i % 1000), 'address2': rnd.choice(['', 'Suite 100']), 'city': 'Toronto',
+        'province': 'Ontario', 'province_code': 'ON', 'zip': 'M5V 2T6', 'country': 'Canada', 'country_code': 'CA',
+        'country_name': 'Canada', 'latitude': '43.6%04d' % (i % 10000), 'longitude': '-79.3%04d' % (i % 10000)
+    }
+
+def get_orders(count, line_items=5, seed=1):
+    rnd = random.Random(seed)
+    orders = []
+    for i in range(count):
+        order_id = 1000000 + i
+        items = [{
+            'id': order_id * 100 + j, 'product_id': rnd.randint(1, 1000), 'variant_id': rnd.randint(1, 100000),
+            'title': 'Product %d' % j, 'variant_title': 'Variant %d' % j, 'sku': 'SKU-%d' % j, 'vendor': 'Vendor',
+            'quantity': rnd.randint(1, 5), 'price': '%.2f' % rnd.uniform(1, 100), 'total_discount': '0.00',
+            'grams': 100, 'taxable': True, 'requires_shipping': True, 'fulfillable_quantity': 0,
+            'fulfillment_status': ['fulfilled', 'partial', None][j % 3], 'gift_card': False, 'properties': [], 'tax_lines': []
+        } for j in range(line_items)]
+        total = sum(float(item['price']) * item['quantity'] for item in items)
+        orders.append({
+            'id': order_id, 'app_id': 580111, 'name': '#%d' % (1000 + i), 'email': 'customer%d@example.com' % i,
+            'customer': {'id': 2000000 + i % 5000, 'email': 'customer%d@example.com' % i},
+            'billing_address': get_address(rnd, i), 'shipping_address': get_address(rnd, i),
+            'created_at': get_timestamp(i * 60), 'updated_at': get_timestamp(i * 60 + 3600),
+            'processed_at': get_timestamp(i * 60), 'cancelled_at': None, 'closed_at': None,
+            'currency': 'USD', 'financial_status': rnd.choice(['paid', 'pending', 'refunded']),
+            'fulfillment_status': 'fulfilled', 'total_weight': 100 * line_items,
+            'total_line_items_price': '%.2f' % total, 'total_discounts': '0.00', 'subtotal_price': '%.2f' % total,
+            'total_shipping_price_set': {'shop_money': {'amount': '5.00', 'currency_code': 'USD'}},
+            'total_tip_received': '0.0', 'total_tax': '%.2f' % (total * 0.13), 'total_price': '%.2f' % (total * 1.13 + 5),
+            'line_items': items,
+            'refunds': [],
+            'fulfillments': [{
+                'id': order_id * 10, 'status': 'success', 'created_at': get_timestamp(i * 60 + 600),
+                'tracking_company': 'UPS', 'tracking_number': '1Z%010d' % i, 'line_items': items
+            }]
+        })
+    return orders
+
+def get_products(count, variants=100, images=5, seed=1):
+    rnd = random.Random(seed)
+    products = []
+    for i in range(count):
+        product_id = 3000000 + i
+        product_images = [{
+            'id': product_id * 10 + k, 'product_id': product_id, 'position': k + 1,
+            'created_at': get_timestamp(i * 60), 'updated_at': get_timestamp(i * 60),
+            'width': 1024, 'height': 1024, 'src': 'https://cdn.shopify.com/s/files/%d/%d.jpg' % (product_id, k),
+            'variant_ids': []
+        } for k in range(images)]
+        products.append({
+            'id': product_id, 'title': 'Product %d' % i, 'body_html': '<p>' + 'Description. ' * 100 + '</p>',
+            'handle': 'product-%d' % i, 'vendor': 'Vendor %d' % (i % 20), 'product_type': 'Type %d' % (i % 10),
+            'created_at': get_timestamp(i * 60), 'updated_at': get_timestamp(i * 60 + 3600),
+            'published_at': get_timestamp(i * 60), 'published_scope': 'web', 'template_suffix': None,
+            'tags': 'sale, summer, new', 'status': 'active',
+            'variants': [{
+                'id': product_id * 1000 + j, 'product_id': product_id, 'title': 'Size %d / Color %d' % (j % 10, j // 10),
+                'option1': 'Size %d' % (j % 10), 'option2': 'Color %d' % (j // 10), 'option3': None,
+                'created_at': get_timestamp(i * 60), 'updated_at': get_timestamp(i * 60 + 3600),
+                'sku': 'SKU-%d-%d' % (i, j), 'barcode': '%012d' % (product_id * 1000 + j), 'position': j + 1,
+                'price': '%.2f' % rnd.uniform(1, 100), 'compare_at_price': None, 'inventory_policy': 'deny',
+                'inventory_management': 'shopify', 'fulfillment_service': 'manual', 'taxable': True,
+                'grams': 100, 'weight': 0.1, 'weight_unit': 'kg', 'inventory_item_id': product_id * 1000 + j,
+                'inventory_quantity': rnd.randint(0, 100), 'requires_shipping': True,
+                'image_id': product_images[j % images]['id'] if images > 0 else None
+            } for j in range(variants)],
+            'options': [{'name': 'Size'}, {'name': 'Color'}],
+            'images': product_images,
+            'image': product_images[0] if images > 0 else None
+        })
+    return products
+
+def get_inventory_levels(products, locations=2, seed=1):
+    # the level of each inventory item at each location
+    rnd = random.Random(seed)
+    return [{
+        'inventory_item_id': variant['inventory_item_id'], 'location_id': 6000000 + k,
+        'available': rnd.randint(0, 50), 'updated_at': variant['updated_at']
+    } for product in products for variant in product['variants'] for k in range(locations)]
+
+def get_metafields(records, owner_resource):
+    # the metafields of each record, including records with none and with more than
+    # fit in a page of a record's metafields
+    metafields = []
+    for i, record in enumerate(records):
+        for k in range([0, 1, 3, 30][i % 4]):
+            metafields.append({
+                'id': record['id'] * 100 + k, 'owner_id': record['id'], 'owner_resource': owner_resource,
+                'namespace': 'custom' if k == 0 else 'specs', 'key': 'field_%d' % k, 'value': '%d-%d' % (record['id'], k)
+            })
+    return metafields
+
+def get_customers(count, addresses=5, seed=1):
+    rnd = random.Random(seed)
+    customers = []
+    for i in range(count):
+        customer_id = 2000000 + i
+        customer_addresses = [dict(get_address(rnd, customer_id * 10 + k), customer_id=customer_id, default=k == 0)
+                              for k in range(addresses)]
+        customers.append({
+            'id': customer_id, 'first_name': 'First%d' % i, 'last_name': 'Last%d' % i,
+            'email': 'customer%d@example.com' % i, 'verified_email': True, 'phone': None,
+            'created_at': get_timestamp(i * 60), 'updated_at': get_timestamp(i * 60 + 3600),
+            'state': 'enabled', 'tax_exempt': False, 'tax_exemptions': [], 'orders_count': rnd.randint(0, 20),
+            'total_spent': '%.2f' % rnd.uniform(0, 1000), 'currency': 'USD', 'last_order_id': None,
+            'last_order_name': None, 'accepts_marketing': False, 'marketing_opt_in_level': None,
+            'accepts_marketing_updated_at': None, 'note': None, 'tags': 'vip',
+            'addresses': customer_addresses,
+            'default_address': customer_addresses[0] if addresses > 0 else None
+        })
+    return customers
+
+class MockShopify():
+
+    def __init__(self, data, latency=0, rate_limit=False, bucket_size=40, bulk_duration=0):
+        # like the api, the bucket leaks completely in 20 seconds (e.g. 2 calls a second
+        # for a bucket of 40 calls); bulk operations run for bulk_duration seconds, and
+        # only one of them runs at a time
+        self.data = data
+        self.latency = latency
+        self.bulk_duration = bulk_duration
+        self.rate_limit = rate_limit
+        self.bucket_size = bucket_size
+        self.leak_rate = bucket_size / 20.0
+        self.bucket = 0
+        self.bucket_time = time.monotonic()
+        self.lock = threading.Lock()
+        self.operations = {}
+        self.metafields = {}
+        for metafield in data.get('metafields', []):
+            owner_id = get_gid(metafield['owner_resource'].title(), metafield['owner_id'])
+            self.metafields.setdefault(owner_id, []).append(metafield)
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'requests': 0, 'throttled': 0, 'bytes': 0}
+            self.paths = []
+
+    def start(self, port=0):
+        # serve in a background thread and return the base uri of the server
+        mock = self
+        class Handler(RequestHandler):
+            shopify = mock
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return 'http://127.0.0.1:%d' % self.server.server_address[1]
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def take_call(self, path):
+        # leak the bucket since the last call and add this call to it; returns the
+        # number of calls in the bucket, or None if the bucket is full
+        with self.lock:
+            self.stats['requests'] += 1
+            self.paths.append(path)
+            now = time.monotonic()
+            self.bucket = max(0, self.bucket - (now - self.bucket_time) * self.leak_rate)
+            self.bucket_time = now
+            if not self.rate_limit:
+                return 1
+            if self.bucket + 1 > self.bucket_size:
+                self.stats['throttled'] += 1
+                return None
+            self.bucket += 1
+            return int(self.bucket)
+
+class RequestHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    shopify = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.shopify.latency > 0:
+            time.sleep(self.shopify.latency)
+
+        # the results of bulk operations are served apart from the api, without its limits
+        if self.path.startswith('/bulk/'):
+            with self.shopify.lock:
+                self.shopify.stats['requests'] += 1
+                resource, query, finished = self.shopify.operations[self.path.split('/')[2].split('.')[0]]
+            self.send_body(200, get_bulk_results(self.shopify, resource, query).encode(), 'application/jsonl', {})
+            return
+
+        calls = self.shopify.take_call(self.path)
+        if calls is None:
+            self.send_json(429, {'errors': 'Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service.'},
+                           {'Retry-After': '2.0', 'X-Shopify-Shop-Api-Call-Limit': '%d/%d' % (self.shopify.bucket_size, self.shopify.bucket_size)})
+            return
+        call_limit = {'X-Shopify-Shop-Api-Call-Limit': '%d/%d' % (calls, self.shopify.bucket_size)}
+
+        url = urllib.parse.urlparse(self.path)
+        path = url.path.split('/')
+        query = dict(urllib.parse.parse_qsl(url.query))
+        if len(path) < 5 or path[1:4] != ['admin', 'api', '2020-04']:
+            self.send_json(404, {'errors': 'Not Found'}, call_limit)
+            return
+
+        resource = path[4].replace('.json', '')
+        if resource not in self.shopify.data:
+            self.send_json(404, {'errors': 'Not Found'}, call_limit)
+            return
+        if len(path) > 5 and path[5] == 'count.json':
+            self.send_json(200, {'count': len(get_filtered(self.shopify.data[resource], query))}, call_limit)
+            return
+
+        # the cursor holds the filter and the offset; like the api, only the limit and
+        # fields can be passed along with it
+        limit = min(int(query.get('limit', 50)), 250)
+        fields = query.get('fields')
+        offset = 0
+        if 'page_info' in query:
+            cursor = json.loads(base64.urlsafe_b64decode(query['page_info']))
+            query, offset = cursor['query'], cursor['offset']
+
+        items = get_filtered(self.shopify.data[resource], query)
+        page = items[offset:offset+limit]
+        if fields is not None:
+            fields = fields.split(',')
+            page = [{k: item[k] for k in fields if k in item} for item in page]
+
+        headers = dict(call_limit)
+        if offset + limit < len(items):
+            cursor = base64.urlsafe_b64encode(json.dumps({'query': query, 'offset': offset + limit}).encode()).decode()
+            next_query = {'limit': limit, 'page_info': cursor}
+            if fields is not None:
+                next_query['fields'] = ','.join(fields)
+            next_url = 'http://%s%s?%s' % (self.headers['Host'], url.path, urllib.parse.urlencode(next_query))
+            headers['Link'] = '<%s>; rel="next"' % next_url
+        self.send_json(200, {resource: page}, headers)
+
+    def do_POST(self):
+        # graphql queries aren't rate limited; see get_graphql_data()
+        if self.shopify.latency > 0:
+            time.sleep(self.shopify.latency)
+        with self.shopify.lock:
+            self.shopify.stats['requests'] += 1
+
+        if self.path != '/admin/api/2020-04/graphql.json':
+            self.send_json(404, {'errors': 'Not Found'}, {})
+            return
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        data = get_graphql_data(self.shopify, body['query'], body.get('variables') or {}, self.headers['Host'])
+        self.send_json(200, {'data': data}, {})
+
+    def send_json(self, status, content, headers):
+        self.send_body(status, json.dumps(content).encode(), 'application/json; charset=utf-8', headers)
+
+    def send_body(self, status, body, content_type, headers):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.shopify.lock:
+            self.shopify.stats['bytes'] += len(body)
+
+def get_filtered(items, query):
+    # apply the filters the benchmarked functions pass to the api
+    if 'ids' in query:
+        ids = set(int(i) for i in query['ids'].split(','))
+        items = [item for item in items if item['id'] in ids]
+    if 'inventory_item_ids' in query:
+        ids = set(int(i) for i in query['inventory_item_ids'].split(','))
+        items = [item for item in items if item['inventory_item_id'] in ids]
+    if 'since_id' in query:
+        since_id = int(query['since_id'])
+        items = [item for item in items if item['id'] > since_id]
+    for key in ('created_at', 'updated_at'):
+        if key + '_min' in query:
+            t = get_date(query[key + '_min'])
+            items = [item for item in items if get_date(item[key]) >= t]
+        if key + '_max' in query:
+            t = get_date(query[key + '_max'])
+            items = [item for item in items if get_date(item[key]) <= t]
+    return items
+
+def get_date(value):
+    # like the api, dates and timestamps without an offset are taken as utc
+    t = datetime.fromisoformat(value)
+    return t if t.tzinfo is not None else t.replace(tzinfo=timezone.utc)
+
+def get_gid(type_name, id):
+    return 'gid://shopify/%s/%d' % (type_name, id)
+
+def get_graphql_data(shopify, query, variables, host):
+
+    # answer the queries the functions make: starting a bulk operation and polling it
+    # or the current one, and looking up the metafields of a batch of records or the rest
+    # of the metafields of a record; unlike the api, queries aren't throttled on their cost
+    if 'bulkOperationRunQuery' in query:
+        resource = variables['query'].split('{')[1].strip()
+        if resource not in shopify.data:
+            return {'bulkOperationRunQuery': {'bulkOperation': None, 'userErrors': [
+                {'field': ['query'], 'message': "Invalid bulk query: Field '%s' doesn't exist on type 'QueryRoot'" % resource}]}}
+        with shopify.lock:
+            # like the api, a shop runs one bulk query at a time
+            now = time.monotonic()
+            current = len(shopify.operations)
+            if current > 0 and shopify.operations[str(current)][2] > now:
+                return {'bulkOperationRunQuery': {'bulkOperation': None, 'userErrors': [
+                    {'field': None, 'message': 'A bulk query operation for this app and shop is already in progress: %s.'
+                                               % get_gid('BulkOperation', current)}]}}
+            operation_id = current + 1
+            shopify.operations[str(operation_id)] = (resource, variables['query'], now + shopify.bulk_duration)
+        return {'bulkOperationRunQuery': {'bulkOperation': {'id': get_gid('BulkOperation', operation_id)}, 'userErrors': []}}
+    if 'currentBulkOperation' in query:
+        with shopify.lock:
+            current = len(shopify.operations)
+        if current == 0:
+            return {'currentBulkOperation': None}
+        return {'currentBulkOperation': dict(get_bulk_operation(shopify, str(current), host), id=get_gid('BulkOperation', current))}
+    if 'BulkOperation' in query:
+        return {'node': get_bulk_operation(shopify, variables['id'].rsplit('/', 1)[1], host)}
+
+    first = int(re.search(r'metafields\(first: (\d+)', query).group(1))
+    if 'nodes(' in query:
+        return {'nodes': [get_metafields_connection(shopify, id, first, None) for id in variables['ids']]}
+    return {'node': get_metafields_connection(shopify, variables['id'], first, variables.get('after'))}
+
+def get_bulk_operation(shopify, operation_id, host):
+    resource, query, finished = shopify.operations[operation_id]
+    if finished > time.monotonic():
+        return {'status': 'RUNNING', 'errorCode': None, 'url': None}
+    url = 'http://%s/bulk/%s.jsonl' % (host, operation_id) if len(shopify.data.get(resource, [])) > 0 else None
+    return {'status': 'COMPLETED', 'errorCode': None, 'url': url}
+
+def get_metafields_connection(shopify, owner_id, first, after):
+    # the cursor of a metafield is its position
+    metafields = shopify.metafields.get(owner_id, [])
+    start = int(after) + 1 if after is not None else 0
+    return {'metafields': {
+        'edges': [{'cursor': str(start + k), 'node': {'namespace': m['namespace'], 'key': m['key'], 'value': m['value']}}
+                  for k, m in enumerate(metafields[start:start+first])],
+        'pageInfo': {'hasNextPage': start + first < len(metafields)}
+    }}
+
+# the connection of each type of node of the bulk operation results
+CONNECTIONS = {'LineItem': 'lineItems', 'ProductImage': 'images', 'ProductVariant': 'variants', 'Metafield': 'metafields'}
+
+def get_bulk_results(shopify, resource, query):
+
+    # the results file of a bulk operation; each record's node is on a line, followed
+    # by the nodes of the connections in the query with the id of their parent, and each
+    # node is projected on the fields of the query with their aliases
+    selection = parse_selection(query)[0][2][0][2][0][2] # resource { edges { node { ... } } }
+    connections = {name: sub[0][2][0][2] for alias, name, sub in selection if is_connection(sub)}
+    lines = []
+    for item in shopify.data[resource]:
+        nodes = get_graphql_nodes(shopify, resource, item)
+        lines.append(select(nodes[0], selection))
+        for node in nodes[1:]:
+            connection = CONNECTIONS[node['id'].split('/')[3]]
+            if connection in connections:
+                lines.append(dict(select(node, connections[connection]), __parentId=nodes[0]['id']))
+    return ''.join(json.dumps(line) + '\n' for line in lines)
+
+def parse_selection(query):
+
+    # returns the (alias, name, selection) of each field of the outer selection of a
+    # query, where the selection of a field without one is None; arguments are skipped
+    def parse(tokens):
+        fields = []
+        for token in tokens:
+            if token == '}':
+                break
+            elif token == '{':
+                fields[-1] = fields[-1][:2] + (parse(tokens),)
+            elif token == '(':
+                for token in tokens:
+                    if token == ')':
+                        break
+            elif token == ':':
+                fields[-1] = (fields[-1][0], next(tokens), None)
+            else:
+                fields.append((token, token, None))
+        return fields
+
+    tokens = iter(re.findall(r'[A-Za-z_]\w*|[:{}()]', query))
+    next(tokens) # the opening brace
+    return parse(tokens)
+
+def is_connection(selection):
+    return selection is not None and len(selection) > 0 and selection[0][1] == 'edges'
+
+def select(obj, selection):
+    # project an object on a selection, leaving out the connections
+    node = {}
+    for alias, name, sub in selection:
+        if is_connection(sub):
+            continue
+        value = obj.get(name)
+        if sub is not None and isinstance(value, dict):
+            value = select(value, sub)
+        elif sub is not None and isinstance(value, list):
+            value = [select(v, sub) for v in value]
+        node[alias] = value
+    return node
+
+def get_graphql_nodes(shopify, resource, item):
+
+    # convert a record to its graphql node, followed by the nodes of its connections;
+    # timestamps are left in the format of the rest api
+    if resource == 'orders':
+        nodes = get_graphql_order(item)
+    elif resource == 'products':
+        nodes = get_graphql_product(item)
+    else:
+        nodes = get_graphql_customer(item)
+    nodes += [{'id': get_gid('Metafield', m['id']), 'namespace': m['namespace'], 'key': m['key'], 'value': m['value']}
+              for m in shopify.metafields.get(nodes[0]['id'], [])]
+    return nodes
+
+def get_money(amount):
+    return {'shopMoney': {'amount': amount}}
+
+def get_graphql_address(address):
+    if address is None:
+        return None
+    return {
+        'firstName': address['first_name'], 'lastName': address['last_name'], 'name': address['name'],
+        'phone': address['phone'], 'company': address['company'], 'address1': address['address1'],
+        'address2': address['address2'], 'city': address['city'], 'province': address['province'],
+        'provinceCode': address['province_code'], 'zip': address['zip'], 'country': address['country'],
+        'countryCodeV2': address['country_code'], 'latitude': float(address['latitude']),
+        'longitude': float(address['longitude'])
+    }
+
+# graphql fulfillment statuses of line items and weight units
+FULFILLMENT_STATUSES = {None: 'UNFULFILLED', 'partial': 'PARTIALLY_FULFILLED', 'fulfilled': 'FULFILLED'}
+WEIGHT_UNITS = {'g': 'GRAMS', 'kg': 'KILOGRAMS', 'oz': 'OUNCES', 'lb': 'POUNDS'}
+
+def get_graphql_order(item):
+    # totalWeight is an UnsignedInt64, which is returned as a string
+    order = {
+        'id': get_gid('Order', item['id']),
+        'customer': {'id': get_gid('Customer', item['customer']['id'])} if item.get('customer') else None,
+        'billingAddress': get_graphql_address(item['billing_address']),
+        'shippingAddress': get_graphql_address(item['shipping_address']),
+        'createdAt': item['created_at'], 'updatedAt': item['updated_at'], 'processedAt': item['processed_at'],
+        'cancelledAt': item['cancelled_at'], 'closedAt': item['closed_at'], 'currencyCode': item['currency'],
+        'totalWeight': str(item['total_weight']), 'totalDiscountsSet': get_money(item['total_discounts']),
+        'subtotalPriceSet': get_money(item['subtotal_price']),
+        'totalShippingPriceSet': get_money(item['total_shipping_price_set']['shop_money']['amount']),
+        'totalTipReceived': {'amount': item['total_tip_received']}, 'totalTaxSet': get_money(item['total_tax']),
+        'totalPriceSet': get_money(item['total_price'])
+    }
+    return [order] + [{
+        'id': get_gid('LineItem', line_item['id']), 'product': {'id': get_gid('Product', line_item['product_id'])},
+        'variant': {'id': get_gid('ProductVariant', line_item['variant_id'])}, 'title': line_item['title'],
+        'variantTitle': line_item['variant_title'], 'sku': line_item['sku'], 'vendor': line_item['vendor'],
+        'quantity': line_item['quantity'], 'originalUnitPriceSet': get_money(line_item['price']),
+        'totalDiscountSet': get_money(line_item['total_discount']), 'taxable': line_item['taxable'],
+        'requiresShipping': line_item['requires_shipping'], 'fulfillableQuantity': line_item['fulfillable_quantity'],
+        'fulfillmentStatus': FULFILLMENT_STATUSES[line_item['fulfillment_status']]
+    } for line_item in item['line_items']]
+
+def get_graphql_product(item):
+    product = {
+        'id': get_gid('Product', item['id']), 'title': item['title'], 'descriptionHtml': item['body_html'],
+        'handle': item['handle'], 'vendor': item['vendor'], 'productType': item['product_type'],
+        'createdAt': item['created_at'], 'updatedAt': item['updated_at'], 'publishedAt': item['published_at'],
+        'templateSuffix': item['template_suffix'], 'tags': item['tags'].split(', ') if item['tags'] else []
+    }
+    images = [{
+        'id': get_gid('ProductImage', image['id']), 'originalSrc': image['src'], 'width': image['width'],
+        'height': image['height']
+    } for image in item['images']]
+    variants = [{
+        'id': get_gid('ProductVariant', variant['id']), 'title': variant['title'],
+        'selectedOptions': [{'value': variant[k]} for k in ('option1', 'option2', 'option3') if variant[k] is not None],
+        'createdAt': variant['created_at'], 'updatedAt': variant['updated_at'], 'sku': variant['sku'],
+        'barcode': variant['barcode'], 'price': variant['price'], 'compareAtPrice': variant['compare_at_price'],
+        'inventoryPolicy': variant['inventory_policy'].upper(),
+        'inventoryManagement': (variant['inventory_management'] or '').upper() or None,
+        'fulfillmentService': {'handle': variant['fulfillment_service']}, 'taxable': variant['taxable'],
+        'weight': variant['weight'], 'weightUnit': WEIGHT_UNITS[variant['weight_unit']],
+        'inventoryItem': {'id': get_gid('InventoryItem', variant['inventory_item_id'])},
+        'inventoryQuantity': variant['inventory_quantity'],
+        'image': {'id': get_gid('ProductImage', variant['image_id'])} if variant['image_id'] is not None else None
+    } for variant in item['variants']]
+    return [product] + images + variants
+
+def get_graphql_customer(item):
+    # ordersCount is an UnsignedInt64, which is returned as a string, and the addresses
+    # are a list rather than a connection
+    def get_address_id(address):
+        return get_gid('MailingAddress', address['id']) + '?model_name=CustomerAddress'
+    return [{
+        'id': get_gid('Customer', item['id']), 'firstName': item['first_name'], 'lastName': item['last_name'],
+        'email': item['email'], 'verifiedEmail': item['verified_email'], 'phone': item['phone'],
+        'createdAt': item['created_at'], 'updatedAt': item['updated_at'], 'state': item['state'].upper(),
+        'taxExempt': item['tax_exempt'], 'taxExemptions': item['tax_exemptions'], 'ordersCount': str(item['orders_count']),
+        'totalSpentV2': {'amount': item['total_spent'], 'currencyCode': item['currency']},
+        'lastOrder': {'id': get_gid('Order', item['last_order_id']), 'name': item['last_order_name']} if item['last_order_id'] else None,
+        'acceptsMarketing': item['accepts_marketing'],
+        'marketingOptInLevel': (item['marketing_opt_in_level'] or '').upper() or None,
+        'acceptsMarketingUpdatedAt': item['accepts_marketing_updated_at'], 'note': item['note'],
+        'tags': item['tags'].split(', ') if item['tags'] else [],
+        'defaultAddress': {'id': get_address_id(item['default_address'])} if item['default_address'] else None,
+        'addresses': [dict(get_graphql_address(address), id=get_address_id(address)) for address in item['addresses']]
+    }]
+
+def get_data(orders=2500, line_items=5, products=250, variants=100, images=5, customers=2500, addresses=5, locations=2):
+    products = get_products(products, variants, images)
+    customers = get_customers(customers, addresses)
+    return {
+        'orders': get_orders(orders, line_items),
+        'products': products,
+        'inventory_levels': get_inventory_levels(products, locations),
+        'customers': customers,
+        'metafields': get_metafields(products, 'product') + get_metafields(customers, 'customer')
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local mock of the Shopify admin api')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0, help='seconds to wait before each response')
+    parser.add_argument('--rate-limit', action='store_true', help='emulate the leaky bucket rate limit')
+    parser.add_argument('--bucket-size', type=int, default=40, help='calls the leaky bucket holds; it leaks in 20 seconds')
+    parser.add_argument('--bulk-duration', type=float, default=0, help='seconds each bulk operation runs')
+    parser.add_argument('--orders', type=int, default=2500)
+    parser.add_argument('--line-items', type=int, default=5)
+    parser.add_argument('--products', type=int, default=250)
+    parser.add_argument('--variants', type=int, default=100)
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--customers', type=int, default=2500)
+    parser.add_argument('--addresses', type=int, default=5)
+    parser.add_argument('--locations', type=int, default=2)
+    args = parser.parse_args()
+
+    data = get_data(args.orders, args.line_items, args.products, args.variants, args.images, args.customers, args.addresses,
+                    args.locations)
+    mock = MockShopify(data, latency=args.latency, rate_limit=args.rate_limit, bucket_size=args.bucket_size,
+                        bulk_duration=args.bulk_duration)
+    print('serving on %s' % mock.start(args.port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.stop()
+
+if __name__ == '__main__':
+    main()
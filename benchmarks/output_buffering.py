@@ -0,0 +1,104 @@
+# micro-benchmark comparing the old per-page string concatenation with the
+# chunked row writer in get_data on 250-item pages of large products
+#
+# usage: python benchmarks/output_buffering.py [pages] [variants]
+#
+# note: the concatenation time grows quadratically with the rows per page, so
+# large variant counts take minutes to run
+
+import os
+import sys
+import json
+import time
+import importlib.util
+
+def load_function(name):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', name + '.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def get_pipeline():
+    # the shared pipeline is on the path once a function is loaded
+    from shopify_core import convert, pipeline
+    return convert, pipeline
+
+def get_products(count, variants):
+    products = []
+    for i in range(count):
+        products.append({
+            'id': i, 'title': 'Product %d' % i, 'body_html': '<p>' + 'x' * 2000 + '</p>',
+            'vendor': 'Vendor', 'product_type': 'Type', 'tags': 'a, b, c',
+            'created_at': '2020-04-01T10:00:00-04:00', 'updated_at': '2020-04-01T10:00:00-04:00',
+            'image': {'id': i, 'src': 'https://cdn.shopify.com/%d.jpg' % i, 'width': 100, 'height': 100},
+            'variants': [{
+                'id': i * 1000 + j, 'title': 'Variant %d' % j, 'option1': 'a', 'sku': 'SKU-%d' % j,
+                'price': '19.99', 'compare_at_price': '24.99', 'grams': 100, 'weight': 0.1,
+                'weight_unit': 'kg', 'inventory_item_id': j, 'inventory_quantity': 10
+            } for j in range(variants)]
+        })
+    return products
+
+class Response():
+    def __init__(self, data, last=False):
+        self.data = data
+        self.status_code = 200
+        self.headers = {}
+        self.links = {} if last else {'next': {'url': 'next'}}
+    def raise_for_status(self):
+        pass
+    def json(self):
+        return {'products': self.data}
+    @property
+    def content(self):
+        return json.dumps(self.json()).encode()
+
+class Session():
+    def __init__(self, pages):
+        self.pages = pages
+    def get(self, url, headers=None):
+        return self.pages.pop(0)
+    def close(self):
+        pass
+
+def concat_page(module, data):
+    # the original approach: grow a string by one row at a time
+    convert, pipeline = get_pipeline()
+    resource = module.RESOURCE
+    properties = pipeline.get_properties(resource, {})
+    mapper = pipeline.get_item_mapper(resource, properties)
+    rows = pipeline.get_page_rows(resource, data, mapper, resource.name)
+    convert.convert_rows(rows, convert.get_converters(resource, properties, 'ndjson'))
+    buffer = ''
+    for item in rows:
+        buffer = buffer + json.dumps(item, default=convert.to_string) + "\n"
+    return buffer
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    variants = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    module = load_function('shopify-products')
+    data = get_products(250, variants)
+    params = {'shopify_connection': {'access_token': '', 'api_base_uri': ''}}
+
+    start = time.perf_counter()
+    size = 0
+    for i in range(pages):
+        size += len(concat_page(module, data))
+    concat_time = time.perf_counter() - start
+
+    session = Session([Response(data, last=(i == pages - 1)) for i in range(pages)])
+    start = time.perf_counter()
+    chunked_size = 0
+    for chunk in module.get_data(params, session=session):
+        chunked_size += len(chunk)
+    chunked_time = time.perf_counter() - start
+
+    assert size == chunked_size
+    print('pages: %d, rows/page: %d, bytes: %d' % (pages, 250 * variants, size))
+    print('concatenation: %.3fs' % concat_time)
+    print('chunked writer: %.3fs' % chunked_time)
+
+if __name__ == '__main__':
+    main()
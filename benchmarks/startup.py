@@ -0,0 +1,90 @@
+# benchmark of the cold start of each function; reports the time to import the
+# function, the number of modules it loads, which of the heavier dependencies are
+# loaded by the import, and the time from the first call of get_data to its first
+# chunk of output against the local mock of the shopify admin api
+#
+# usage: python benchmarks/startup.py [--format ndjson] [--set NAME=VALUE ...]
+#
+# each function is imported in a fresh process, so nothing is imported or cached ahead
+# of time
+
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+FUNCTIONS = ['shopify-orders', 'shopify-products', 'shopify-customers']
+
+# dependencies that are only needed for some calls
+HEAVY_MODULES = ['requests', 'aiohttp', 'asyncio', 'pyarrow', 'sqlite3', 'orjson']
+
+def run_function(name, api_base_uri, settings, params):
+
+    # import the function and make the first call in this process and return the
+    # measurements; the modules loaded by the interpreter itself aren't counted
+    import importlib.util
+    modules = set(sys.modules)
+    start = time.perf_counter()
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', name + '.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    import_time = time.perf_counter() - start
+    loaded = set(sys.modules) - modules
+    heavy = [m for m in HEAVY_MODULES if m in loaded]
+
+    from shopify_core import settings as function_settings
+    for k, v in settings.items():
+        setattr(function_settings, k, v)
+    params = dict(params, shopify_connection={'access_token': 'token', 'api_base_uri': api_base_uri})
+    start = time.perf_counter()
+    output = module.get_data(params)
+    next(output, None)
+    first_chunk = time.perf_counter() - start
+    output.close()
+
+    return {'import': import_time, 'modules': len(loaded), 'heavy': heavy, 'first_chunk': first_chunk}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the cold start of the shopify functions')
+    parser.add_argument('--format', default='ndjson', help='output format of the first call')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='setting to use for the functions (e.g. FETCH_ENGINE=async)')
+    parser.add_argument('--run', nargs=2, metavar=('FUNCTION', 'API_BASE_URI'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    settings = {}
+    for setting in args.set:
+        k, v = setting.split('=', 1)
+        try:
+            settings[k] = json.loads(v)
+        except ValueError:
+            settings[k] = v
+    params = {'format': args.format}
+
+    if args.run is not None:
+        print(json.dumps(run_function(args.run[0], args.run[1], settings, params)))
+        return
+
+    # a small shop, so the first chunk is mostly the cost of starting up
+    import mock_shopify
+    data = mock_shopify.get_data(orders=250, products=25, variants=10, customers=250)
+    mock = mock_shopify.MockShopify(data)
+    api_base_uri = mock.start()
+
+    print('%-18s %10s %8s %12s  %s' % ('function', 'import', 'modules', 'first chunk', 'heavy modules imported'))
+    try:
+        for name in FUNCTIONS:
+            command = [sys.executable, os.path.abspath(__file__), '--run', name, api_base_uri, '--format', args.format]
+            command += ['--set=' + s for s in args.set]
+            result = json.loads(subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout)
+            print('%-18s %8.1fms %8d %10.1fms  %s' % (
+                name, result['import'] * 1000, result['modules'], result['first_chunk'] * 1000,
+                ', '.join(result['heavy']) or '-'))
+    finally:
+        mock.stop()
+
+if __name__ == '__main__':
+    main()
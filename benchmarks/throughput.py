@@ -0,0 +1,191 @@
+# benchmark of get_data for each function against the local mock of the shopify admin
+# api; reports the rows and bytes per second, the time to the first chunk of output,
+# the peak rss and the number of api requests for each function
+#
+# usage: python benchmarks/throughput.py [--latency 0.05] [--rate-limit] [--set NAME=VALUE ...]
+#
+# e.g. to compare the fetch engines:
+#
+#   python benchmarks/throughput.py --latency 0.05
+#   python benchmarks/throughput.py --latency 0.05 --set FETCH_ENGINE=async
+#   python benchmarks/throughput.py --latency 0.05 --set FETCH_ENGINE=bulk --set BULK_MIN_COUNT=1
+#
+# or to compare the round trip of each request with one pooled session for all the pages
+# and with a new session, and so a new connection, for each request:
+#
+#   python benchmarks/throughput.py --latency 0.05 --session pooled
+#   python benchmarks/throughput.py --latency 0.05 --session per-request
+#
+# or to compare the peak rss of decoding whole pages with streamed records:
+#
+#   python benchmarks/throughput.py --functions shopify-products
+#   python benchmarks/throughput.py --functions shopify-products --set STREAM_RECORDS=true
+#
+# each function runs in its own process so that the peak rss only includes the function;
+# note: the functions pace their requests to the shop's leaky bucket, which the mock
+# reports as 40 calls leaking in 20 seconds, so runs of more than about 40 pages are
+# limited to 2 pages a second unless a larger --bucket-size is used
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import subprocess
+import statistics
+import importlib.util
+
+import mock_shopify
+
+FUNCTIONS = ['shopify-orders', 'shopify-products', 'shopify-customers']
+
+def load_function(name):
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', name + '.py')
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class SessionPerRequest():
+
+    # a new session for each request, as each page used to be requested with, so that
+    # each request opens a new connection
+    def __init__(self, timings):
+        self.timings = timings
+
+    def request(self, method, url, **kwargs):
+        from shopify_core.api import requests_retry_session
+        with requests_retry_session(timings=self.timings) as session:
+            response = session.request(method, url, **kwargs)
+            # read a streamed response before its connection is closed
+            response.content
+            return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        pass
+
+def get_session(session_type, timings):
+    # the session to pass to get_data, which records the round trip of each request;
+    # get_data creates its own session when it isn't passed one
+    from shopify_core.api import requests_retry_session
+    if session_type == 'pooled':
+        return requests_retry_session(pool_maxsize=10, timings=timings)
+    if session_type == 'per-request':
+        return SessionPerRequest(timings)
+    return None
+
+def get_value(value):
+    # settings are parsed as json where possible (e.g. numbers and booleans)
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+def run_function(name, api_base_uri, settings, params, session_type=None):
+
+    # run get_data in this process and return the measurements
+    module = load_function(name)
+    from shopify_core import settings as function_settings
+    for k, v in settings.items():
+        setattr(function_settings, k, v)
+    params = dict(params, shopify_connection={'access_token': 'token', 'api_base_uri': api_base_uri})
+
+    timings = []
+    session = get_session(session_type, timings)
+    rows = 0
+    size = 0
+    first_chunk = None
+    start = time.perf_counter()
+    for chunk in module.get_data(params, session):
+        if first_chunk is None:
+            first_chunk = time.perf_counter() - start
+        # the arrow and parquet formats return bytes, which aren't counted as rows
+        if isinstance(chunk, str):
+            rows += chunk.count('\n')
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    if session is not None:
+        session.close()
+
+    # the median round trip of the requests, when they're recorded
+    round_trip = statistics.median(t for url, t in timings) if len(timings) > 0 else None
+    return {'rows': rows, 'bytes': size, 'seconds': elapsed, 'first_chunk': first_chunk or elapsed, 'peak_rss': get_peak_rss(),
+            'round_trip': round_trip}
+
+def get_peak_rss():
+    # on linux, ru_maxrss carries over the parent's peak through fork and exec, so use
+    # the peak of this process image from /proc; otherwise, ru_maxrss is in kilobytes
+    # on linux and bytes on macos
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the shopify functions against a local mock of the admin api')
+    parser.add_argument('--latency', type=float, default=0, help='seconds the mock waits before each response')
+    parser.add_argument('--rate-limit', action='store_true', help='emulate the leaky bucket rate limit')
+    parser.add_argument('--bucket-size', type=int, default=40, help='calls the leaky bucket holds; it leaks in 20 seconds')
+    parser.add_argument('--orders', type=int, default=2500)
+    parser.add_argument('--line-items', type=int, default=5)
+    parser.add_argument('--products', type=int, default=250)
+    parser.add_argument('--variants', type=int, default=100)
+    parser.add_argument('--images', type=int, default=5)
+    parser.add_argument('--customers', type=int, default=2500)
+    parser.add_argument('--addresses', type=int, default=5)
+    parser.add_argument('--functions', default=','.join(FUNCTIONS), help='comma-delimited functions to run')
+    parser.add_argument('--params', default='{}', help='params to pass to get_data as json (e.g. {"properties": "id"})')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='module setting to use for the functions (e.g. FETCH_ENGINE=async)')
+    parser.add_argument('--session', choices=['pooled', 'per-request'],
+                        help='pass get_data a session that records the round trip of each request')
+    parser.add_argument('--run', nargs=2, metavar=('FUNCTION', 'API_BASE_URI'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    settings = {}
+    for setting in args.set:
+        k, v = setting.split('=', 1)
+        settings[k] = get_value(v)
+    params = json.loads(args.params)
+
+    if args.run is not None:
+        print(json.dumps(run_function(args.run[0], args.run[1], settings, params, args.session)))
+        return
+
+    data = mock_shopify.get_data(args.orders, args.line_items, args.products, args.variants,
+                                 args.images, args.customers, args.addresses)
+    mock = mock_shopify.MockShopify(data, latency=args.latency, rate_limit=args.rate_limit, bucket_size=args.bucket_size)
+    api_base_uri = mock.start()
+
+    print('%-18s %8s %10s %8s %10s %8s %8s %10s %9s %6s %9s' %
+          ('function', 'rows', 'bytes', 'seconds', 'rows/s', 'MB/s', 'ttfb', 'peak rss', 'requests', '429s', 'rtt ms'))
+    try:
+        for name in args.functions.split(','):
+            mock.reset_stats()
+            command = [sys.executable, os.path.abspath(__file__), '--run', name, api_base_uri, '--params', args.params]
+            command += ['--set=' + s for s in args.set]
+            if args.session is not None:
+                command += ['--session', args.session]
+            result = json.loads(subprocess.run(command, check=True, stdout=subprocess.PIPE).stdout)
+            round_trip = result['round_trip']
+            print('%-18s %8d %10d %8.2f %10.0f %8.2f %8.3f %8.1fMB %9d %6d %9s' % (
+                name, result['rows'], result['bytes'], result['seconds'], result['rows'] / result['seconds'],
+                result['bytes'] / result['seconds'] / 1e6, result['first_chunk'], result['peak_rss'] / 1e6,
+                mock.stats['requests'], mock.stats['throttled'], '-' if round_trip is None else '%.2f' % (round_trip * 1000)))
+    finally:
+        mock.stop()
+
+if __name__ == '__main__':
+    main()
@@ -8,12 +8,16 @@
 # params:
 #   - name: properties
 #     type: array
-#     description: The properties to return (defaults to all properties). See "Returns" for a listing of the available properties.
+#     description: The properties to return (defaults to all properties). See "Returns" for a listing of the available properties, along with a "metafields.<namespace>.<key>" property for any metafield.
 #     required: false
 #   - name: filter
 #     type: string
 #     description: Filter to apply with key/values specified as a URL query string where the keys correspond to the properties to filter.
 #     required: false
+#   - name: format
+#     type: string
+#     description: The format of the output; "ndjson" returns a JSON object for each row, "csv" returns a header row followed by the values of each row, "json" returns a JSON array with an array of the property names followed by an array of the values of each row, and "arrow" and "parquet" return an Arrow IPC stream or a Parquet file with the types listed in "Returns" (defaults to "ndjson").
+#     required: false
 # returns:
 #   - name: id
 #     type: integer
@@ -52,7 +56,7 @@
 #     type: integer
 #     description: The number of orders associated with the customer
 #   - name: total_spent
-#     type: integer
+#     type: number
 #     description: The total amount spent by the customer
 #   - name: currency
 #     type: string
@@ -78,6 +82,9 @@
 #   - name: tags
 #     type: string
 #     description: The tags associated with the customer given as a comma-delimited list
+#   - name: metafields
+#     type: string
+#     description: The metafields of the customer as a JSON object with the value of each metafield keyed on its lowercase namespace and key separated by a period; the value of a single metafield is returned by a property named "metafields." followed by the namespace and key (e.g. "metafields.loyalty.tier") (only returned when requested)
 #   - name: address_id
 #     type: integer
 #     description: The identifier for the default address for the customer
@@ -99,10 +106,10 @@
 #   - name: address_company
 #     type: string
 #     description: The company listed for the default address for the customer
-#   - name: address1
+#   - name: address_street1
 #     type: string
 #     description: The first line of the default address for the customer
-#   - name: address2
+#   - name: address_street2
 #     type: string
 #     description: The second line of the default address for the customer
 #   - name: address_city
@@ -132,151 +139,166 @@
 # examples:
 #   - '""'
 #   - '"id, email, first_name, last_name"'
+#   - '"id, email, metafields.loyalty.tier"'
 # ---
 
-import json
-import urllib
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from datetime import *
-from decimal import *
-from collections import OrderedDict
+import os
+import sys
+
+# the pipeline shared by the functions is in the shopify_core package next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import shopify_core
+from shopify_core import Resource
+from shopify_core.convert import to_date, to_delimited_string, to_id, to_json, to_money
+from shopify_core.metafields import Metafields
 
 # main function entry point
 def flexio_handler(flex):
+    shopify_core.flexio_handler(RESOURCE, flex)
 
-    flex.output.content_type = 'application/x-ndjson'
-    for data in get_data(flex.vars):
-        flex.output.write(data)
+def get_data(params, session=None):
+    return shopify_core.get_data(RESOURCE, params, session)
 
-def get_data(params):
+# filters that are passed to the api as query params; see:
+# https://shopify.dev/docs/admin-api/rest/reference/customers/customer#index-2020-04
+API_FILTERS = (
+    'ids', 'since_id', 'created_at_min', 'created_at_max', 'updated_at_min',
+    'updated_at_max'
+)
 
-    # get the api key and company domain from the variable input
-    auth_token = dict(params).get('shopify_connection',{}).get('access_token')
-    api_base_uri = dict(params).get('shopify_connection',{}).get('api_base_uri')
+# properties returned by this function, matching the 'returns' in the header, along
+# with the api field each one is built from and the conversion that's applied to it;
+# fields are a dotted path into the customer, where 'addresses[].' refers to each of its addresses
+PROPERTY_SPEC = [
+    ('id',                           'integer', 'id',                           None),
+    ('first_name',                   'string',  'first_name',                   None),
+    ('last_name',                    'string',  'last_name',                    None),
+    ('email',                        'string',  'email',                        None),
+    ('verified_email',               'boolean', 'verified_email',               None),
+    ('phone',                        'string',  'phone',                        None),
+    ('created_at',                   'string',  'created_at',                   to_date),
+    ('updated_at',                   'string',  'updated_at',                   to_date),
+    ('state',                        'string',  'state',                        None),
+    ('tax_exempt',                   'boolean', 'tax_exempt',                   None),
+    ('tax_exemptions',               'string',  'tax_exemptions',               to_delimited_string),
+    ('orders_count',                 'integer', 'orders_count',                 None),
+    ('total_spent',                  'number',  'total_spent',                  to_money),
+    ('currency',                     'string',  'currency',                     None),
+    ('last_order_id',                'integer', 'last_order_id',                None),
+    ('last_order_name',              'string',  'last_order_name',              None),
+    ('accepts_marketing',            'boolean', 'accepts_marketing',            None),
+    ('marketing_opt_in_level',       'string',  'marketing_opt_in_level',       None),
+    ('accepts_marketing_updated_at', 'string',  'accepts_marketing_updated_at', to_date),
+    ('note',                         'string',  'note',                         None),
+    ('tags',                         'string',  'tags',                         None),
+    ('metafields',                   'string',  'metafields',                   to_json),
+    ('address_id',                   'integer', 'addresses[].id',               None),
+    ('address_customer_id',          'integer', 'addresses[].customer_id',      None),
+    ('address_first_name',           'string',  'addresses[].first_name',       None),
+    ('address_last_name',            'string',  'addresses[].last_name',        None),
+    ('address_name',                 'string',  'addresses[].name',             None),
+    ('address_phone',                'string',  'addresses[].phone',            None),
+    ('address_company',              'string',  'addresses[].company',          None),
+    ('address_street1',              'string',  'addresses[].address1',         None),
+    ('address_street2',              'string',  'addresses[].address2',         None),
+    ('address_city',                 'string',  'addresses[].city',             None),
+    ('address_province',             'string',  'addresses[].province',         None),
+    ('address_province_code',        'string',  'addresses[].province_code',    None),
+    ('address_zip',                  'string',  'addresses[].zip',              None),
+    ('address_country',              'string',  'addresses[].country',          None),
+    ('address_country_code',         'string',  'addresses[].country_code',     None),
+    ('address_country_name',         'string',  'addresses[].country_name',     None),
+    ('address_default',              'boolean', 'addresses[].default',          None),
+]
 
-    # see here for more info:
-    # https://shopify.dev/docs/admin-api/rest/reference/customers/customer#index-2020-04
-    # https://shopify.dev/tutorials/make-paginated-requests-to-rest-admin-api
-
-    headers = {
-        'X-Shopify-Access-Token': auth_token
+# graphql bulk operation query for the customers, which uses aliases for the rest api
+# field names where it can; the rest is converted by get_bulk_item()
+BULK_QUERY = '''
+{
+  customers {
+    edges {
+      node {
+        id
+        first_name: firstName
+        last_name: lastName
+        email
+        verified_email: verifiedEmail
+        phone
+        created_at: createdAt
+        updated_at: updatedAt
+        state
+        tax_exempt: taxExempt
+        tax_exemptions: taxExemptions
+        orders_count: ordersCount
+        total_spent: totalSpentV2 { amount currencyCode }
+        lastOrder { id name }
+        accepts_marketing: acceptsMarketing
+        marketing_opt_in_level: marketingOptInLevel
+        accepts_marketing_updated_at: acceptsMarketingUpdatedAt
+        note
+        tags
+        defaultAddress { id }
+        addresses {
+          id
+          first_name: firstName
+          last_name: lastName
+          name
+          phone
+          company
+          address1
+          address2
+          city
+          province
+          province_code: provinceCode
+          zip
+          country
+          country_code: countryCodeV2
+        }
+      }
     }
-    url = api_base_uri + '/admin/api/2020-04/customers.json'
-
-    page_size = 250
-    url_query_params = {'limit': page_size}
-    url_query_str = urllib.parse.urlencode(url_query_params)
-    page_url = url + '?' + url_query_str
-
-    while True:
-
-        response = requests_retry_session().get(page_url, headers=headers)
-        response.raise_for_status()
-        content = response.json()
-        data = content.get('customers',[])
-
-        if len(data) == 0: # sanity check in case there's an issue with cursor
-            break
-
-        buffer = ''
-        for header_item in data:
-            detail_items_all =  header_item.get('addresses',[])
-            if len(detail_items_all) == 0:
-                item = get_item_info(header_item, {}) # if we don't have any variants, make sure to return item header info
-                buffer = buffer + json.dumps(item, default=to_string) + "\n"
-            else:
-                for detail_item in detail_items_all:
-                    item = get_item_info(header_item, detail_item)
-                    buffer = buffer + json.dumps(item, default=to_string) + "\n"
-        yield buffer
-
-        page_url = response.links.get('next',{}).get('url')
-        if page_url is None:
-            break
-
-def requests_retry_session(
-    retries=3,
-    backoff_factor=0.3,
-    status_forcelist=(429, 500, 502, 503, 504),
-    session=None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
-
-def to_date(value):
-    # TODO: convert if needed
-    return value
+  }
+}
+'''
 
-def to_number(value):
-    try:
-        v = value
-        return float(v)
-    except ValueError:
-        return value
+# the list each type of object from a nested connection is added to; the addresses
+# are a list rather than a connection, so they're on the line of their customer
+BULK_CONNECTIONS = {}
 
-def to_string(value):
-    if isinstance(value, (date, datetime)):
-        return value.isoformat()
-    if isinstance(value, (int)):
-        return str(value)
-    if isinstance(value, (Decimal)):
-        return str(value)
-    return value
+def get_bulk_item(item):
 
-def get_item_info(header_item, detail_item):
+    # convert a customer from the bulk operation results to the rest api format
+    item['id'] = to_id(item.get('id'))
+    item['tags'] = ', '.join(item.get('tags') or [])
+    for k in ('state', 'marketing_opt_in_level'):
+        item[k] = (item.get(k) or '').lower() or None
+    item['orders_count'] = int(item['orders_count']) if item.get('orders_count') is not None else None
+    total_spent = item.get('total_spent') or {}
+    item['total_spent'] = total_spent.get('amount')
+    item['currency'] = total_spent.get('currencyCode')
+    last_order = item.pop('lastOrder', None) or {}
+    item['last_order_id'] = to_id(last_order.get('id'))
+    item['last_order_name'] = last_order.get('name')
 
-    # map this function's property names to the API's property names
-    info = OrderedDict()
+    default_address_id = to_id((item.pop('defaultAddress', None) or {}).get('id'))
+    for address in item.setdefault('addresses', []):
+        address['id'] = to_id(address.get('id'))
+        address['customer_id'] = item['id']
+        address['country_name'] = address.get('country')
+        address['default'] = address['id'] == default_address_id
+    return item
 
-    info['id'] = header_item.get('id')
-    info['first_name'] = header_item.get('first_name')
-    info['last_name'] = header_item.get('last_name')
-    info['email'] = header_item.get('email')
-    info['verified_email'] = header_item.get('verified_email')
-    info['phone'] = header_item.get('phone')
-    info['created_at'] = to_date(header_item.get('created_at'))
-    info['updated_at'] = to_date(header_item.get('updated_at'))
-    info['state'] = header_item.get('state')
-    info['tax_exempt'] = header_item.get('tax_exempt')
-    info['tax_exemptions'] = ', '.join(header_item.get('tax_exemptions',[])) # convert to comma-delimited string; space follows api convention in tags property
-    info['orders_count'] = header_item.get('orders_count')
-    info['total_spent'] = to_number(header_item.get('total_spent'))
-    info['currency'] = header_item.get('currency')
-    info['last_order_id'] = header_item.get('last_order_id')
-    info['last_order_name'] = header_item.get('last_order_name')
-    info['accepts_marketing'] = header_item.get('accepts_marketing')
-    info['marketing_opt_in_level'] = header_item.get('marketing_opt_in_level')
-    info['accepts_marketing_updated_at'] = to_date(header_item.get('accepts_marketing_updated_at'))
-    info['note'] = header_item.get('note')
-    info['tags'] = header_item.get('tags')
-    info['address_id'] = detail_item.get('id')
-    info['address_customer_id'] = detail_item.get('customer_id')
-    info['address_first_name'] = detail_item.get('first_name')
-    info['address_last_name'] = detail_item.get('last_name')
-    info['address_name'] = detail_item.get('name')
-    info['address_phone'] = detail_item.get('phone')
-    info['address_company'] = detail_item.get('company')
-    info['address_street1'] = detail_item.get('address1')
-    info['address_street2'] = detail_item.get('address2')
-    info['address_city'] = detail_item.get('city')
-    info['address_province'] = detail_item.get('province')
-    info['address_province_code'] = detail_item.get('province_code')
-    info['address_zip'] = detail_item.get('zip')
-    info['address_country'] = detail_item.get('country')
-    info['address_country_code'] = detail_item.get('country_code')
-    info['address_country_name'] = detail_item.get('country_name')
-    info['address_default'] = detail_item.get('default')
+# the metafields of the customers, which are only looked up when they're requested
+METAFIELDS = Metafields('Customer')
 
-    return info
+# customers; there's a row for each address of each customer
+RESOURCE = Resource(
+    'customers',
+    PROPERTY_SPEC,
+    api_filters=API_FILTERS,
+    child_key='addresses',
+    joins=[METAFIELDS],
+    bulk_query=BULK_QUERY,
+    bulk_connections=BULK_CONNECTIONS,
+    get_bulk_item=get_bulk_item
+)
@@ -14,6 +14,14 @@
 #     type: string
 #     description: Filter to apply with key/values specified as a URL query string where the keys correspond to the properties to filter.
 #     required: false
+#   - name: mode
+#     type: string
+#     description: The rows to return; "orders" returns a row for each order and "line_items" returns a row for each line item of each order, including the line item properties (defaults to "orders").
+#     required: false
+#   - name: format
+#     type: string
+#     description: The format of the output; "ndjson" returns a JSON object for each row, "csv" returns a header row followed by the values of each row, "json" returns a JSON array with an array of the property names followed by an array of the values of each row, and "arrow" and "parquet" return an Arrow IPC stream or a Parquet file with the types listed in "Returns" (defaults to "ndjson").
+#     required: false
 # returns:
 #   - name: id
 #     type: integer
@@ -24,6 +32,33 @@
 #   - name: customer_id
 #     type: integer
 #     description: The id associated with the customer placing the order
+#   - name: customer_email
+#     type: string
+#     description: The email address of the customer (only returned when requested)
+#   - name: customer_first_name
+#     type: string
+#     description: The first name of the customer (only returned when requested)
+#   - name: customer_last_name
+#     type: string
+#     description: The last name of the customer (only returned when requested)
+#   - name: customer_phone
+#     type: string
+#     description: The phone number of the customer (only returned when requested)
+#   - name: customer_tags
+#     type: string
+#     description: The tags of the customer (only returned when requested)
+#   - name: customer_state
+#     type: string
+#     description: The state of the customer's account (only returned when requested)
+#   - name: customer_orders_count
+#     type: integer
+#     description: The number of orders placed by the customer (only returned when requested)
+#   - name: customer_total_spent
+#     type: number
+#     description: The total amount the customer has spent in the shop currency (only returned when requested)
+#   - name: customer_created_at
+#     type: string
+#     description: The date and time when the customer was created (only returned when requested)
 #   - name: billing_address_first_name
 #     type: string
 #     -description: The first name of the person associated with the payment method
@@ -156,163 +191,374 @@
 #   - name: total_price
 #     type: number
 #     description: The sum of all line item prices, discounts, shipping, taxes, and tips in the shop currency
+#   - name: line_item_id
+#     type: integer
+#     description: The id of the line item (line item mode)
+#   - name: line_item_product_id
+#     type: integer
+#     description: The id of the product of the line item (line item mode)
+#   - name: line_item_variant_id
+#     type: integer
+#     description: The id of the product variant of the line item (line item mode)
+#   - name: line_item_title
+#     type: string
+#     description: The title of the product of the line item (line item mode)
+#   - name: line_item_variant_title
+#     type: string
+#     description: The title of the product variant of the line item (line item mode)
+#   - name: line_item_sku
+#     type: string
+#     description: The unique identifier of the product variant in the shop (line item mode)
+#   - name: line_item_vendor
+#     type: string
+#     description: The name of the vendor of the line item (line item mode)
+#   - name: line_item_quantity
+#     type: integer
+#     description: The number of items that were purchased (line item mode)
+#   - name: line_item_price
+#     type: number
+#     description: The price of the item before discounts have been applied in the shop currency (line item mode)
+#   - name: line_item_total_discount
+#     type: number
+#     description: The total amount of the discount allocated to the line item in the shop currency (line item mode)
+#   - name: line_item_grams
+#     type: integer
+#     description: The weight of the item in grams (line item mode)
+#   - name: line_item_taxable
+#     type: boolean
+#     description: Whether the item is taxable (line item mode)
+#   - name: line_item_requires_shipping
+#     type: boolean
+#     description: Whether the item requires shipping (line item mode)
+#   - name: line_item_fulfillable_quantity
+#     type: integer
+#     description: The amount available to fulfill (line item mode)
+#   - name: line_item_fulfillment_status
+#     type: string
+#     description: How far along the line item is in the fulfillment process (line item mode)
+#   - name: line_item_refunded_quantity
+#     type: integer
+#     description: The number of items that have been refunded (line item mode)
+#   - name: line_item_refunded_subtotal
+#     type: number
+#     description: The subtotal of the refunds of the line item in the shop currency (line item mode)
+#   - name: line_item_refunded_tax
+#     type: number
+#     description: The total tax of the refunds of the line item in the shop currency (line item mode)
+#   - name: line_item_fulfillment_id
+#     type: integer
+#     description: The id of the latest fulfillment that includes the line item (line item mode)
+#   - name: line_item_fulfilled_at
+#     type: string
+#     description: The date and time when the latest fulfillment that includes the line item was created (line item mode)
+#   - name: line_item_tracking_company
+#     type: string
+#     description: The name of the tracking company of the latest fulfillment that includes the line item (line item mode)
+#   - name: line_item_tracking_number
+#     type: string
+#     description: The tracking number of the latest fulfillment that includes the line item (line item mode)
 # examples:
 #   - '""'
 #   - '"id, customer_id, created_at, total_price"'
+#   - '"id, customer_id, customer_email, customer_tags, customer_orders_count, total_price"'
 # ---
 
-import json
-import urllib
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from datetime import *
-from decimal import *
-from collections import OrderedDict
+import os
+import sys
+from decimal import Decimal
+
+# the pipeline shared by the functions is in the shopify_core package next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import shopify_core
+from shopify_core import Join, Resource
+from shopify_core.convert import to_date, to_id, to_money, to_number
 
 # main function entry point
 def flexio_handler(flex):
+    shopify_core.flexio_handler(RESOURCE, flex)
 
-    flex.output.content_type = 'application/x-ndjson'
-    for data in get_data(flex.vars):
-        flex.output.write(data)
+def get_data(params, session=None):
+    return shopify_core.get_data(RESOURCE, params, session)
 
-def get_data(params):
+# filters that are passed to the api as query params; see:
+# https://shopify.dev/docs/admin-api/rest/reference/orders/order#index-2020-04
+API_FILTERS = (
+    'ids', 'since_id', 'created_at_min', 'created_at_max', 'updated_at_min',
+    'updated_at_max', 'processed_at_min', 'processed_at_max', 'status',
+    'financial_status', 'fulfillment_status'
+)
 
-    # get the api key and company domain from the variable input
-    auth_token = dict(params).get('shopify_connection',{}).get('access_token')
-    api_base_uri = dict(params).get('shopify_connection',{}).get('api_base_uri')
+# properties returned by this function, matching the 'returns' in the header, along
+# with the api field each one is built from (a dotted path into the order) and the
+# conversion that's applied to it
+PROPERTY_SPEC = [
+    ('id',                             'integer', 'id',                                         None),
+    ('app_id',                         'integer', 'app_id',                                     None),
+    ('customer_id',                    'integer', 'customer.id',                                None),
+    ('customer_email',                 'string',  'customer_record.email',                      None),
+    ('customer_first_name',            'string',  'customer_record.first_name',                 None),
+    ('customer_last_name',             'string',  'customer_record.last_name',                  None),
+    ('customer_phone',                 'string',  'customer_record.phone',                      None),
+    ('customer_tags',                  'string',  'customer_record.tags',                       None),
+    ('customer_state',                 'string',  'customer_record.state',                      None),
+    ('customer_orders_count',          'integer', 'customer_record.orders_count',               None),
+    ('customer_total_spent',           'number',  'customer_record.total_spent',                to_money),
+    ('customer_created_at',            'string',  'customer_record.created_at',                 to_date),
+    ('billing_address_first_name',     'string',  'billing_address.first_name',                 None),
+    ('billing_address_last_name',      'string',  'billing_address.last_name',                  None),
+    ('billing_address_name',           'string',  'billing_address.name',                       None),
+    ('billing_address_phone',          'string',  'billing_address.phone',                      None),
+    ('billing_address_company',        'string',  'billing_address.company',                    None),
+    ('billing_address_street1',        'string',  'billing_address.address1',                   None),
+    ('billing_address_street2',        'string',  'billing_address.address2',                   None),
+    ('billing_address_city',           'string',  'billing_address.city',                       None),
+    ('billing_address_province',       'string',  'billing_address.province',                   None),
+    ('billing_address_province_code',  'string',  'billing_address.province_code',              None),
+    ('billing_address_zip',            'string',  'billing_address.zip',                        None),
+    ('billing_address_country',        'string',  'billing_address.country',                    None),
+    ('billing_address_country_code',   'string',  'billing_address.country_code',               None),
+    ('billing_address_latitude',       'number',  'billing_address.latitude',                   to_number),
+    ('billing_address_longitude',      'number',  'billing_address.longitude',                  to_number),
+    ('shipping_address_first_name',    'string',  'shipping_address.first_name',                None),
+    ('shipping_address_last_name',     'string',  'shipping_address.last_name',                 None),
+    ('shipping_address_name',          'string',  'shipping_address.name',                      None),
+    ('shipping_address_phone',         'string',  'shipping_address.phone',                     None),
+    ('shipping_address_company',       'string',  'shipping_address.company',                   None),
+    ('shipping_address_street1',       'string',  'shipping_address.address1',                  None),
+    ('shipping_address_street2',       'string',  'shipping_address.address2',                  None),
+    ('shipping_address_city',          'string',  'shipping_address.city',                      None),
+    ('shipping_address_province',      'string',  'shipping_address.province',                  None),
+    ('shipping_address_province_code', 'string',  'shipping_address.province_code',             None),
+    ('shipping_address_zip',           'string',  'shipping_address.zip',                       None),
+    ('shipping_address_country',       'string',  'shipping_address.country',                   None),
+    ('shipping_address_country_code',  'string',  'shipping_address.country_code',              None),
+    ('shipping_address_latitude',      'number',  'shipping_address.latitude',                  to_number),
+    ('shipping_address_longitude',     'number',  'shipping_address.longitude',                 to_number),
+    ('created_at',                     'string',  'created_at',                                 to_date),
+    ('updated_at',                     'string',  'updated_at',                                 to_date),
+    ('processed_at',                   'string',  'processed_at',                               to_date),
+    ('cancelled_at',                   'string',  'cancelled_at',                               to_date),
+    ('closed_at',                      'string',  'closed_at',                                  to_date),
+    ('currency',                       'string',  'currency',                                   None),
+    ('total_weight',                   'integer', 'total_weight',                               None),
+    ('total_line_items_price',         'number',  'total_line_items_price',                     to_money),
+    ('total_discounts',                'number',  'total_discounts',                            to_money),
+    ('subtotal_price',                 'number',  'subtotal_price',                             to_money),
+    ('total_shipping',                 'number',  'total_shipping_price_set.shop_money.amount', to_money),
+    ('total_tip_received',             'number',  'total_tip_received',                         to_money),
+    ('total_tax',                      'number',  'total_tax',                                  to_money),
+    ('total_price',                    'number',  'total_price',                                to_money),
+    ('line_item_id',                   'integer', 'line_items[].id',                            None),
+    ('line_item_product_id',           'integer', 'line_items[].product_id',                    None),
+    ('line_item_variant_id',           'integer', 'line_items[].variant_id',                    None),
+    ('line_item_title',                'string',  'line_items[].title',                         None),
+    ('line_item_variant_title',        'string',  'line_items[].variant_title',                 None),
+    ('line_item_sku',                  'string',  'line_items[].sku',                           None),
+    ('line_item_vendor',               'string',  'line_items[].vendor',                        None),
+    ('line_item_quantity',             'integer', 'line_items[].quantity',                      None),
+    ('line_item_price',                'number',  'line_items[].price',                         to_money),
+    ('line_item_total_discount',       'number',  'line_items[].total_discount',                to_money),
+    ('line_item_grams',                'integer', 'line_items[].grams',                         None),
+    ('line_item_taxable',              'boolean', 'line_items[].taxable',                       None),
+    ('line_item_requires_shipping',    'boolean', 'line_items[].requires_shipping',             None),
+    ('line_item_fulfillable_quantity', 'integer', 'line_items[].fulfillable_quantity',          None),
+    ('line_item_fulfillment_status',   'string',  'line_items[].fulfillment_status',            None),
+    ('line_item_refunded_quantity',    'integer', 'line_items[].refund.quantity',               None),
+    ('line_item_refunded_subtotal',    'number',  'line_items[].refund.subtotal',               to_money),
+    ('line_item_refunded_tax',         'number',  'line_items[].refund.total_tax',              to_money),
+    ('line_item_fulfillment_id',       'integer', 'line_items[].fulfillment.id',                None),
+    ('line_item_fulfilled_at',         'string',  'line_items[].fulfillment.created_at',        to_date),
+    ('line_item_tracking_company',     'string',  'line_items[].fulfillment.tracking_company',  None),
+    ('line_item_tracking_number',      'string',  'line_items[].fulfillment.tracking_number',   None),
+]
 
-    # see here for more info:
-    # https://shopify.dev/docs/admin-api/rest/reference/orders/order#index-2020-04
-    # https://shopify.dev/tutorials/make-paginated-requests-to-rest-admin-api
-
-    headers = {
-        'X-Shopify-Access-Token': auth_token
+# graphql bulk operation query for the orders, which uses aliases for the rest api
+# field names where it can; the rest is converted by get_bulk_item()
+BULK_QUERY = '''
+{
+  orders {
+    edges {
+      node {
+        id
+        customer { id }
+        billing_address: billingAddress {
+          first_name: firstName
+          last_name: lastName
+          name
+          phone
+          company
+          address1
+          address2
+          city
+          province
+          province_code: provinceCode
+          zip
+          country
+          country_code: countryCodeV2
+          latitude
+          longitude
+        }
+        shipping_address: shippingAddress {
+          first_name: firstName
+          last_name: lastName
+          name
+          phone
+          company
+          address1
+          address2
+          city
+          province
+          province_code: provinceCode
+          zip
+          country
+          country_code: countryCodeV2
+          latitude
+          longitude
+        }
+        created_at: createdAt
+        updated_at: updatedAt
+        processed_at: processedAt
+        cancelled_at: cancelledAt
+        closed_at: closedAt
+        currency: currencyCode
+        total_weight: totalWeight
+        total_discounts: totalDiscountsSet { shopMoney { amount } }
+        subtotal_price: subtotalPriceSet { shopMoney { amount } }
+        total_shipping_price_set: totalShippingPriceSet { shop_money: shopMoney { amount } }
+        total_tip_received: totalTipReceived { amount }
+        total_tax: totalTaxSet { shopMoney { amount } }
+        total_price: totalPriceSet { shopMoney { amount } }
+        lineItems {
+          edges {
+            node {
+              id
+              product { id }
+              variant { id }
+              title
+              variant_title: variantTitle
+              sku
+              vendor
+              quantity
+              price: originalUnitPriceSet { shopMoney { amount } }
+              total_discount: totalDiscountSet { shopMoney { amount } }
+              taxable
+              requires_shipping: requiresShipping
+              fulfillable_quantity: fulfillableQuantity
+              fulfillment_status: fulfillmentStatus
+            }
+          }
+        }
+      }
     }
-    url = api_base_uri + '/admin/api/2020-04/orders.json'
-
-    # api call defaults to open orders, so use 'any' status to get everything; also note:
-    # only last 60 days or orders are available with current oauth scope; additional oauth
-    # scope and app approval required for orders past 60 days; see:
-    # https://shopify.dev/tutorials/authenticate-a-public-app-with-oauth#orders-permissions
-    page_size = 250
-    url_query_params = {'limit': page_size, 'status': 'any'}
-    url_query_str = urllib.parse.urlencode(url_query_params)
-    page_url = url + '?' + url_query_str
+  }
+}
+'''
 
-    while True:
+# the list each type of object from a nested connection is added to
+BULK_CONNECTIONS = {
+    'LineItem': 'line_items',
+}
 
-        response = requests_retry_session().get(page_url, headers=headers)
-        response.raise_for_status()
-        content = response.json()
-        data = content.get('orders',[])
+# rest api fulfillment statuses of line items for each graphql fulfillment status
+FULFILLMENT_STATUSES = {
+    'UNFULFILLED': None,
+    'PARTIALLY_FULFILLED': 'partial',
+    'PARTIAL': 'partial',
+    'FULFILLED': 'fulfilled',
+    'NOT_ELIGIBLE': 'not_eligible',
+}
 
-        if len(data) == 0: # sanity check in case there's an issue with cursor
-            break
+def get_bulk_item(item):
 
-        buffer = ''
-        for item in data:
-            item = get_item_info(item)
-            buffer = buffer + json.dumps(item, default=to_string) + "\n"
-        yield buffer
+    # convert an order from the bulk operation results to the rest api format
+    item['id'] = to_id(item.get('id'))
+    item['customer'] = {'id': to_id((item.get('customer') or {}).get('id'))}
+    item['total_weight'] = int(item['total_weight']) if item.get('total_weight') is not None else None
+    for k in ('total_discounts', 'subtotal_price', 'total_tax', 'total_price'):
+        item[k] = ((item.get(k) or {}).get('shopMoney') or {}).get('amount')
+    item['total_tip_received'] = (item.get('total_tip_received') or {}).get('amount')
 
-        page_url = response.links.get('next',{}).get('url')
-        if page_url is None:
-            break
+    line_items = item.setdefault('line_items', [])
+    total_line_items_price = Decimal(0)
+    for line_item in line_items:
+        line_item['id'] = to_id(line_item.get('id'))
+        line_item['product_id'] = to_id((line_item.pop('product', None) or {}).get('id'))
+        line_item['variant_id'] = to_id((line_item.pop('variant', None) or {}).get('id'))
+        for k in ('price', 'total_discount'):
+            line_item[k] = ((line_item.get(k) or {}).get('shopMoney') or {}).get('amount')
+        status = (line_item.get('fulfillment_status') or '').upper()
+        line_item['fulfillment_status'] = FULFILLMENT_STATUSES.get(status, status.lower() or None)
+        total_line_items_price += Decimal(line_item.get('price') or 0) * (line_item.get('quantity') or 0)
+    item['total_line_items_price'] = str(total_line_items_price)
+    return item
 
-def requests_retry_session(
-    retries=3,
-    backoff_factor=0.3,
-    status_forcelist=(429, 500, 502, 503, 504),
-    session=None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+def get_line_items(header_item):
 
-def to_date(value):
-    # TODO: convert if needed
-    return value
+    # join each line item with the totals of its refunds and with the latest fulfillment
+    # that includes it, which are added to a copy of the line item as 'refund' and
+    # 'fulfillment' objects
+    refunds = {}
+    for refund in header_item.get('refunds') or []:
+        for refund_line_item in refund.get('refund_line_items') or []:
+            totals = refunds.setdefault(refund_line_item.get('line_item_id'), {'quantity': 0, 'subtotal': Decimal(0), 'total_tax': Decimal(0)})
+            totals['quantity'] += refund_line_item.get('quantity') or 0
+            totals['subtotal'] += Decimal(str(refund_line_item.get('subtotal') or 0))
+            totals['total_tax'] += Decimal(str(refund_line_item.get('total_tax') or 0))
 
-def to_number(value):
-    if value is None:
-        return value
-    try:
-        v = value
-        return float(v)
-    except ValueError:
-        return value
+    fulfillments = {}
+    for fulfillment in header_item.get('fulfillments') or []:
+        for fulfillment_line_item in fulfillment.get('line_items') or []:
+            fulfillments[fulfillment_line_item.get('id')] = fulfillment
 
-def to_string(value):
-    if isinstance(value, (date, datetime)):
-        return value.isoformat()
-    if isinstance(value, (int)):
-        return str(value)
-    if isinstance(value, (Decimal)):
-        return str(value)
-    return value
+    # (orders from bulk operations don't have refunds)
+    no_refund = {'quantity': 0, 'subtotal': 0, 'total_tax': 0} if 'refunds' in header_item else {}
+    detail_items = []
+    for line_item in header_item.get('line_items') or []:
+        line_item_id = line_item.get('id')
+        detail_items.append(dict(line_item, refund=refunds.get(line_item_id, no_refund), fulfillment=fulfillments.get(line_item_id)))
+    return detail_items
 
-def get_item_info(item):
+def get_customer_ids(data):
+    return [(item.get('customer') or {}).get('id') for item in data]
 
-    # map this function's property names to the API's property names
-    info = OrderedDict()
+def add_customers(data, customers):
+    for item in data:
+        item['customer_record'] = customers.get((item.get('customer') or {}).get('id'))
 
-    info['id'] = item.get('id')
-    info['app_id'] = item.get('app_id')
-    info['customer_id'] = (item.get('customer') or {}).get('id')
-    info['billing_address_first_name'] = (item.get('billing_address') or {}).get('first_name')
-    info['billing_address_last_name'] = (item.get('billing_address') or {}).get('last_name')
-    info['billing_address_name'] = (item.get('billing_address') or {}).get('name')
-    info['billing_address_phone'] = (item.get('billing_address') or {}).get('phone')
-    info['billing_address_company'] = (item.get('billing_address') or {}).get('company')
-    info['billing_address_street1'] = (item.get('billing_address') or {}).get('address1')
-    info['billing_address_street2'] = (item.get('billing_address') or {}).get('address2')
-    info['billing_address_city'] = (item.get('billing_address') or {}).get('city')
-    info['billing_address_province'] = (item.get('billing_address') or {}).get('province')
-    info['billing_address_province_code'] = (item.get('billing_address') or {}).get('province_code')
-    info['billing_address_zip'] = (item.get('billing_address') or {}).get('zip')
-    info['billing_address_country'] = (item.get('billing_address') or {}).get('country')
-    info['billing_address_country_code'] = (item.get('billing_address') or {}).get('country_code')
-    info['billing_address_latitude'] = to_number((item.get('billing_address') or {}).get('latitude'))
-    info['billing_address_longitude'] = to_number((item.get('billing_address') or {}).get('longitude'))
-    info['shipping_address_first_name'] = (item.get('shipping_address') or {}).get('first_name')
-    info['shipping_address_last_name'] = (item.get('shipping_address') or {}).get('last_name')
-    info['shipping_address_name'] = (item.get('shipping_address') or {}).get('name')
-    info['shipping_address_phone'] = (item.get('shipping_address') or {}).get('phone')
-    info['shipping_address_company'] = (item.get('shipping_address') or {}).get('company')
-    info['shipping_address_street1'] = (item.get('shipping_address') or {}).get('address1')
-    info['shipping_address_street2'] = (item.get('shipping_address') or {}).get('address2')
-    info['shipping_address_city'] = (item.get('shipping_address') or {}).get('city')
-    info['shipping_address_province'] = (item.get('shipping_address') or {}).get('province')
-    info['shipping_address_province_code'] = (item.get('shipping_address') or {}).get('province_code')
-    info['shipping_address_zip'] = (item.get('shipping_address') or {}).get('zip')
-    info['shipping_address_country'] = (item.get('shipping_address') or {}).get('country')
-    info['shipping_address_country_code'] = (item.get('shipping_address') or {}).get('country_code')
-    info['shipping_address_latitude'] = to_number((item.get('shipping_address') or {}).get('latitude'))
-    info['shipping_address_longitude'] = to_number((item.get('shipping_address') or {}).get('longitude'))
-    info['created_at'] = to_date(item.get('created_at'))
-    info['updated_at'] = to_date(item.get('updated_at'))
-    info['processed_at'] = to_date(item.get('processed_at'))
-    info['cancelled_at'] = to_date(item.get('cancelled_at'))
-    info['closed_at'] = to_date(item.get('closed_at'))
-    info['currency'] = item.get('currency')
-    info['total_weight'] = item.get('total_weight')
-    info['total_line_items_price'] = to_number(item.get('total_line_items_price'))
-    info['total_discounts'] = to_number(item.get('total_discounts'))
-    info['subtotal_price'] = to_number(item.get('subtotal_price'))
-    info['total_shipping'] = to_number((item.get('total_shipping_price_set') or {}).get('shop_money',{}).get('amount'))
-    info['total_tip_received'] = to_number(item.get('total_tip_received'))
-    info['total_tax'] = to_number(item.get('total_tax'))
-    info['total_price'] = to_number(item.get('total_price'))
+# the customer of each order, which is only looked up when customer properties other
+# than the id are requested; the customers of up to 250 orders are requested at a time,
+# and the most recently used customers are kept for the later pages of the call so
+# repeat customers are only requested once; see:
+# https://shopify.dev/docs/admin-api/rest/reference/customers/customer#index-2020-04
+CUSTOMERS = Join(
+    'customers',
+    ['customer_email', 'customer_first_name', 'customer_last_name', 'customer_phone', 'customer_tags',
+     'customer_state', 'customer_orders_count', 'customer_total_spent', 'customer_created_at'],
+    get_customer_ids,
+    add_customers,
+    fields=['customer'],
+    query_params={'fields': 'id,email,first_name,last_name,phone,tags,state,orders_count,total_spent,created_at'},
+    cache_size=10000
+)
 
-    return info
+# orders; there's a row for each order, or a row for each line item in 'line_items'
+# mode; the api defaults to open orders, so the 'any' status gets everything; also
+# note: only the last 60 days of orders are available with the current oauth scope;
+# additional oauth scope and app approval are required for older orders; see:
+# https://shopify.dev/tutorials/authenticate-a-public-app-with-oauth#orders-permissions
+RESOURCE = Resource(
+    'orders',
+    PROPERTY_SPEC,
+    api_filters=API_FILTERS,
+    query_params={'status': 'any'},
+    child_key='line_items',
+    child_mode='line_items',
+    get_children=get_line_items,
+    child_fields={'refund': ['refunds'], 'fulfillment': ['fulfillments']},
+    joins=[CUSTOMERS],
+    shard_by='created_at',
+    bulk_query=BULK_QUERY,
+    bulk_connections=BULK_CONNECTIONS,
+    get_bulk_item=get_bulk_item
+)
@@ -8,12 +8,20 @@
 # params:
 #   - name: properties
 #     type: array
-#     description: The properties to return (defaults to all properties). See "Returns" for a listing of the available properties.
+#     description: The properties to return (defaults to all properties). See "Returns" for a listing of the available properties, along with a "metafields.<namespace>.<key>" property for any metafield.
 #     required: false
 #   - name: filter
 #     type: string
 #     description: Filter to apply with key/values specified as a URL query string where the keys correspond to the properties to filter.
 #     required: false
+#   - name: mode
+#     type: string
+#     description: The rows to return; "products" returns a row for each variant of each product and "inventory_levels" returns a row for each location that stocks each variant, including the inventory level properties (defaults to "products").
+#     required: false
+#   - name: format
+#     type: string
+#     description: The format of the output; "ndjson" returns a JSON object for each row, "csv" returns a header row followed by the values of each row, "json" returns a JSON array with an array of the property names followed by an array of the values of each row, and "arrow" and "parquet" return an Arrow IPC stream or a Parquet file with the types listed in "Returns" (defaults to "ndjson").
+#     required: false
 # returns:
 #   - name: id
 #     type: integer
@@ -51,6 +59,9 @@
 #   - name: tags
 #     type: string
 #     description: A comma-separated list of tags that are used for filtering and searching products
+#   - name: metafields
+#     type: string
+#     description: The metafields of the product as a JSON object with the value of each metafield keyed on its lowercase namespace and key separated by a period; the value of a single metafield is returned by a property named "metafields." followed by the namespace and key (e.g. "metafields.custom.material") (only returned when requested)
 #   - name: variant_id
 #     type: integer
 #     description: The unique identifier for a product variant
@@ -113,174 +124,268 @@
 #     description: The total inventory for the product variant across all locations
 #   - name: image_id
 #     type: integer
-#     description: The unique identifier for an image for the product
+#     description: The unique identifier of the image for the product variant, which is the image for the product if the variant doesn't have its own
 #   - name: image_created_at
 #     type: string
-#     description: The date the image for the product was created
+#     description: The date the image for the product variant was created
 #   - name: image_udpated_at
 #     type: string
-#     description: The date the image for the product was last updated
+#     description: The date the image for the product variant was last updated
 #   - name: image_width
 #     type: integer
-#     description: The width of the image for the product
+#     description: The width of the image for the product variant
 #   - name: image_height
 #     type: integer
-#     description: The height of the image for the product
+#     description: The height of the image for the product variant
 #   - name: image_src
 #     type: string
-#     description: A link to the image for the product
+#     description: A link to the image for the product variant
+#   - name: inventory_location_id
+#     type: integer
+#     description: The id of the location of the inventory level of the product variant (inventory level mode)
+#   - name: inventory_available
+#     type: integer
+#     description: The quantity of the product variant that's available at the location (inventory level mode)
+#   - name: inventory_updated_at
+#     type: string
+#     description: The date the inventory level of the product variant at the location was last updated (inventory level mode)
 # examples:
 #   - '""'
 #   - '"id, title, sku, price"'
+#   - '"id, title, metafields.custom.material"'
 # ---
 
-import json
-import urllib
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from datetime import *
-from decimal import *
-from collections import OrderedDict
+import os
+import sys
+
+# the pipeline shared by the functions is in the shopify_core package next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import shopify_core
+from shopify_core import Join, Resource
+from shopify_core.convert import to_date, to_id, to_json, to_money
+from shopify_core.metafields import Metafields
 
 # main function entry point
 def flexio_handler(flex):
+    shopify_core.flexio_handler(RESOURCE, flex)
 
-    flex.output.content_type = 'application/x-ndjson'
-    for data in get_data(flex.vars):
-        flex.output.write(data)
+def get_data(params, session=None):
+    return shopify_core.get_data(RESOURCE, params, session)
 
-def get_data(params):
+# filters that are passed to the api as query params; see:
+# https://shopify.dev/docs/admin-api/rest/reference/products/product#index-2020-04
+API_FILTERS = (
+    'ids', 'since_id', 'title', 'vendor', 'handle', 'product_type', 'collection_id',
+    'created_at_min', 'created_at_max', 'updated_at_min', 'updated_at_max',
+    'published_at_min', 'published_at_max', 'published_status'
+)
 
-    # get the api key and company domain from the variable input
-    auth_token = dict(params).get('shopify_connection',{}).get('access_token')
-    api_base_uri = dict(params).get('shopify_connection',{}).get('api_base_uri')
+# properties returned by this function, matching the 'returns' in the header, along
+# with the api field each one is built from and the conversion that's applied to it;
+# fields are a dotted path into the product, where 'variants[].' refers to each of its variants
+# (see get_variants())
+PROPERTY_SPEC = [
+    ('id',                    'integer', 'id',                                     None),
+    ('title',                 'string',  'title',                                  None),
+    ('body_html',             'string',  'body_html',                              None),
+    ('handle',                'string',  'handle',                                 None),
+    ('vendor',                'string',  'vendor',                                 None),
+    ('product_type',          'string',  'product_type',                           None),
+    ('created_at',            'string',  'created_at',                             to_date),
+    ('updated_at',            'string',  'updated_at',                             to_date),
+    ('published_at',          'string',  'published_at',                           to_date),
+    ('published_scope',       'string',  'published_scope',                        None),
+    ('template_suffix',       'string',  'template_suffix',                        None),
+    ('tags',                  'string',  'tags',                                   None),
+    ('metafields',            'string',  'metafields',                             to_json),
+    ('variant_id',            'integer', 'variants[].id',                          None),
+    ('variant_title',         'string',  'variants[].title',                       None),
+    ('variant_option1',       'string',  'variants[].option1',                     None),
+    ('variant_option2',       'string',  'variants[].option2',                     None),
+    ('variant_option3',       'string',  'variants[].option3',                     None),
+    ('variant_created_at',    'string',  'variants[].created_at',                  to_date),
+    ('variant_updated_at',    'string',  'variants[].updated_at',                  to_date),
+    ('sku',                   'string',  'variants[].sku',                         None),
+    ('barcode',               'string',  'variants[].barcode',                     None),
+    ('price',                 'number',  'variants[].price',                       to_money),
+    ('compare_at_price',      'number',  'variants[].compare_at_price',            to_money),
+    ('inventory_policy',      'string',  'variants[].inventory_policy',            None),
+    ('inventory_management',  'string',  'variants[].inventory_management',        None),
+    ('fulfillment_service',   'string',  'variants[].fulfillment_service',         None),
+    ('taxable',               'boolean', 'variants[].taxable',                     None),
+    ('grams',                 'number',  'variants[].grams',                       None),
+    ('weight',                'number',  'variants[].weight',                      None),
+    ('weight_unit',           'string',  'variants[].weight_unit',                 None),
+    ('inventory_item_id',     'integer', 'variants[].inventory_item_id',           None),
+    ('inventory_quantity',    'integer', 'variants[].inventory_quantity',          None),
+    ('image_id',              'integer', 'variants[].image.id',                    None),
+    ('image_created_at',      'string',  'variants[].image.created_at',            to_date),
+    ('image_udpated_at',      'string',  'variants[].image.updated_at',            to_date),
+    ('image_width',           'integer', 'variants[].image.width',                 None),
+    ('image_height',          'integer', 'variants[].image.height',                None),
+    ('image_src',             'string',  'variants[].image.src',                   None),
+    ('inventory_location_id', 'integer', 'variants[].inventory_level.location_id', None),
+    ('inventory_available',   'integer', 'variants[].inventory_level.available',   None),
+    ('inventory_updated_at',  'string',  'variants[].inventory_level.updated_at',  to_date),
+]
 
-    # see here for more info:
-    # https://shopify.dev/docs/admin-api/rest/reference/products/product#index-2020-04
-    # https://shopify.dev/tutorials/make-paginated-requests-to-rest-admin-api
-
-    headers = {
-        'X-Shopify-Access-Token': auth_token
+# graphql bulk operation query for the products, which uses aliases for the rest api
+# field names where it can; the rest is converted by get_bulk_item()
+BULK_QUERY = '''
+{
+  products {
+    edges {
+      node {
+        id
+        title
+        body_html: descriptionHtml
+        handle
+        vendor
+        product_type: productType
+        created_at: createdAt
+        updated_at: updatedAt
+        published_at: publishedAt
+        template_suffix: templateSuffix
+        tags
+        images {
+          edges {
+            node {
+              id
+              src: originalSrc
+              width
+              height
+            }
+          }
+        }
+        variants {
+          edges {
+            node {
+              id
+              title
+              selectedOptions { value }
+              created_at: createdAt
+              updated_at: updatedAt
+              sku
+              barcode
+              price
+              compare_at_price: compareAtPrice
+              inventory_policy: inventoryPolicy
+              inventory_management: inventoryManagement
+              fulfillmentService { handle }
+              taxable
+              weight
+              weight_unit: weightUnit
+              inventoryItem { id }
+              inventory_quantity: inventoryQuantity
+              image { id }
+            }
+          }
+        }
+      }
     }
-    url = api_base_uri + '/admin/api/2020-04/products.json'
-
-    page_size = 250
-    url_query_params = {'limit': page_size}
-    url_query_str = urllib.parse.urlencode(url_query_params)
-    page_url = url + '?' + url_query_str
-
-    while True:
-
-        response = requests_retry_session().get(page_url, headers=headers)
-        response.raise_for_status()
-        content = response.json()
-        data = content.get('products',[])
-
-        if len(data) == 0: # sanity check in case there's an issue with cursor
-            break
-
-        buffer = ''
-        for header_item in data:
-            detail_items_all =  header_item.get('variants',[])
-            if len(detail_items_all) == 0:
-                item = get_item_info(header_item, {}) # if we don't have any variants, make sure to return item header info
-                buffer = buffer + json.dumps(item, default=to_string) + "\n"
-            else:
-                for detail_item in detail_items_all:
-                    item = get_item_info(header_item, detail_item)
-                    buffer = buffer + json.dumps(item, default=to_string) + "\n"
-        yield buffer
+  }
+}
+'''
 
-        page_url = response.links.get('next',{}).get('url')
-        if page_url is None:
-            break
+# the list each type of object from a nested connection is added to
+BULK_CONNECTIONS = {
+    'ProductImage': 'images',
+    'ProductVariant': 'variants',
+}
 
-def requests_retry_session(
-    retries=3,
-    backoff_factor=0.3,
-    status_forcelist=(429, 500, 502, 503, 504),
-    session=None,
-):
-    session = session or requests.Session()
-    retry = Retry(
-        total=retries,
-        read=retries,
-        connect=retries,
-        backoff_factor=backoff_factor,
-        status_forcelist=status_forcelist,
-    )
-    adapter = HTTPAdapter(max_retries=retry)
-    session.mount('http://', adapter)
-    session.mount('https://', adapter)
-    return session
+# rest api weight units and grams per unit for each graphql weight unit
+WEIGHT_UNITS = {
+    'GRAMS': ('g', 1),
+    'KILOGRAMS': ('kg', 1000),
+    'OUNCES': ('oz', 28.349523125),
+    'POUNDS': ('lb', 453.59237),
+}
 
-def to_date(value):
-    # TODO: convert if needed
-    return value
+def get_bulk_item(item):
 
-def to_number(value):
-    try:
-        v = value
-        return float(v)
-    except ValueError:
-        return value
+    # convert a product from the bulk operation results to the rest api format; the
+    # product's image is its first image
+    item['id'] = to_id(item.get('id'))
+    item['tags'] = ', '.join(item.get('tags') or [])
 
-def to_string(value):
-    if isinstance(value, (date, datetime)):
-        return value.isoformat()
-    if isinstance(value, (int)):
-        return str(value)
-    if isinstance(value, (Decimal)):
-        return str(value)
-    return value
+    images = item.setdefault('images', [])
+    for image in images:
+        image['id'] = to_id(image.get('id'))
+        image['product_id'] = item['id']
+    item['image'] = images[0] if len(images) > 0 else None
 
-def get_item_info(header_item, detail_item):
+    for variant in item.setdefault('variants', []):
+        variant['id'] = to_id(variant.get('id'))
+        variant['product_id'] = item['id']
+        for i, option in enumerate(variant.pop('selectedOptions', None) or []):
+            variant['option%d' % (i+1)] = option.get('value')
+        for k in ('inventory_policy', 'inventory_management'):
+            variant[k] = (variant.get(k) or '').lower() or None
+        variant['fulfillment_service'] = (variant.pop('fulfillmentService', None) or {}).get('handle')
+        variant['inventory_item_id'] = to_id((variant.pop('inventoryItem', None) or {}).get('id'))
+        variant['image_id'] = to_id((variant.pop('image', None) or {}).get('id'))
+        unit, grams = WEIGHT_UNITS.get(variant.get('weight_unit'), (None, None))
+        variant['weight_unit'] = unit
+        variant['grams'] = round(variant['weight'] * grams) if variant.get('weight') is not None and grams is not None else None
+    return item
 
-    # map this function's property names to the API's property names
-    info = OrderedDict()
+def get_variants(header_item):
 
-    info['id'] = header_item.get('id')
-    info['title'] = header_item.get('title')
-    info['body_html'] = header_item.get('body_html')
-    info['handle'] = header_item.get('handle')
-    info['vendor'] = header_item.get('vendor')
-    info['product_type'] = header_item.get('product_type')
-    info['created_at'] = to_date(header_item.get('created_at'))
-    info['updated_at'] = to_date(header_item.get('updated_at'))
-    info['published_at'] = to_date(header_item.get('published_at'))
-    info['published_scope'] = header_item.get('published_scope')
-    info['template_suffix'] = header_item.get('template_suffix')
-    info['tags'] = header_item.get('tags')
-    info['variant_id'] = detail_item.get('variant_id')
-    info['variant_title'] = detail_item.get('title')
-    info['variant_option1'] = detail_item.get('option1')
-    info['variant_option2'] = detail_item.get('option2')
-    info['variant_option3'] = detail_item.get('option3')
-    info['variant_created_at'] = to_date(detail_item.get('created_at'))
-    info['variant_updated_at'] = to_date(detail_item.get('updated_at'))
-    info['sku'] = detail_item.get('sku')
-    info['barcode'] = detail_item.get('barcode')
-    info['price'] = to_number(detail_item.get('price'))
-    info['compare_at_price'] = to_number(detail_item.get('compare_at_price'))
-    info['inventory_policy'] = detail_item.get('inventory_policy')
-    info['inventory_management'] = detail_item.get('inventory_management')
-    info['fulfillment_service'] = detail_item.get('fulfillment_service')
-    info['taxable'] = detail_item.get('taxable')
-    info['grams'] = detail_item.get('grams')
-    info['weight'] = detail_item.get('weight')
-    info['weight_unit'] = detail_item.get('weight_unit')
-    info['inventory_item_id'] = detail_item.get('inventory_item_id')
-    info['inventory_quantity'] = detail_item.get('inventory_quantity')
-    info['image_id'] = header_item.get('image').get('id')
-    info['image_created_at'] = to_date(header_item.get('image').get('created_at'))
-    info['image_udpated_at'] = to_date(header_item.get('image').get('updated_at'))
-    info['image_width'] = header_item.get('image').get('width')
-    info['image_height'] = header_item.get('image').get('height')
-    info['image_src'] = header_item.get('image').get('src')
+    # add the image of each variant to a copy of the variant as an 'image' object, which
+    # is the product's image if the variant doesn't have its own; the product's images
+    # are indexed by id once so that the image of each variant is a single lookup; in
+    # inventory level mode, there's a copy of the variant for each of its inventory
+    # levels, which is added as an 'inventory_level' object
+    images = {image.get('id'): image for image in header_item.get('images') or []}
+    product_image = header_item.get('image')
+    detail_items = []
+    for variant in header_item.get('variants') or []:
+        variant = dict(variant, image=images.get(variant.get('image_id')) or product_image)
+        if 'inventory_levels' not in variant:
+            detail_items.append(variant)
+            continue
+        for inventory_level in variant.pop('inventory_levels') or [None]:
+            detail_items.append(dict(variant, inventory_level=inventory_level))
+    return detail_items
 
-    return info
+def get_inventory_item_ids(data):
+    return [variant.get('inventory_item_id') for item in data for variant in item.get('variants') or []]
 
+def add_inventory_levels(data, inventory_levels):
+    for item in data:
+        for variant in item.get('variants') or []:
+            variant['inventory_levels'] = inventory_levels.get(variant.get('inventory_item_id')) or []
 
+# the inventory levels of the variants at each location in inventory level mode; the
+# levels of up to 50 inventory items can be requested at a time; see:
+# https://shopify.dev/docs/admin-api/rest/reference/inventory/inventorylevel#index-2020-04
+INVENTORY_LEVELS = Join(
+    'inventory_levels',
+    ['inventory_location_id', 'inventory_available', 'inventory_updated_at'],
+    get_inventory_item_ids,
+    add_inventory_levels,
+    mode='inventory_levels',
+    fields=['variants'],
+    key_param='inventory_item_ids',
+    key_field='inventory_item_id',
+    batch_size=50,
+    many=True
+)
 
+# the metafields of the products, which are only looked up when they're requested
+METAFIELDS = Metafields('Product')
 
+# products; there's a row for each variant of each product
+RESOURCE = Resource(
+    'products',
+    PROPERTY_SPEC,
+    api_filters=API_FILTERS,
+    child_key='variants',
+    get_children=get_variants,
+    child_fields={'image': ['images', 'image']},
+    joins=[INVENTORY_LEVELS, METAFIELDS],
+    bulk_query=BULK_QUERY,
+    bulk_connections=BULK_CONNECTIONS,
+    get_bulk_item=get_bulk_item
+)
@@ -0,0 +1,7 @@
+# the pipeline shared by the shopify functions; each function describes its resource
+# with a Resource and hands its calls to flexio_handler() and get_data()
+
+from shopify_core.resource import Join, Resource
+from shopify_core.pipeline import flexio_handler, get_data
+
+__all__ = ['Join', 'Resource', 'flexio_handler', 'get_data']
@@ -0,0 +1,322 @@
+# requests to the admin api; every request to a shop is paced by the shop's rate
+# limiter, and the pages of a list are requested one after the other
+
+import re
+import json
+import queue
+import codecs
+import urllib.parse
+import threading
+import requests
+from time import monotonic, sleep
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from shopify_core import settings
+from shopify_core.trace import NULL_TRACE
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def requests_retry_session(
+    retries=3,
+    backoff_factor=0.3,
+    status_forcelist=(500, 502, 503, 504),
+    pool_connections=1,
+    pool_maxsize=10,
+    timings=None,
+    session=None,
+):
+    session = session or requests.Session()
+    retry = Retry(
+        total=retries,
+        read=retries,
+        connect=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=status_forcelist,
+        respect_retry_after_header=False, # rate limited requests are retried in get_response
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if timings is not None:
+        # record the round-trip time of each request as (url, seconds)
+        session.hooks['response'].append(lambda response, *args, **kwargs: timings.append((response.url, response.elapsed.total_seconds())))
+    return session
+
+def get_response(session, url, headers, trace=NULL_TRACE, stream=False):
+
+    # make a request, pacing it with the shop's rate limiter, and retry it after the
+    # Retry-After time if the shop's rate limit is hit anyway; a streamed response's
+    # content is read by the caller, which closes it
+    limiter = get_rate_limiter(url)
+    for attempt in range(settings.RATE_LIMIT_RETRIES + 1):
+        t = trace.now()
+        sleep(limiter.reserve())
+        t = trace.lap('throttle', t)
+        if stream:
+            response = session.get(url, headers=headers, stream=True)
+        else:
+            response = session.get(url, headers=headers)
+        trace.lap('network', t)
+        limiter.update(response.status_code, response.headers)
+        if trace.enabled:
+            # urllib3 records the retries of server errors made by the session's adapter
+            retries = getattr(getattr(response, 'raw', None), 'retries', None)
+            trace.count('requests')
+            trace.count('retries', len(retries.history) if retries is not None else 0)
+            if not stream:
+                trace.count('bytes_in', len(response.content))
+        if response.status_code != 429:
+            break
+        trace.count('throttled')
+        if stream:
+            response.close()
+    response.raise_for_status()
+    return response
+
+class RateLimiter():
+
+    # token bucket that mirrors a shop's leaky bucket; the fill level is estimated from
+    # the calls that have been made and corrected from the response headers, so that
+    # all the threads making requests to the same shop share the same bucket
+
+    def __init__(self, size=40):
+        self.lock = threading.Lock()
+        self.size = size
+        self.level = 0.0
+        self.updated = monotonic()
+        self.blocked_until = 0.0
+
+    def leak(self, now):
+        self.level = max(0.0, self.level - (now - self.updated) * self.size / 20.0)
+        self.updated = now
+
+    def reserve(self):
+        # reserve a call and return the number of seconds to wait before making it
+        with self.lock:
+            now = monotonic()
+            self.leak(now)
+            wait = max(0.0, self.blocked_until - now)
+            overflow = self.level + 1 - (self.size - settings.RATE_LIMIT_HEADROOM)
+            if overflow > 0:
+                wait = max(wait, overflow / (self.size / 20.0))
+            self.level += 1
+            return wait
+
+    def update(self, status_code, headers):
+        # the header has the calls used and the bucket size (e.g. '32/40'); keep the
+        # higher of the reported and estimated levels since the estimate includes calls
+        # from other threads that are still in flight
+        with self.lock:
+            now = monotonic()
+            self.leak(now)
+            call_limit = headers.get('X-Shopify-Shop-Api-Call-Limit')
+            if call_limit is not None:
+                try:
+                    used, size = [int(v) for v in call_limit.split('/')]
+                    self.size = size
+                    self.level = max(self.level, float(used))
+                except ValueError:
+                    pass
+            if status_code == 429:
+                try:
+                    retry_after = float(headers.get('Retry-After', 1.0))
+                except ValueError:
+                    retry_after = 1.0
+                self.level = float(self.size)
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+# rate limiters for each shop
+RATE_LIMITERS = {}
+RATE_LIMITERS_LOCK = threading.Lock()
+
+def get_rate_limiter(url):
+    shop = urllib.parse.urlparse(url).netloc
+    with RATE_LIMITERS_LOCK:
+        if shop not in RATE_LIMITERS:
+            RATE_LIMITERS[shop] = RateLimiter()
+        return RATE_LIMITERS[shop]
+
+def get_shop_time(response):
+    # returns the shop's time when the response was made from its date, to the second
+    date = response.headers.get('Date')
+    now = parsedate_to_datetime(date) if date is not None else datetime.now(timezone.utc)
+    return now.replace(microsecond=0).isoformat()
+
+def json_loads(content):
+    # decode json straight from the response bytes with orjson if it's installed
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+def get_pages(resource, session, page_url, headers, trace=NULL_TRACE):
+
+    while True:
+
+        response = get_response(session, page_url, headers, trace)
+        t = trace.now()
+        content = json_loads(response.content)
+        trace.lap('decode', t)
+        data = content.get(resource.name,[])
+
+        if len(data) == 0: # sanity check in case there's an issue with cursor
+            break
+
+        yield data
+
+        page_url = response.links.get('next',{}).get('url')
+        if page_url is None:
+            break
+
+def get_streamed_pages(resource, session, page_url, headers, trace=NULL_TRACE):
+
+    # like get_pages(), but each page is read as a stream and each record is returned as
+    # a page of its own as soon as it's decoded, followed by an empty page at the end of
+    # each page of the api
+    while True:
+
+        response = get_response(session, page_url, headers, trace, stream=True)
+        try:
+            def read():
+                for content in response.iter_content(settings.STREAM_READ_SIZE):
+                    trace.count('bytes_in', len(content))
+                    yield content
+
+            count = 0
+            done = object()
+            items = get_json_items(read(), resource.name)
+            while True:
+                t = trace.now()
+                item = next(items, done)
+                trace.lap('decode', t)
+                if item is done:
+                    break
+                count += 1
+                yield [item]
+        finally:
+            response.close()
+
+        if count == 0: # sanity check in case there's an issue with cursor
+            break
+
+        yield []
+
+        page_url = response.links.get('next',{}).get('url')
+        if page_url is None:
+            break
+
+JSON_DECODER = json.JSONDecoder()
+JSON_SEPARATORS = re.compile(r'[\s,]*')
+
+def get_json_items(contents, key):
+
+    # return the objects in the list under the key of a json object (e.g. the orders of
+    # {"orders": [...]}) one at a time as they're read from the contents, which are the
+    # bytes of the json; the text that's been read is decoded an object at a time, and
+    # an object that isn't complete is decoded again once there's at least twice as much
+    # text, so large objects are decoded a bounded number of times
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    contents = iter(contents)
+    text = ''
+
+    def read(size):
+        # read until there's at least the given amount of text; returns the text that's
+        # been read, which is shorter at the end of the contents
+        nonlocal text
+        for content in contents:
+            text += decoder.decode(content)
+            if len(text) >= size:
+                break
+        return text
+
+    # find the start of the list; if the key isn't the first one in the object, decode
+    # the whole object instead
+    while '[' not in text and len(text) < len(read(len(text) + 1)):
+        pass
+    match = re.compile(r'\s*\{\s*"%s"\s*:\s*\[' % re.escape(key)).match(text)
+    if match is None:
+        while len(text) < len(read(len(text) + 1)):
+            pass
+        yield from json.loads(text).get(key, [])
+        return
+
+    pos = match.end()
+    while True:
+        pos = JSON_SEPARATORS.match(text, pos).end()
+        if pos == len(text):
+            if len(text) == len(read(len(text) + 1)):
+                raise ValueError('Unexpected end of the list of %s' % key)
+            continue
+        if text[pos] == ']':
+            return
+        try:
+            item, end = JSON_DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            size = len(text)
+            if size == len(read(pos + 2 * (size - pos))):
+                raise
+            continue
+        text = text[end:]
+        pos = 0
+        yield item
+
+def get_prefetched_pages(pages, depth):
+
+    # iterate the pages in a background thread that stays up to depth pages ahead of
+    # the caller; the thread blocks when the queue is full, and stops and closes the
+    # pages when the caller stops early
+    done = object()
+    stop = threading.Event()
+    prefetched = queue.Queue(maxsize=depth)
+
+    def put(value):
+        while not stop.is_set():
+            try:
+                prefetched.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def run():
+        try:
+            for data in pages:
+                if not put(data):
+                    break
+            else:
+                put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            pages.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            data = prefetched.get()
+            if data is done:
+                break
+            if isinstance(data, Exception):
+                raise data
+            yield data
+    finally:
+        stop.set()
+
+def get_item_count(resource, session, url, headers):
+
+    response = get_response(session, get_count_url(url, resource.query_params), headers)
+    return json_loads(response.content).get('count', 0)
+
+def get_count_url(url, query_params):
+
+    # the count of a list is next to it (e.g. orders/count.json for orders.json)
+    count_url = url[:-len('.json')] + '/count.json'
+    if len(query_params) > 0:
+        count_url += '?' + urllib.parse.urlencode(query_params)
+    return count_url
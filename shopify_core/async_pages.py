@@ -0,0 +1,102 @@
+# the async fetch engine; pages are requested with aiohttp on an event loop in a
+# background thread
+
+import queue
+import asyncio
+import aiohttp
+import threading
+
+from shopify_core import settings
+from shopify_core.api import get_rate_limiter, json_loads
+from shopify_core.trace import NULL_TRACE
+
+def get_pages_async(resource, page_url, headers, trace=NULL_TRACE):
+
+    # page with aiohttp on an event loop in a background thread and hand the pages over
+    # through a queue that holds one page, so the next page is downloaded while the
+    # caller works on the current one
+    done = object()
+    stop = threading.Event()
+    pages = queue.Queue(maxsize=1)
+
+    def put(value):
+        while not stop.is_set():
+            try:
+                pages.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    async def fetch(page_url):
+        loop = asyncio.get_running_loop()
+        async with aiohttp.ClientSession(headers=headers) as session:
+            while True:
+                links, content = await get_response_async(session, page_url, trace)
+                data = content.get(resource.name,[])
+
+                if len(data) == 0: # sanity check in case there's an issue with cursor
+                    break
+
+                if not await loop.run_in_executor(None, put, data):
+                    return
+
+                page_url = links.get('next',{}).get('url')
+                if page_url is None:
+                    break
+
+    def run():
+        try:
+            asyncio.run(fetch(page_url))
+            put(done)
+        except Exception as e:
+            put(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            data = pages.get()
+            if data is done:
+                break
+            if isinstance(data, Exception):
+                raise data
+            yield data
+    finally:
+        stop.set()
+
+async def get_response_async(session, url, trace=NULL_TRACE, retries=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504)):
+
+    # async version of get_response with the same retries as requests_retry_session
+    # and the same rate limiting; returns the links and the decoded content
+    limiter = get_rate_limiter(url)
+    attempt = 0
+    rate_limited = 0
+    while True:
+        t = trace.now()
+        await asyncio.sleep(limiter.reserve())
+        t = trace.lap('throttle', t)
+        try:
+            async with session.get(url) as response:
+                limiter.update(response.status, response.headers)
+                trace.count('requests')
+                if response.status == 429 and rate_limited < settings.RATE_LIMIT_RETRIES:
+                    trace.count('throttled')
+                    rate_limited += 1
+                    continue
+                if response.status in status_forcelist and attempt < retries:
+                    raise aiohttp.ClientResponseError(response.request_info, response.history, status=response.status)
+                response.raise_for_status()
+                links = {rel: {'url': str(link.get('url'))} for rel, link in response.links.items()}
+                content = await response.read()
+                t = trace.lap('network', t)
+                trace.count('bytes_in', len(content))
+                content = json_loads(content)
+                trace.lap('decode', t)
+                return links, content
+        except (aiohttp.ClientConnectionError, aiohttp.ClientResponseError) as e:
+            if attempt >= retries or (isinstance(e, aiohttp.ClientResponseError) and e.status not in status_forcelist):
+                raise
+            trace.count('retries')
+            await asyncio.sleep(backoff_factor * (2 ** attempt))
+            attempt += 1
@@ -0,0 +1,113 @@
+# the bulk fetch engine; the records are exported with a graphql bulk operation and
+# read back from its results file
+
+from time import sleep
+
+from shopify_core import settings
+from shopify_core.api import json_loads
+
+def get_bulk_pages(resource, session, url, headers, page_size, joins=()):
+
+    # run the bulk operation query and return the records in the results file in pages
+    # of the given size; each line of the file is an object, and objects from nested
+    # connections are on separate lines with the id of their parent, which follow the
+    # line of the parent, so they're added back to the parent as lists; the fields of
+    # any joins that can be made from the results are added to the query
+    query = get_bulk_query(resource, joins)
+    connections = dict(resource.bulk_connections)
+    for join in joins:
+        if join.bulk_fields is not None:
+            connections.update(join.bulk_connections)
+    result_url = run_bulk_operation(query, session, url[:url.rindex('/')] + '/graphql.json', headers)
+    if result_url is None: # no results
+        return
+
+    # the results url is signed, so it's requested without the api headers
+    response = session.get(result_url, stream=True)
+    try:
+        response.raise_for_status()
+        page = []
+        item = None
+        for line in response.iter_lines():
+            if len(line) == 0:
+                continue
+            node = json_loads(line)
+            if '__parentId' in node:
+                del node['__parentId']
+                item.setdefault(connections[node['id'].split('/')[3]], []).append(node)
+                continue
+            if item is not None:
+                page.append(resource.get_bulk_item(item))
+                if len(page) == page_size:
+                    yield page
+                    page = []
+            item = node
+        if item is not None:
+            page.append(resource.get_bulk_item(item))
+        if len(page) > 0:
+            yield page
+    finally:
+        response.close()
+
+def get_bulk_query(resource, joins):
+
+    # add the fields of the joins to the first node of the query, which is the node of
+    # each record
+    fields = [join.bulk_fields for join in joins if join.bulk_fields is not None]
+    if len(fields) == 0:
+        return resource.bulk_query
+    return resource.bulk_query.replace('node {', 'node {\n' + '\n'.join(fields), 1)
+
+def run_bulk_operation(query, session, graphql_url, headers):
+
+    # start the bulk operation and poll it until it's finished; returns the url of the
+    # results file, which is None if there aren't any results; a shop only runs one bulk
+    # query at a time, so while another one is in progress (e.g. another call's), wait
+    # for it to finish and start this one again
+    mutation = 'mutation($query: String!) { bulkOperationRunQuery(query: $query) { bulkOperation { id } userErrors { field message } } }'
+    while True:
+        result = get_graphql(session, graphql_url, headers, mutation, {'query': query})['bulkOperationRunQuery']
+        if len(result['userErrors']) == 0:
+            break
+        message = result['userErrors'][0]['message']
+        if 'already in progress' not in message:
+            raise RuntimeError('Bulk operation could not be started: ' + message)
+        wait_for_current_bulk_operation(session, graphql_url, headers)
+
+    query = 'query($id: ID!) { node(id: $id) { ... on BulkOperation { status errorCode url } } }'
+    while True:
+        operation = get_graphql(session, graphql_url, headers, query, {'id': result['bulkOperation']['id']})['node']
+        if operation['status'] == 'COMPLETED':
+            return operation['url']
+        if operation['status'] not in ('CREATED', 'RUNNING'):
+            raise RuntimeError('Bulk operation %s: %s' % (operation['status'].lower(), operation['errorCode']))
+        sleep(settings.BULK_POLL_INTERVAL)
+
+def wait_for_current_bulk_operation(session, graphql_url, headers):
+
+    # poll the shop's current bulk operation until it's no longer running
+    query = '{ currentBulkOperation { id status } }'
+    while True:
+        operation = get_graphql(session, graphql_url, headers, query, {})['currentBulkOperation']
+        if operation is None or operation['status'] not in ('CREATED', 'RUNNING', 'CANCELING'):
+            return
+        sleep(settings.BULK_POLL_INTERVAL)
+
+def get_graphql(session, graphql_url, headers, query, variables):
+
+    # queries are throttled on their cost rather than on the number of calls, and
+    # throttled queries are returned with an error rather than a status; they're retried
+    # once enough of the cost has been restored, up to RATE_LIMIT_RETRIES times
+    for attempt in range(settings.RATE_LIMIT_RETRIES + 1):
+        response = session.post(graphql_url, json={'query': query, 'variables': variables}, headers=headers)
+        response.raise_for_status()
+        content = json_loads(response.content)
+        errors = content.get('errors') or []
+        if len(errors) == 0:
+            return content['data']
+        if (errors[0].get('extensions') or {}).get('code') != 'THROTTLED' or attempt == settings.RATE_LIMIT_RETRIES:
+            raise RuntimeError(errors[0].get('message'))
+        cost = (content.get('extensions') or {}).get('cost') or {}
+        status = cost.get('throttleStatus') or {}
+        needed = cost.get('requestedQueryCost', 0) - status.get('currentlyAvailable', 0)
+        sleep(max(needed / (status.get('restoreRate') or 50), 1))
@@ -0,0 +1,84 @@
+# result cache; the output of each call is kept in a local sqlite cache
+
+import uuid
+import sqlite3
+import urllib.parse
+from datetime import datetime, timezone
+
+from shopify_core import settings
+from shopify_core.api import get_count_url, get_response, get_shop_time, json_loads
+
+def get_cached_output(resource, session, url, headers, key, output):
+
+    # return the cached output for the key if it's still valid; otherwise, write the
+    # output through to the cache as it's returned, and keep it only if the output
+    # is returned in full; the cache uses wal so that reads don't block writes
+    db = sqlite3.connect(settings.RESULT_CACHE_PATH, timeout=30, isolation_level=None)
+    try:
+        db.execute('pragma journal_mode=wal')
+        db.execute('pragma synchronous=normal')
+        db.execute('create table if not exists result_cache (key text primary key, entry text, size integer, accessed real, validated real, count integer, shop_time text)')
+        db.execute('create table if not exists result_chunks (entry text, seq integer, data text, primary key (entry, seq))')
+
+        now = datetime.now(timezone.utc).timestamp()
+        row = db.execute('select entry, validated, count, shop_time from result_cache where key = ?', (key,)).fetchone()
+        if row is not None:
+            entry, validated, count, shop_time = row
+            if now - validated >= settings.RESULT_CACHE_TTL:
+                validator = get_cache_validator(resource, session, url, headers)
+                if validator[0] == count and not has_updates(resource, session, url, headers, shop_time):
+                    db.execute('update result_cache set validated = ?, count = ?, shop_time = ? where key = ?', (now,) + validator + (key,))
+                else:
+                    row = None
+        if row is not None:
+            output.close()
+            db.execute('update result_cache set accessed = ? where key = ?', (now, key))
+            for r in db.execute('select data from result_chunks where entry = ? order by seq', (row[0],)):
+                yield r[0]
+            return
+
+        # get the count and the time before requesting the records so that any record that
+        # changes while they're being requested invalidates the output
+        count, shop_time = get_cache_validator(resource, session, url, headers)
+        entry = uuid.uuid4().hex
+        size = 0
+        complete = False
+        try:
+            for seq, chunk in enumerate(output):
+                db.execute('insert into result_chunks (entry, seq, data) values (?, ?, ?)', (entry, seq, chunk))
+                size += len(chunk)
+                yield chunk
+            complete = True
+        finally:
+            if not complete:
+                db.execute('delete from result_chunks where entry = ?', (entry,))
+
+        # replace any previous output for the key and evict the least recently used
+        # output beyond the maximum size; closing the connection on an error rolls back
+        db.execute('begin immediate')
+        for r in db.execute('select entry from result_cache where key = ?', (key,)).fetchall():
+            db.execute('delete from result_chunks where entry = ?', r)
+        db.execute('insert or replace into result_cache (key, entry, size, accessed, validated, count, shop_time) values (?, ?, ?, ?, ?, ?, ?)',
+                   (key, entry, size, now, now, count, shop_time))
+        total = 0
+        for k, e, s in db.execute('select key, entry, size from result_cache order by accessed desc').fetchall():
+            total += s
+            if total > settings.RESULT_CACHE_MAX_SIZE:
+                db.execute('delete from result_cache where key = ?', (k,))
+                db.execute('delete from result_chunks where entry = ?', (e,))
+        db.execute('commit')
+    finally:
+        db.close()
+
+def get_cache_validator(resource, session, url, headers):
+
+    # returns the count of records and the shop's current time from the response date
+    response = get_response(session, get_count_url(url, resource.query_params), headers)
+    return json_loads(response.content).get('count', 0), get_shop_time(response)
+
+def has_updates(resource, session, url, headers, shop_time):
+
+    # updated_at_min is inclusive, so this errs on the side of finding an update
+    query = dict(resource.query_params, updated_at_min=shop_time, limit=1, fields='id')
+    response = get_response(session, url + '?' + urllib.parse.urlencode(query), headers)
+    return len(json_loads(response.content).get(resource.name, [])) > 0
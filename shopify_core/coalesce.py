@@ -0,0 +1,120 @@
+# request coalescing; calls for the same output share a single run
+
+import tempfile
+import threading
+
+from shopify_core import settings
+
+class CoalescedOutput():
+
+    # the chunks of a run, which are kept until it's finished so that calls joining it
+    # late can replay it from the start; the first COALESCE_MEMORY_SIZE characters of
+    # chunks are kept in memory and the rest are spilled to a temporary file, so a call
+    # that reads slowly doesn't make the run hold its output in memory; for a spilled
+    # chunk, chunks has its (offset, length, is text) in the file
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.file = None
+        self.readers = 0
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def append(self, chunk):
+        # called with the condition held
+        if self.file is None and self.size + len(chunk) <= settings.COALESCE_MEMORY_SIZE:
+            self.chunks.append(chunk)
+            self.size += len(chunk)
+            return
+        if self.file is None:
+            self.file = tempfile.TemporaryFile()
+        text = isinstance(chunk, str)
+        content = chunk.encode('utf-8') if text else chunk
+        offset = self.file.seek(0, 2)
+        self.file.write(content)
+        self.chunks.append((offset, len(content), text))
+
+    def get(self, i):
+        # called with the condition held
+        chunk = self.chunks[i]
+        if not isinstance(chunk, tuple):
+            return chunk
+        offset, length, text = chunk
+        self.file.seek(offset)
+        content = self.file.read(length)
+        return content.decode('utf-8') if text else content
+
+    def close(self):
+        # drop the spilled chunks once the run is finished and no calls are reading it;
+        # called with the lock held
+        if self.done and self.readers == 0 and self.file is not None:
+            self.file.close()
+            self.file = None
+
+COALESCED_OUTPUTS = {}
+COALESCED_OUTPUTS_LOCK = threading.Lock()
+
+def get_coalesced_output(key, output):
+
+    # join the run for the key if there is one; otherwise, start a run that iterates
+    # the output in a background thread and keeps the chunks for the calls to replay;
+    # a run can be joined until it's finished
+    with COALESCED_OUTPUTS_LOCK:
+        flight = COALESCED_OUTPUTS.get(key)
+        leader = flight is None
+        if leader:
+            flight = CoalescedOutput()
+            COALESCED_OUTPUTS[key] = flight
+        flight.readers += 1
+
+    def run():
+        try:
+            for chunk in output:
+                with flight.condition:
+                    flight.append(chunk)
+                    flight.condition.notify_all()
+                # stop once no calls are reading; this is checked under the same lock
+                # as joining so that a call can't join a run that's stopping
+                with COALESCED_OUTPUTS_LOCK:
+                    if flight.readers == 0:
+                        remove_coalesced_output(key, flight)
+                        break
+        except Exception as e:
+            flight.error = e
+        finally:
+            output.close()
+            with COALESCED_OUTPUTS_LOCK:
+                remove_coalesced_output(key, flight)
+                with flight.condition:
+                    flight.done = True
+                    flight.condition.notify_all()
+                flight.close()
+
+    if leader:
+        threading.Thread(target=run, daemon=True).start()
+    else:
+        output.close()
+
+    try:
+        i = 0
+        while True:
+            with flight.condition:
+                while i == len(flight.chunks) and not flight.done:
+                    flight.condition.wait()
+                if i == len(flight.chunks):
+                    break
+                chunk = flight.get(i)
+            i += 1
+            yield chunk
+        if flight.error is not None:
+            raise flight.error
+    finally:
+        with COALESCED_OUTPUTS_LOCK:
+            flight.readers -= 1
+            flight.close()
+
+def remove_coalesced_output(key, flight):
+    # a later run for the same key may have replaced the run; called with the lock held
+    if COALESCED_OUTPUTS.get(key) is flight:
+        del COALESCED_OUTPUTS[key]
@@ -0,0 +1,97 @@
+# conversion of the values returned by the api; the converters in the property spec
+# of each resource take the values of a column of a page and return the converted
+# values; see convert_rows()
+
+import json
+from decimal import Decimal
+from datetime import date, datetime
+from functools import lru_cache
+
+def to_id(value):
+    # convert a graphql global id (e.g. 'gid://shopify/Order/123') to the rest api id
+    if value is None:
+        return value
+    return int(value.split('?')[0].rsplit('/', 1)[-1])
+
+def get_converters(resource, properties, output_format):
+
+    # return the (property, converter) of each property that's converted; the arrow and
+    # parquet formats get timestamps as datetimes, while the other formats get them as
+    # they're returned by the api; money is kept as exact decimals except for ndjson,
+    # which gets it as numbers
+    typed = output_format in ('arrow', 'parquet')
+    spec = {p[0]: p[3] for p in resource.property_spec}
+    converters = []
+    for p in properties:
+        converter = spec.get(p)
+        if converter is to_money and output_format == 'ndjson':
+            converter = to_number
+        if converter is to_date and not typed:
+            converter = None
+        if converter is not None:
+            converters.append((p, converter))
+    return converters
+
+def convert_rows(rows, converters):
+
+    # convert a page of rows in place a column at a time; each converter takes the
+    # values of a column and returns the converted values
+    for p, converter in converters:
+        for row, value in zip(rows, converter([row.get(p) for row in rows])):
+            row[p] = value
+    return rows
+
+def to_date(values):
+    # timestamps repeat within a page (e.g. the same order on each line item) and from
+    # one page to the next, so each distinct timestamp is only parsed once
+    try:
+        return [None if v is None else parse_date(v) for v in values]
+    except (ValueError, TypeError):
+        return [to_value(parse_date, v) for v in values]
+
+@lru_cache(maxsize=65536)
+def parse_date(value):
+    # fromisoformat() only accepts a 'Z' for utc as of python 3.11
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+def to_number(values):
+    try:
+        return [None if v is None else float(v) for v in values]
+    except (ValueError, TypeError):
+        return [to_value(float, v) for v in values]
+
+def to_money(values):
+    # amounts are returned as strings, so they're converted without any rounding
+    try:
+        return [None if v is None else to_decimal(v) for v in values]
+    except (ArithmeticError, ValueError, TypeError):
+        return [to_value(to_decimal, v) for v in values]
+
+def to_decimal(value):
+    # a float is converted from its shortest representation rather than its exact value
+    return Decimal(str(value) if isinstance(value, float) else value)
+
+def to_value(converter, value):
+    # convert a single value, leaving values that can't be converted as they are
+    if value is None:
+        return value
+    try:
+        return converter(value)
+    except (ArithmeticError, ValueError, TypeError):
+        return value
+
+def to_string(value):
+    # the json encoder only calls this for values it can't encode (e.g. decimals)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+def to_delimited_string(values):
+    # convert lists to comma-delimited strings; space follows api convention in tags property
+    return [v if isinstance(v, str) else ', '.join(v or []) for v in values]
+
+def to_json(values):
+    # convert objects to json strings
+    return [v if v is None or isinstance(v, str) else json.dumps(v) for v in values]
@@ -0,0 +1,277 @@
+# output formats; each encoder returns the output of a call as a list of pieces that
+# are joined into chunks
+
+import csv
+import json
+import importlib.util
+from decimal import Decimal
+from datetime import datetime
+from collections import OrderedDict
+
+from shopify_core.convert import to_date, to_money, to_string
+
+# reuse one encoder for all the rows; json.dumps() with a default creates a new
+# encoder for each call, but otherwise encodes the same way, so the output is
+# byte-for-byte the same as json.dumps(row, default=to_string)
+JSON_ENCODER = json.JSONEncoder(default=to_string)
+
+def encode_rows(rows):
+    # encode a page of rows as a list of json strings
+    return list(map(JSON_ENCODER.encode, rows))
+
+# output formats and their content types
+OUTPUT_FORMATS = OrderedDict([
+    ('ndjson',  'application/x-ndjson'),
+    ('csv',     'text/csv'),
+    ('json',    'application/json'),
+    ('arrow',   'application/vnd.apache.arrow.stream'),
+    ('parquet', 'application/vnd.apache.parquet')
+])
+
+# pyarrow is only imported once the arrow or parquet format is used
+pyarrow = None
+
+def import_pyarrow():
+    global pyarrow
+    if pyarrow is None:
+        import pyarrow.ipc
+        import pyarrow.parquet
+
+# arrow types for the types in the header and for money and timestamps
+ARROW_TYPES = {
+    'integer': lambda: pyarrow.int64(),
+    'number':  lambda: pyarrow.float64(),
+    'money':   lambda: pyarrow.decimal128(38, 4),
+    'string':  lambda: pyarrow.string(),
+    'date':    lambda: pyarrow.timestamp('us', tz='UTC'),
+    'boolean': lambda: pyarrow.bool_()
+}
+
+def get_format(params):
+
+    # return ndjson unless another format is requested; the arrow and parquet formats
+    # need pyarrow
+    output_format = str(dict(params).get('format') or '').lower().strip()
+    if output_format not in OUTPUT_FORMATS:
+        return 'ndjson'
+    if output_format in ('arrow', 'parquet') and importlib.util.find_spec('pyarrow') is None:
+        raise ImportError("the '%s' format requires pyarrow" % output_format)
+    return output_format
+
+def get_encoder(resource, output_format, properties):
+
+    # each encoder returns the output as a list of pieces that are joined into chunks;
+    # header() is called before the first page, encode() for the rows of each page and
+    # flush() at its end, and footer() after the last page
+    if output_format == 'csv':
+        return CsvEncoder(resource, properties)
+    if output_format == 'json':
+        return JsonArrayEncoder(resource, properties)
+    if output_format in ('arrow', 'parquet'):
+        return ArrowEncoder(resource, properties, output_format)
+    return NdjsonEncoder(resource, properties)
+
+class NdjsonEncoder():
+
+    # a json object for each row
+    join = ''.join
+
+    def __init__(self, resource, properties):
+        self.properties = properties
+
+    def header(self):
+        return []
+
+    def encode(self, rows):
+        return [line + '\n' for line in encode_rows(rows)]
+
+    def flush(self):
+        return []
+
+    def footer(self):
+        return []
+
+class JsonArrayEncoder(NdjsonEncoder):
+
+    # a json array with the property names followed by the values of each row, so the
+    # keys aren't repeated for each row; money is written as numbers with the exact
+    # digits of the decimals
+    def __init__(self, resource, properties):
+        converters = {p[0]: p[3] for p in resource.property_spec}
+        self.properties = properties
+        self.money = [i for i, p in enumerate(properties) if converters.get(p) is to_money]
+
+    def header(self):
+        return ['[' + JSON_ENCODER.encode(self.properties)]
+
+    def encode(self, rows):
+        properties = self.properties
+        values = [[row.get(p) for p in properties] for row in rows]
+        if len(self.money) == 0:
+            return [',\n' + line for line in encode_rows(values)]
+        return [',\n' + encode_money_row(v, self.money) for v in values]
+
+    def footer(self):
+        return [']\n']
+
+def encode_money_row(values, money):
+
+    # encode a row as a json list with the decimals in the money columns as numbers;
+    # the encoder would write them as strings, so the values between them are encoded
+    # as lists and joined with the decimals, which gives the same separators
+    pieces = []
+    start = 0
+    for i in money:
+        v = values[i]
+        if isinstance(v, Decimal) and v.is_finite():
+            if i > start:
+                pieces.append(JSON_ENCODER.encode(values[start:i])[1:-1])
+            pieces.append(str(v))
+            start = i + 1
+    if start < len(values):
+        pieces.append(JSON_ENCODER.encode(values[start:])[1:-1])
+    return '[' + ', '.join(pieces) + ']'
+
+class LineBuffer(list):
+
+    # collects the lines written by a csv writer
+    write = list.append
+
+class CsvEncoder(NdjsonEncoder):
+
+    # a header row with the property names followed by the values of each row
+    def __init__(self, resource, properties):
+        types = {p[0]: p[1] for p in resource.property_spec}
+        self.properties = properties
+        self.booleans = [i for i, p in enumerate(properties) if types.get(p) == 'boolean']
+        self.lines = LineBuffer()
+        self.writer = csv.writer(self.lines, lineterminator='\n')
+
+    def header(self):
+        self.writer.writerow(self.properties)
+        return self.take()
+
+    def encode(self, rows):
+        properties = self.properties
+        values = [[row.get(p) for p in properties] for row in rows]
+
+        # write booleans the same way as json rather than as True and False
+        for i in self.booleans:
+            for v in values:
+                if v[i] is not None:
+                    v[i] = 'true' if v[i] else 'false'
+
+        self.writer.writerows(values)
+        return self.take()
+
+    def take(self):
+        lines = list(self.lines)
+        del self.lines[:]
+        return lines
+
+class ArrowEncoder():
+
+    # an arrow ipc stream with a record batch for each page or a parquet file with a
+    # row group for each page, with the column types from the header
+    join = b''.join
+
+    def __init__(self, resource, properties, output_format):
+        import_pyarrow()
+        spec = {p[0]: p for p in resource.property_spec}
+        self.properties = properties
+        self.types = []
+        for p in properties:
+            if p not in spec:
+                self.types.append('string')
+            elif spec[p][3] is to_money:
+                self.types.append('money')
+            elif spec[p][3] is to_date:
+                self.types.append('date')
+            else:
+                self.types.append(spec[p][1])
+        self.schema = pyarrow.schema([(p, ARROW_TYPES[t]()) for p, t in zip(properties, self.types)])
+        self.rows = []
+        self.sink = OutputSink()
+        if output_format == 'parquet':
+            self.writer = pyarrow.parquet.ParquetWriter(self.sink, self.schema)
+        else:
+            self.writer = pyarrow.ipc.new_stream(self.sink, self.schema)
+
+    def header(self):
+        return self.sink.take()
+
+    def encode(self, rows):
+        self.rows.extend(rows)
+        return []
+
+    def flush(self):
+        rows = self.rows
+        if len(rows) == 0:
+            return []
+        self.rows = []
+        columns = [get_arrow_column([row.get(p) for row in rows], t) for p, t in zip(self.properties, self.types)]
+        self.writer.write_batch(pyarrow.record_batch(columns, schema=self.schema))
+        return self.sink.take()
+
+    def footer(self):
+        pieces = self.flush()
+        self.writer.close()
+        return pieces + self.sink.take()
+
+class OutputSink():
+
+    # file-like object pyarrow writes to that holds the bytes written since they were
+    # last taken, so each record batch or row group is returned once it's written; the
+    # position keeps counting since parquet records the offsets of the row groups
+    def __init__(self):
+        self.buffers = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.buffers.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b''.join(self.buffers)
+        self.buffers = []
+        return [data] if len(data) > 0 else []
+
+def get_arrow_column(values, type_name):
+
+    arrow_type = ARROW_TYPES[type_name]()
+    try:
+        return pyarrow.array(values, type=arrow_type)
+    except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+        # convert values the api returns as another type (e.g. a number as a string) one
+        # at a time; values that can't be converted are null
+        return pyarrow.array([to_arrow_value(v, type_name) for v in values], type=arrow_type)
+
+def to_arrow_value(value, type_name):
+    if value is None:
+        return value
+    try:
+        if type_name == 'integer':
+            return int(value)
+        if type_name == 'number':
+            return float(value)
+        if type_name == 'money':
+            return Decimal(str(value)).quantize(Decimal('0.0001'))
+        if type_name == 'date':
+            return value if isinstance(value, datetime) else None
+        if type_name == 'boolean':
+            return bool(value)
+        return to_string(value)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+
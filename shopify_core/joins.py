@@ -0,0 +1,101 @@
+# joins; related records are looked up in batches for each page of records and added to
+# the records before they're mapped, so there's a request for each batch of keys rather
+# than for each record; the lookups of a page run in a thread pool while the next page
+# is requested
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from shopify_core import settings
+from shopify_core.trace import NULL_TRACE
+
+class LruCache():
+
+    # keeps the values of the most recently used keys up to the given size
+    def __init__(self, size):
+        self.size = size
+        self.values = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def get(self, key):
+        self.values.move_to_end(key)
+        return self.values[key]
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        self.values[key] = value
+        self.values.move_to_end(key)
+        while len(self.values) > self.size:
+            self.values.popitem(last=False)
+
+def get_joins(resource, mode, properties):
+
+    # returns the joins to make for the mode and properties
+    joins = []
+    for join in resource.joins:
+        if join.mode is not None and join.mode == mode:
+            joins.append(join)
+        elif join.mode is None and any(join.has_property(p) for p in properties):
+            joins.append(join)
+    return joins
+
+def get_joined_pages(joins, data_pages, session, api_url, headers, trace=NULL_TRACE, bulk=False):
+
+    # start the lookups of each page as soon as it's returned and return the page once
+    # they're added to it, after the next page has been returned, so the lookups of a
+    # page run while the next page is requested; keys that are cached or that are being
+    # looked up for the previous page aren't looked up again; pages from a bulk operation
+    # already hold the values of joins with bulk fields
+    executor = ThreadPoolExecutor(max_workers=settings.JOIN_CONCURRENCY)
+    caches = [LruCache(join.cache_size) for join in joins]
+    pendings = [{} for join in joins]
+
+    def start(join, cache, pending, data):
+        if bulk and join.bulk_fields is not None:
+            return join.get_bulk_values(data), []
+        keys = OrderedDict.fromkeys(key for key in join.get_keys(data) if key is not None)
+        values = {}
+        futures = []
+        missing = []
+        for key in keys:
+            if key in cache:
+                values[key] = cache.get(key)
+            elif key in pending:
+                futures.append(pending[key])
+            else:
+                missing.append(key)
+        for i in range(0, len(missing), join.batch_size):
+            batch = missing[i:i+join.batch_size]
+            future = executor.submit(join.get_values, session, api_url, headers, batch, trace)
+            futures.append(future)
+            for key in batch:
+                pending[key] = future
+        return values, futures
+
+    def finish(data, lookups):
+        t = trace.now()
+        for join, cache, pending, (values, futures) in zip(joins, caches, pendings, lookups):
+            for future in OrderedDict.fromkeys(futures):
+                for key, value in future.result().items():
+                    values[key] = value
+                    cache.put(key, value)
+                    if pending.get(key) is future:
+                        del pending[key]
+            join.add_values(data, values)
+        trace.lap('join', t)
+        return data
+
+    try:
+        previous = None
+        for data in data_pages:
+            lookups = [start(join, cache, pending, data) for join, cache, pending in zip(joins, caches, pendings)]
+            if previous is not None:
+                yield finish(*previous)
+            previous = (data, lookups)
+        if previous is not None:
+            yield finish(*previous)
+    finally:
+        executor.shutdown(wait=False)
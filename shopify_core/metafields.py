@@ -0,0 +1,137 @@
+# metafields; the metafields of the records of each page are looked up with a graphql
+# nodes query for each batch of records rather than a request for each record, or are
+# exported along with the records by a bulk operation; the metafields that are looked
+# up are kept in a local sqlite cache keyed on the id and updated_at of their record
+
+import json
+
+from shopify_core import settings
+from shopify_core.resource import Join
+from shopify_core.trace import NULL_TRACE
+
+# the first metafields of each record of a batch are requested with the batch, with as
+# many records and metafields as keep the cost of the query under the limit of 1000;
+# the rest of the metafields of a record with more are requested for the record
+NODES_QUERY = '''
+query($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on HasMetafields {
+      metafields(first: 25) {
+        edges { cursor node { namespace key value } }
+        pageInfo { hasNextPage }
+      }
+    }
+  }
+}
+'''
+
+NODE_QUERY = '''
+query($id: ID!, $after: String) {
+  node(id: $id) {
+    ... on HasMetafields {
+      metafields(first: 250, after: $after) {
+        edges { cursor node { namespace key value } }
+        pageInfo { hasNextPage }
+      }
+    }
+  }
+}
+'''
+
+# the fields added to each record of a bulk operation query; each metafield is on a line
+# of its own that's added to the record's 'metafields'
+BULK_FIELDS = '''        metafields {
+          edges {
+            node {
+              id
+              namespace
+              key
+              value
+            }
+          }
+        }'''
+
+class Metafields(Join):
+
+    # the metafields of the records of a resource, which are returned as a 'metafields'
+    # property with a json object of the value of each 'namespace.key' of the record, and
+    # as a 'metafields.<namespace>.<key>' property for any metafield; like the other
+    # properties, the namespaces and keys are lowercase
+    # owner_type: the graphql type of the records (e.g. 'Product')
+    def __init__(self, owner_type):
+        Join.__init__(self, 'metafields', ['metafields'], get_record_keys, add_metafields,
+                      fields=['id', 'updated_at'], batch_size=25, cache_size=10000, prefix='metafields',
+                      bulk_fields=BULK_FIELDS, bulk_connections={'Metafield': 'metafields'},
+                      get_bulk_values=get_bulk_metafields)
+        self.owner_type = owner_type
+
+    def get_values(self, session, api_url, headers, keys, trace=NULL_TRACE):
+
+        # the keys are the (id, updated_at) of each record; only the records that
+        # aren't in the cache with the same updated_at are looked up
+        if not settings.METAFIELDS_CACHE:
+            return self.get_metafields(session, api_url, headers, keys, trace)
+
+        import sqlite3
+        db = sqlite3.connect(settings.METAFIELDS_CACHE_PATH, timeout=30)
+        try:
+            db.execute('create table if not exists metafields (shop text, owner_type text, id integer, updated_at text, metafields text, primary key (shop, owner_type, id))')
+            updated_at = dict(keys)
+            cursor = db.execute('select id, updated_at, metafields from metafields where shop = ? and owner_type = ? and id in (%s)' % ','.join('?' * len(keys)),
+                                [api_url, self.owner_type] + [key[0] for key in keys])
+            values = {(id, u): json.loads(metafields) for id, u, metafields in cursor if updated_at.get(id) == u}
+
+            missing = [key for key in keys if key not in values]
+            if len(missing) > 0:
+                looked_up = self.get_metafields(session, api_url, headers, missing, trace)
+                with db:
+                    db.executemany('insert or replace into metafields (shop, owner_type, id, updated_at, metafields) values (?, ?, ?, ?, ?)',
+                                   [(api_url, self.owner_type, key[0], key[1], json.dumps(value)) for key, value in looked_up.items()])
+                values.update(looked_up)
+            return values
+        finally:
+            db.close()
+
+    def get_metafields(self, session, api_url, headers, keys, trace=NULL_TRACE):
+
+        # look up the metafields of a batch of records; the nodes are returned in the
+        # order of the ids, and records that no longer exist are null
+        from shopify_core.bulk import get_graphql
+        graphql_url = api_url + '/graphql.json'
+        ids = ['gid://shopify/%s/%d' % (self.owner_type, key[0]) for key in keys]
+        t = trace.now()
+        trace.count('requests')
+        nodes = get_graphql(session, graphql_url, headers, NODES_QUERY, {'ids': ids})['nodes']
+
+        values = {}
+        for key, id, node in zip(keys, ids, nodes):
+            metafields = values[key] = {}
+            connection = (node or {}).get('metafields') or {}
+            while True:
+                edges = connection.get('edges') or []
+                add_metafield_values(metafields, [edge['node'] for edge in edges])
+                if not (connection.get('pageInfo') or {}).get('hasNextPage') or len(edges) == 0:
+                    break
+                trace.count('requests')
+                node = get_graphql(session, graphql_url, headers, NODE_QUERY, {'id': id, 'after': edges[-1]['cursor']})['node']
+                connection = (node or {}).get('metafields') or {}
+        trace.lap('network', t)
+        return values
+
+def get_record_keys(data):
+    return [(item.get('id'), item.get('updated_at')) for item in data if item.get('id') is not None]
+
+def add_metafields(data, metafields):
+    for item in data:
+        item['metafields'] = metafields.get((item.get('id'), item.get('updated_at')))
+
+def get_bulk_metafields(data):
+    metafields = {}
+    for item in data:
+        values = metafields[(item.get('id'), item.get('updated_at'))] = {}
+        add_metafield_values(values, item.get('metafields') or [])
+    return metafields
+
+def add_metafield_values(values, metafields):
+    for metafield in metafields:
+        values[('%s.%s' % (metafield.get('namespace'), metafield.get('key'))).lower()] = metafield.get('value')
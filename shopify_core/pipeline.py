@@ -0,0 +1,420 @@
+# the pipeline shared by the functions; a call requests the pages of the resource's
+# records, maps them to rows, converts, filters and projects the rows and encodes them
+# in the requested format; the modules for the fetch engines, the snapshot, the cache
+# and the arrow formats are only imported once they're used
+
+import json
+import hashlib
+import importlib.util
+import urllib.parse
+from decimal import Decimal
+from datetime import datetime
+from collections import OrderedDict
+
+from shopify_core import settings
+from shopify_core.convert import convert_rows, get_converters
+from shopify_core.formats import OUTPUT_FORMATS, get_encoder, get_format
+from shopify_core.trace import NULL_TRACE, Trace
+
+# main function entry point
+def flexio_handler(resource, flex):
+
+    flex.output.content_type = OUTPUT_FORMATS[get_format(flex.vars)]
+    for data in get_data(resource, flex.vars):
+        flex.output.write(data)
+
+def get_data(resource, params, session=None):
+
+    # get the api key and company domain from the variable input
+    auth_token = dict(params).get('shopify_connection',{}).get('access_token')
+    api_base_uri = dict(params).get('shopify_connection',{}).get('api_base_uri')
+
+    # see here for more info:
+    # https://shopify.dev/docs/admin-api/rest/reference
+    # https://shopify.dev/tutorials/make-paginated-requests-to-rest-admin-api
+
+    headers = {
+        'X-Shopify-Access-Token': auth_token
+    }
+    url = api_base_uri + '/admin/api/2020-04/' + resource.name + '.json'
+
+    # get the properties to return, the filter to apply and the output format; filters
+    # the api supports are passed along as query params and the rest are applied to
+    # each row
+    mode = get_mode(resource, params)
+    properties = get_properties(resource, params)
+    api_filters, row_filters = get_filter(resource, params)
+    predicate = get_predicate(row_filters)
+    output_format = get_format(params)
+
+    page_size = 250
+    url_query_params = {'limit': page_size}
+    url_query_params.update(resource.query_params)
+    url_query_params.update(api_filters)
+
+    # with coalescing, concurrent calls for the same output share a single run that's
+    # replayed to each of them; the run creates its own session if one isn't passed in
+    # and is traced by the call that started it
+    trace = Trace('shopify-' + resource.name) if settings.TRACE else NULL_TRACE
+    key = get_cache_key(auth_token, url, mode, output_format, properties, api_filters, row_filters)
+    output = get_session_output(resource, session, url, url_query_params, headers, api_base_uri, mode, properties, api_filters, row_filters, predicate, output_format, key, trace)
+    if settings.COALESCE_REQUESTS:
+        from shopify_core.coalesce import get_coalesced_output
+        output = get_coalesced_output(key, output)
+    try:
+        yield from output
+    finally:
+        if trace.enabled:
+            trace.write_summary()
+
+def get_session_output(resource, session, url, url_query_params, headers, api_base_uri, mode, properties, api_filters, row_filters, predicate, output_format, key, trace=NULL_TRACE):
+
+    # use a single pooled session for the whole pagination run so that each page
+    # reuses the same keep-alive connection rather than doing a new tls handshake;
+    # a caller may pass in its own session (e.g. one created with timings enabled)
+    owns_session = session is None
+    if owns_session:
+        from shopify_core.api import requests_retry_session
+        session = requests_retry_session(pool_maxsize=max(10, settings.SHARD_CONCURRENCY + settings.JOIN_CONCURRENCY))
+
+    try:
+        output = get_output(resource, session, url, url_query_params, headers, api_base_uri, mode, properties, api_filters, row_filters, predicate, output_format, trace)
+        # the cache is validated against the resource's records, which don't change when
+        # the records of a join do (e.g. inventory levels), so output with joins isn't cached
+        if settings.RESULT_CACHE and len(get_output_joins(resource, mode, get_columns(properties, row_filters))) == 0:
+            from shopify_core.cache import get_cached_output
+            output = get_cached_output(resource, session, url, headers, key, output)
+        yield from output
+    finally:
+        if owns_session:
+            session.close()
+
+def get_output(resource, session, url, url_query_params, headers, api_base_uri, mode, properties, api_filters, row_filters, predicate, output_format, trace=NULL_TRACE):
+
+    from shopify_core import api
+
+    columns = get_columns(properties, row_filters)
+    joins = get_output_joins(resource, mode, columns)
+
+    streamed = False
+    bulk = False
+    if settings.INCREMENTAL_SYNC and mode == resource.name and len(joins) == 0 and len(api_filters) == 0 and predicate is None:
+        # the snapshot holds all the properties of every record, so refresh it
+        # with full records and project the properties on the way out; its pages are rows
+        from shopify_core.snapshot import get_snapshot_pages
+        data_pages = get_snapshot_pages(resource, session, url, url_query_params, headers, api_base_uri)
+        columns = get_properties(resource, {})
+        mapper = None
+    else:
+        fields = get_fields(resource, columns, mode, joins)
+        if fields is not None:
+            url_query_params['fields'] = fields
+        mapper = get_item_mapper(resource, columns)
+        if settings.FETCH_ENGINE == 'bulk' and len(api_filters) == 0 and api.get_item_count(resource, session, url, headers) >= settings.BULK_MIN_COUNT:
+            from shopify_core.bulk import get_bulk_pages
+            data_pages = get_bulk_pages(resource, session, url, headers, url_query_params['limit'], joins)
+            bulk = True
+        elif settings.SHARD_COUNT > 1 and 'ids' not in api_filters and 'since_id' not in api_filters:
+            from shopify_core.shards import get_shard_windows, get_sharded_pages
+            windows = get_shard_windows(resource, session, url, url_query_params, headers, settings.SHARD_COUNT)
+            data_pages = get_sharded_pages(resource, session, windows, headers, trace)
+        elif settings.FETCH_ENGINE == 'async' and importlib.util.find_spec('aiohttp') is not None:
+            from shopify_core.async_pages import get_pages_async
+            page_url = url + '?' + urllib.parse.urlencode(url_query_params)
+            data_pages = get_pages_async(resource, page_url, headers, trace)
+        else:
+            # streamed records are returned one at a time as pages of their own, with an
+            # empty page after the last record of each page of the api; joins look up the
+            # keys of a whole page, so records aren't streamed with joins
+            page_url = url + '?' + urllib.parse.urlencode(url_query_params)
+            streamed = settings.STREAM_RECORDS and len(joins) == 0
+            if streamed:
+                data_pages = api.get_streamed_pages(resource, session, page_url, headers, trace)
+            else:
+                data_pages = api.get_pages(resource, session, page_url, headers, trace)
+            if settings.PREFETCH_PAGES > 0:
+                data_pages = api.get_prefetched_pages(data_pages, settings.PREFETCH_PAGES)
+        if len(joins) > 0:
+            from shopify_core.joins import get_joined_pages
+            data_pages = get_joined_pages(joins, data_pages, session, url[:url.rindex('/')], headers, trace, bulk)
+    converters = get_converters(resource, columns, output_format)
+    project = columns != properties
+
+    # write the output in chunks of about OUTPUT_CHUNK_SIZE bytes by collecting the
+    # encoded rows in a list and joining them once, rather than copying a growing
+    # string for each row; the json encoder escapes non-ascii, so characters are bytes
+    encoder = get_encoder(resource, output_format, properties)
+    header = encoder.header()
+    if len(header) > 0:
+        trace.count('bytes_out', sum(map(len, header)))
+        yield encoder.join(header)
+
+    done = object()
+    chunk = []
+    chunk_size = 0
+    t = trace.now()
+    while True:
+        data = next(data_pages, done)
+        if data is done:
+            break
+        t = trace.lap('fetch', t)
+        rows = data if mapper is None else get_page_rows(resource, data, mapper, mode)
+        t = trace.lap('map', t)
+        convert_rows(rows, converters)
+        t = trace.lap('convert', t)
+        if predicate is not None:
+            rows = [item for item in rows if predicate(item)]
+        if project:
+            rows = [{p: item.get(p) for p in properties} for item in rows]
+        t = trace.lap('filter', t)
+        page_end = not streamed or len(data) == 0
+        if page_end:
+            trace.count('pages')
+        trace.count('rows', len(rows))
+
+        # the arrow and parquet encoders write a record batch or row group for the rows of
+        # each page when it's flushed
+        pieces = encoder.encode(rows)
+        if page_end:
+            pieces += encoder.flush()
+        for piece in pieces:
+            chunk.append(piece)
+            chunk_size += len(piece)
+            if chunk_size >= settings.OUTPUT_CHUNK_SIZE:
+                t = trace.lap('encode', t)
+                trace.count('bytes_out', chunk_size)
+                yield encoder.join(chunk)
+                t = trace.lap('write', t)
+                chunk = []
+                chunk_size = 0
+
+        # flush the rest of the page rather than holding it while the next page is requested
+        if page_end and len(chunk) > 0:
+            t = trace.lap('encode', t)
+            trace.count('bytes_out', chunk_size)
+            yield encoder.join(chunk)
+            t = trace.lap('write', t)
+            chunk = []
+            chunk_size = 0
+        else:
+            t = trace.lap('encode', t)
+
+    footer = encoder.footer()
+    if len(footer) > 0:
+        trace.count('bytes_out', sum(map(len, footer)))
+        yield encoder.join(footer)
+
+def get_columns(properties, row_filters):
+    # only compute the properties being returned and the ones being filtered on
+    return properties + [p for p in row_filters.keys() if p not in properties]
+
+def get_output_joins(resource, mode, columns):
+    # returns the joins to make for the columns
+    if len(resource.joins) == 0:
+        return []
+    from shopify_core.joins import get_joins
+    return get_joins(resource, mode, columns)
+
+def get_page_rows(resource, data, mapper, mode):
+
+    rows = []
+    if not resource.has_child_rows(mode):
+        for header_item in data:
+            rows.append(mapper(header_item, {}))
+        return rows
+
+    get_children = resource.get_children
+    for header_item in data:
+        detail_items_all = get_children(header_item)
+        if len(detail_items_all) == 0:
+            detail_items_all = [{}] # if we don't have any children, make sure to return the record's info
+        for detail_item in detail_items_all:
+            rows.append(mapper(header_item, detail_item))
+    return rows
+
+def get_cache_key(auth_token, url, mode, output_format, properties, api_filters, row_filters):
+
+    # the url includes the shop, resource and api version; the access token is part of
+    # the key since tokens with different scopes may see different records
+    key = json.dumps([auth_token, url, mode, output_format, properties, sorted(api_filters.items()), sorted(row_filters.items())])
+    return hashlib.sha256(key.encode()).hexdigest()
+
+def get_mode(resource, params):
+
+    # return the default mode unless another of the resource's modes is requested (e.g.
+    # a row for each child rather than for each record)
+    mode = str(dict(params).get('mode') or '').lower().strip()
+    modes = resource.get_modes()
+    return mode if mode in modes else modes[0]
+
+def get_properties(resource, params):
+
+    # properties can be passed as an array or as a comma-delimited string
+    properties = dict(params).get('properties') or []
+    if isinstance(properties, str):
+        properties = [properties]
+    properties = [p.lower().strip() for value in properties for p in str(value).split(',')]
+    properties = [p for p in properties if len(p) > 0]
+
+    # if no properties or a wildcard are specified, return all the properties; the child
+    # properties are only included in the modes with a row for each child, and the
+    # properties of joins are only included in the join's mode
+    if len(properties) == 0 or '*' in properties:
+        mode = get_mode(resource, params)
+        child_rows = resource.has_child_rows(mode)
+        child_prefix = '%s[]' % resource.child_key
+        excluded = set(p for join in resource.joins if join.mode != mode for p in join.properties)
+        return [p[0] for p in resource.property_spec if (child_rows or not p[2].startswith(child_prefix)) and p[0] not in excluded]
+    return properties
+
+def get_fields(resource, properties, mode, joins=()):
+
+    # if all the properties are requested, request all the fields; the properties of
+    # joins are built from the fields of the join's keys
+    sources = OrderedDict((p[0], p[2]) for p in resource.property_spec)
+    joined = set(p for join in resource.joins for p in join.properties)
+    if set(properties).issuperset(p for p in sources.keys() if p not in joined):
+        return None
+
+    # request the top-level field that each property is built from, along with any
+    # other fields the child's objects come from
+    fields = OrderedDict()
+    child_prefix = '%s[].' % resource.child_key
+    for join in joins:
+        for field in join.fields:
+            fields[field] = True
+    for p in properties:
+        if p in sources and p not in joined:
+            fields[sources[p].split('.')[0].replace('[]', '')] = True
+            if sources[p].startswith(child_prefix):
+                for field in resource.child_fields.get(sources[p].split('.')[1], []):
+                    fields[field] = True
+
+    # always include the children when there's a row for each child so that there's
+    # still one row per child
+    if resource.has_child_rows(mode):
+        fields[resource.child_key] = True
+
+    # make sure something is requested if none of the properties are valid
+    if len(fields) == 0:
+        fields['id'] = True
+
+    return ','.join(fields.keys())
+
+def get_filter(resource, params):
+
+    # the filter is a url query string (e.g. 'vendor=Acme&tags=sale'); split it into
+    # the filters the api supports, which are returned as query params, and the filters
+    # on the remaining properties, which are returned as property/values; values without
+    # a key (e.g. '=Acme') are ignored
+    filter_str = str(dict(params).get('filter') or '')
+    filter_values = OrderedDict()
+    for key, value in urllib.parse.parse_qsl(filter_str.strip().lstrip('?'), keep_blank_values=True):
+        key = key.lower().strip()
+        if len(key) > 0:
+            filter_values.setdefault(key, []).append(value.strip())
+
+    api_filters = OrderedDict()
+    row_filters = OrderedDict()
+    for key, values in filter_values.items():
+        if key == 'ids':
+            api_filters[key] = ','.join(values)
+        elif key in resource.api_filters and len(values) == 1:
+            api_filters[key] = values[0]
+        else:
+            row_filters[key] = values
+
+    return api_filters, row_filters
+
+def get_predicate(row_filters):
+
+    if len(row_filters) == 0:
+        return None
+
+    # compile the filters once into (property, string values, number values); a row
+    # matches when each property matches one of its values, where numbers compare
+    # numerically and everything else compares as case-insensitive strings; the number
+    # values hold both floats and decimals, since a decimal amount (e.g. 12.30) only
+    # equals the float that's nearest to it if the float is exact
+    conditions = []
+    for key, values in row_filters.items():
+        strings = set(v.lower() for v in values)
+        numbers = set()
+        for v in values:
+            try:
+                numbers.add(float(v))
+                if Decimal(v).is_finite():
+                    numbers.add(Decimal(v))
+            except (ValueError, ArithmeticError):
+                pass
+        conditions.append((key, strings, numbers))
+
+    def predicate(item):
+        for key, strings, numbers in conditions:
+            value = item.get(key)
+            if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool) and value in numbers:
+                continue
+            if isinstance(value, datetime):
+                value = value.isoformat()
+            if ('' if value is None else str(value).lower()) not in strings:
+                return False
+        return True
+
+    return predicate
+
+def get_item_mapper(resource, properties):
+
+    # compile the property spec for the given properties into a function that maps a
+    # record and one of its children to a row; each nested object is looked up once per
+    # row and properties that aren't requested are never computed; e.g. for orders and
+    # ['id', 'line_item_sku', 'billing_address_city']:
+    #
+    # def map_item(header_item, detail_item):
+    #     o0 = header_item.get('billing_address') or {}
+    #     return {
+    #         'id': header_item.get('id'),
+    #         'line_item_sku': detail_item.get('sku'),
+    #         'billing_address_city': o0.get('city'),
+    #     }
+    properties = tuple(properties)
+    if properties in resource.item_mappers:
+        return resource.item_mappers[properties]
+
+    spec = {p[0]: p for p in resource.property_spec}
+    child_prefix = '%s[]' % resource.child_key
+    objects = OrderedDict()
+    values = []
+    for p in properties:
+        if p in spec:
+            path = spec[p][2].split('.')
+        else:
+            # the properties that start with the prefix of a join are values in the join's
+            # object of the record (e.g. 'metafields.custom.color' is 'custom.color' in
+            # the record's 'metafields')
+            prefixes = [join.prefix for join in resource.joins if join.prefix is not None and join.has_property(p)]
+            if len(prefixes) == 0:
+                values.append('        %r: None,' % p)
+                continue
+            path = [prefixes[0], p[len(prefixes[0])+1:]]
+
+        obj = 'header_item'
+        if path[0] == child_prefix:
+            obj = 'detail_item'
+            path = path[1:]
+        for i in range(len(path) - 1):
+            key = (obj,) + tuple(path[:i+1])
+            if key not in objects:
+                objects[key] = ('o%d' % len(objects), obj, path[i])
+            obj = objects[key][0]
+
+        # the values are converted a page at a time; see convert_rows()
+        values.append('        %r: %s.get(%r),' % (p, obj, path[-1]))
+
+    code = ['def map_item(header_item, detail_item):']
+    code += ['    %s = %s.get(%r) or {}' % o for o in objects.values()]
+    code += ['    return {'] + values + ['    }']
+
+    namespace = {}
+    exec('\n'.join(code), globals(), namespace)
+    resource.item_mappers[properties] = namespace['map_item']
+    return resource.item_mappers[properties]
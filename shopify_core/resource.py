@@ -0,0 +1,148 @@
+# the description of a resource of the admin api and of the related records that are
+# joined onto its records; each function describes its resource and the pipeline does
+# the rest
+
+import urllib.parse
+from collections import OrderedDict
+
+from shopify_core.trace import NULL_TRACE
+
+class Resource():
+
+    # name: the resource in the url (e.g. 'orders'), which is also the key of the list of
+    #   records in the responses
+    # property_spec: the (property, type, source, converter) of each property, in the
+    #   order of the 'returns' in the header of the function; the source is a dotted path
+    #   into the record, where a path that starts with the child key and '[]' is a path
+    #   into each child (e.g. 'variants[].sku')
+    # api_filters: the filters the api supports, which are passed along as query params
+    # query_params: query params added to each list and count request
+    # child_key: the list of children of each record that the rows fan out to, if any
+    # child_mode: the mode for a row for each child; if this isn't given, there's always a
+    #   row for each child, and otherwise, there's a row for each record unless the mode
+    #   is requested
+    # get_children: returns the children of a record; defaults to the list of children
+    # child_fields: more fields to request for the child properties, keyed on the object
+    #   of the child they come from (e.g. {'refund': ['refunds']})
+    # joins: the lookups of related records that are added to the records of each page;
+    #   see Join
+    # shard_by: how records are split into windows for sharded fetching; 'id' or 'created_at'
+    # bulk_query, bulk_connections, get_bulk_item: the graphql bulk operation query, the
+    #   list that each type of object from a nested connection is added to, and a function
+    #   that converts a record of the results to the format of the rest api
+    def __init__(self, name, property_spec, api_filters=(), query_params=None,
+                 child_key=None, child_mode=None, get_children=None, child_fields=None,
+                 joins=(), shard_by='id', bulk_query=None, bulk_connections=None, get_bulk_item=None):
+        self.name = name
+        self.property_spec = property_spec
+        self.api_filters = api_filters
+        self.query_params = query_params or {}
+        self.child_key = child_key
+        self.child_mode = child_mode
+        self.child_fields = child_fields or {}
+        self.joins = joins
+        self.shard_by = shard_by
+        self.bulk_query = bulk_query
+        self.bulk_connections = bulk_connections or {}
+        if get_children is not None:
+            self.get_children = get_children
+        if get_bulk_item is not None:
+            self.get_bulk_item = get_bulk_item
+        self.item_mappers = {}
+
+    def get_children(self, item):
+        return item.get(self.child_key) or []
+
+    def get_bulk_item(self, item):
+        return item
+
+    def get_modes(self):
+        # returns the modes of the resource, where the first mode is the default
+        modes = [self.name]
+        if self.child_mode is not None:
+            modes.append(self.child_mode)
+        modes += [join.mode for join in self.joins if join.mode is not None]
+        return modes
+
+    def has_child_rows(self, mode):
+        # returns true if there's a row for each child in the given mode
+        return self.child_key is not None and (self.child_mode is None or mode == self.child_mode)
+
+class Join():
+
+    # name: the resource that's looked up (e.g. 'customers'), which is also the key of the
+    #   list of records in the responses
+    # properties: the properties that come from the join
+    # get_keys: returns the keys to look up for a page of records
+    # add_values: adds the values that have been looked up to a page of records, given
+    #   the page and a dict of the value of each key
+    # mode: if given, the join is made in this mode and its properties are returned in
+    #   this mode; otherwise, the join is only made when its properties are requested and
+    #   they're only returned when they're requested
+    # fields: the fields of the records the keys come from
+    # key_param, key_field: the query param for a batch of keys and the field of the
+    #   records that are looked up with their key
+    # batch_size: the most keys in a request
+    # many: if true, the value of a key is a list of the records with the key; otherwise,
+    #   it's the record with the key, or None if there isn't one
+    # query_params: query params added to each request
+    # cache_size: the number of the most recently used values that are kept for the
+    #   later pages of a call; 0 looks up the keys of each page
+    # get_values: returns the value of each key for a batch of keys; defaults to
+    #   requesting the list of the resource with the keys
+    # prefix: if given, any property that starts with the prefix and a '.' also comes from
+    #   the join, and is the value of the rest of the property in the object of the record
+    #   with the prefix's name (e.g. 'metafields.custom.color' is the 'custom.color' value
+    #   of the record's 'metafields')
+    # bulk_fields, bulk_connections, get_bulk_values: the graphql fields that are added to
+    #   each record of the resource's bulk operation query when the join is made, the list
+    #   that each type of object from their nested connections is added to, and a function
+    #   that returns the value of each key from a page of the results in place of the
+    #   lookups
+    def __init__(self, name, properties, get_keys, add_values, mode=None, fields=(),
+                 key_param='ids', key_field='id', batch_size=250, many=False,
+                 query_params=None, cache_size=0, get_values=None, prefix=None,
+                 bulk_fields=None, bulk_connections=None, get_bulk_values=None):
+        self.name = name
+        self.properties = properties
+        self.get_keys = get_keys
+        self.add_values = add_values
+        self.mode = mode
+        self.fields = fields
+        self.key_param = key_param
+        self.key_field = key_field
+        self.batch_size = batch_size
+        self.many = many
+        self.query_params = query_params or {}
+        self.cache_size = cache_size
+        self.prefix = prefix
+        self.bulk_fields = bulk_fields
+        self.bulk_connections = bulk_connections or {}
+        if get_values is not None:
+            self.get_values = get_values
+        if get_bulk_values is not None:
+            self.get_bulk_values = get_bulk_values
+
+    def has_property(self, p):
+        # returns true if the property comes from the join
+        return p in self.properties or (self.prefix is not None and p.startswith(self.prefix + '.'))
+
+    def get_values(self, session, api_url, headers, keys, trace=NULL_TRACE):
+        from shopify_core.api import get_pages
+        query = {'limit': 250}
+        query.update(self.query_params)
+        query[self.key_param] = ','.join(str(key) for key in keys)
+        page_url = api_url + '/' + self.name + '.json?' + urllib.parse.urlencode(query)
+
+        values = OrderedDict((key, [] if self.many else None) for key in keys)
+        for data in get_pages(self, session, page_url, headers, trace):
+            for item in data:
+                key = item.get(self.key_field)
+                if self.many:
+                    values.setdefault(key, []).append(item)
+                else:
+                    values[key] = item
+        return values
+
+    def get_bulk_values(self, data):
+        return {}
@@ -0,0 +1,105 @@
+# settings shared by the shopify functions; these are read when each call is made, so
+# they can be changed at runtime (e.g. shopify_core.settings.FETCH_ENGINE = 'async')
+
+import os
+import tempfile
+
+# incremental sync; when enabled, the rows for each shop are kept in a local sqlite
+# snapshot along with the latest updated_at that's been seen, and each refresh only
+# requests the records that have been updated since then
+INCREMENTAL_SYNC = False
+SNAPSHOT_PATH = os.path.join(tempfile.gettempdir(), 'flexio-shopify-snapshot.sqlite')
+
+# approximate size in bytes of each chunk of output that's written
+OUTPUT_CHUNK_SIZE = 65536
+
+# sharded fetching; when the shard count is greater than one, the records are split
+# into that many windows that are paged concurrently, using up to the given number of
+# threads and buffering up to the given number of pages for each window; the windows
+# are found with counts of the records, so calls for fewer than SHARD_MIN_COUNT records
+# (about ten pages) are paged as a single window instead
+SHARD_COUNT = 1
+SHARD_MIN_COUNT = 2500
+SHARD_CONCURRENCY = 4
+SHARD_BUFFER_PAGES = 20
+
+# rate limiting; requests for each shop are paced to stay the given number of calls
+# under the shop's leaky bucket, which holds 40 calls and leaks 2 calls a second on
+# standard plans (the bucket size is read from the X-Shopify-Shop-Api-Call-Limit
+# header and leaks in 20 seconds); requests that are still rate limited are retried
+# up to the given number of times after the Retry-After time
+RATE_LIMIT_HEADROOM = 2
+RATE_LIMIT_RETRIES = 5
+
+# fetch engine; with 'async', pages are requested with aiohttp (if it's installed) on
+# an event loop in a background thread, so the next page is downloaded while the
+# current page is mapped and written; with 'bulk', see below; otherwise, pages are
+# requested with requests
+FETCH_ENGINE = 'sync'
+
+# bulk operations; with the 'bulk' fetch engine, calls without api filters for at least
+# BULK_MIN_COUNT records run a single graphql bulk operation query, which is polled
+# every BULK_POLL_INTERVAL seconds until it's finished, and then the results file is
+# streamed, rather than paging the rest api; filtered and smaller calls still use the
+# rest api; note: properties without an equivalent in the graphql api are null (see
+# the bulk query of each resource); a shop runs one bulk query at a time, so a call that
+# finds another one in progress waits for it to finish before starting its own
+BULK_MIN_COUNT = 10000
+BULK_POLL_INTERVAL = 1
+
+# streamed records; when enabled, the sync engine reads each page as a stream and decodes
+# its records one at a time, and each record is mapped, encoded and written before the
+# next one is decoded, so only one record of the page is held rather than the whole page;
+# the rows of a page are still written in chunks of about OUTPUT_CHUNK_SIZE bytes, and
+# the arrow and parquet formats still hold the rows of a page for its record batch; the
+# stream is read the given number of bytes at a time
+STREAM_RECORDS = False
+STREAM_READ_SIZE = 65536
+
+# number of pages the sync engine requests ahead in a background thread while the
+# current page is mapped and written (records, with streamed records); 0 requests each
+# page when it's needed
+PREFETCH_PAGES = 2
+
+# joins; the related records that some modes and properties add to the rows (e.g. the
+# inventory levels of product variants) are looked up in batches for each page using
+# up to the given number of threads
+JOIN_CONCURRENCY = 4
+
+# metafields cache; when enabled, the metafields of each record that are looked up are
+# kept in a local sqlite cache keyed on the shop and the record's id and updated_at, so
+# the metafields of records that haven't been updated since are never looked up again;
+# note: changing a metafield doesn't always change the updated_at of its record, so the
+# cache can be removed to look up the metafields of every record
+METAFIELDS_CACHE = True
+METAFIELDS_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'flexio-shopify-metafields.sqlite')
+
+# result cache; when enabled, the output of each call is kept in a local sqlite cache
+# keyed on the shop, access token, resource, api version, properties and filter; output
+# that's been validated within the ttl in seconds is returned as is, and older output
+# is returned if a probe shows the count of records hasn't changed and no record has
+# been updated since it was validated; the least recently used output is evicted to
+# keep the cache under the given size in bytes; output with joined records (e.g. the
+# inventory levels of products) isn't cached
+RESULT_CACHE = False
+RESULT_CACHE_PATH = os.path.join(tempfile.gettempdir(), 'flexio-shopify-cache.sqlite')
+RESULT_CACHE_TTL = 300
+RESULT_CACHE_MAX_SIZE = 256*1024*1024
+
+# request coalescing; when enabled, calls in this process for the same output share a
+# single run, which is requested in a background thread and replayed from the start to
+# each call, so a call can join a run until it's finished; the first COALESCE_MEMORY_SIZE
+# characters of a run's output are kept in memory and the rest in a temporary file until
+# the run is finished and read; the run stops once no calls are reading it
+COALESCE_REQUESTS = False
+COALESCE_MEMORY_SIZE = 16*1024*1024
+
+# instrumentation; when enabled, each call times the stages of each page and counts the
+# pages, requests, retries, rate limited responses, rows and bytes in and out, and writes
+# a summary as a json line to stderr once it's finished, so the output is unchanged; the
+# stages are waiting for the next page (fetch), which includes waiting for the lookups
+# of any joins (join), the requests and their throttling, which may overlap in threads,
+# decoding the json, mapping and converting the rows, filtering and projecting them,
+# encoding them and writing them out; the bulk fetch engine only records the time
+# waiting for the next page
+TRACE = False
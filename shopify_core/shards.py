@@ -0,0 +1,212 @@
+# sharded fetching; the records are split into windows that are paged concurrently
+
+import queue
+import urllib.parse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from shopify_core import settings
+from shopify_core.api import get_count_url, get_pages, get_response, json_loads
+from shopify_core.convert import parse_date
+from shopify_core.trace import NULL_TRACE
+
+def get_shard_windows(resource, session, url, url_query_params, headers, shard_count):
+
+    # returns a list of (page_url, max_id) for each window of the resource's records;
+    # finding the windows takes requests of its own, so calls for fewer than
+    # SHARD_MIN_COUNT records are paged as a single window
+    query = {k: v for k, v in url_query_params.items() if k not in ('limit', 'fields')}
+    total = get_json(session, get_count_url(url, query), headers).get('count', 0)
+    if total < max(1, settings.SHARD_MIN_COUNT):
+        return [(url + '?' + urllib.parse.urlencode(url_query_params), None)]
+    if resource.shard_by == 'created_at':
+        return get_created_at_windows(resource, session, url, url_query_params, headers, shard_count, total)
+    return get_id_windows(resource, session, url, url_query_params, headers, shard_count)
+
+def get_json(session, page_url, headers):
+    return json_loads(get_response(session, page_url, headers).content)
+
+def get_created_at_windows(resource, session, url, url_query_params, headers, shard_count, total):
+
+    # split the total records into windows of created_at with about the same number of
+    # records in each; the boundaries are found from counts of the records created up
+    # to a time; returns a list of (page_url, max_id) for each window
+    count_url = get_count_url(url, {})
+    query = {k: v for k, v in url_query_params.items() if k not in ('limit', 'fields')}
+
+    def get_count(created_at_max):
+        params = dict(query, created_at_max=created_at_max.isoformat())
+        return get_json(session, count_url + '?' + urllib.parse.urlencode(params), headers).get('count', 0)
+
+    # use the created_at filter for the range if there is one; otherwise, the range is
+    # from the first record, since since_id returns records by id, to the current time
+    lo = query.get('created_at_min')
+    hi = query.get('created_at_max')
+    if lo is None:
+        params = dict(query, since_id=0, limit=1, fields='created_at')
+        data = get_json(session, url + '?' + urllib.parse.urlencode(params), headers).get(resource.name, [])
+        if len(data) == 0:
+            return [(url + '?' + urllib.parse.urlencode(url_query_params), None)]
+        lo = data[0].get('created_at')
+    lo = get_aware_date(lo)
+    hi = get_aware_date(hi) if hi is not None else datetime.now(timezone.utc).replace(microsecond=0)
+
+    # the counts up to each time that's been probed; a window can be off by a fraction of
+    # its size, so each boundary stops being searched for once it's within that
+    probes = [(lo - timedelta(seconds=1), 0), (hi, total)]
+    targets = [total * k / shard_count for k in range(1, shard_count)]
+    for target in targets:
+        find_boundary(get_count, probes, target, total / shard_count / 4)
+
+    # each boundary is the first time that's been probed with a count of at least its
+    # target, which includes the probes for the other boundaries so the boundaries are
+    # in order
+    boundaries = [lo] + [min(p for p in probes if p[1] >= target)[0] for target in targets] + [hi]
+
+    # timestamps have a resolution of a second and the api's min/max are inclusive, so
+    # end each window a second before the next one starts
+    windows = []
+    for i in range(shard_count):
+        window_query_params = dict(url_query_params)
+        window_query_params['created_at_min'] = boundaries[i].isoformat()
+        if i < shard_count - 1:
+            window_query_params['created_at_max'] = (boundaries[i+1] - timedelta(seconds=1)).isoformat()
+        elif 'created_at_max' in query:
+            window_query_params['created_at_max'] = boundaries[i+1].isoformat()
+        windows.append((url + '?' + urllib.parse.urlencode(window_query_params), None))
+    return windows
+
+def find_boundary(get_count, probes, target, tolerance):
+
+    # probe the counts up to times between the closest probes on either side of the
+    # target until there's one with a count of at least the target that's within the
+    # tolerance of it; the time is interpolated between the two, which finds it in a
+    # probe or two when records are created at a steady rate; when the same side of the
+    # target is probed twice in a row (e.g. the records end long before the current
+    # time), the other side's weight is halved so the interpolation moves toward it
+    weights = [1.0, 1.0]
+    last_side = None
+    for i in range(8):
+        a, count_a = max(p for p in probes if p[1] < target)
+        b, count_b = min(p for p in probes if p[1] >= target)
+        if count_b - target <= tolerance or b - a <= timedelta(seconds=1):
+            return
+        below = (target - count_a) * weights[0]
+        above = (count_b - target) * weights[1]
+        mid = (a + (b - a) * (below / (below + above))).replace(microsecond=0)
+        mid = min(max(mid, a + timedelta(seconds=1)), b - timedelta(seconds=1))
+        count = get_count(mid)
+        probes.append((mid, count))
+        side = 1 if count >= target else 0
+        if side == last_side:
+            weights[1 - side] /= 2
+        else:
+            weights = [1.0, 1.0]
+        last_side = side
+
+def get_aware_date(value):
+    # filters may be dates or timestamps without an offset (e.g. '2020-01-01'), which
+    # are taken as utc so they can be compared with the current time
+    value = parse_date(value)
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+def get_id_windows(resource, session, url, url_query_params, headers, shard_count):
+
+    # split the records into windows of ids; since_id returns records in id order,
+    # so find the first id and an upper bound on the last id and split the range
+    # between them evenly; returns a list of (page_url, max_id) for each window
+    query = {k: v for k, v in url_query_params.items() if k not in ('limit', 'fields')}
+
+    def get_next_id(since_id):
+        params = dict(query, since_id=since_id, limit=1, fields='id')
+        data = get_json(session, url + '?' + urllib.parse.urlencode(params), headers).get(resource.name, [])
+        return data[0].get('id') if len(data) > 0 else None
+
+    first_id = get_next_id(0)
+    if first_id is None:
+        return [(url + '?' + urllib.parse.urlencode(url_query_params), None)]
+
+    # find an id past the last record by doubling the step from the last id that's been
+    # found, then narrow the gap between the two; ids are assigned across all the shops,
+    # so a shop's ids tend to span a range on the order of the ids themselves, which the
+    # first step is scaled to; the last window has no end, so the gap only needs to be
+    # small next to the range of ids that's been found
+    a, b = first_id, None
+    step = max(1 << 16, first_id // 8)
+    while b is None:
+        next_id = get_next_id(a + step)
+        if next_id is None:
+            b = a + step
+        else:
+            a = next_id
+            step *= 2
+    for i in range(16):
+        if b - a <= max(1, (a - first_id) // (shard_count * 4)):
+            break
+        next_id = get_next_id(a + (b - a) // 2)
+        if next_id is None:
+            b = a + (b - a) // 2
+        else:
+            a = next_id
+    last_id = b
+
+    windows = []
+    boundaries = [first_id - 1 + (last_id - first_id + 1) * k // shard_count for k in range(shard_count + 1)]
+    for i in range(shard_count):
+        window_query_params = dict(url_query_params)
+        window_query_params['since_id'] = boundaries[i]
+        if 'fields' in window_query_params and 'id' not in window_query_params['fields'].split(','):
+            window_query_params['fields'] += ',id' # needed to find the end of the window
+        max_id = boundaries[i+1] if i < shard_count - 1 else None
+        windows.append((url + '?' + urllib.parse.urlencode(window_query_params), max_id))
+    return windows
+
+def get_sharded_pages(resource, session, windows, headers, trace=NULL_TRACE):
+
+    # page each window in a thread pool, buffering the pages of each window in its own
+    # bounded queue, and return the pages window by window so the order is the same from
+    # one run to the next; a window blocks once its queue is full until it's reached
+    done = object()
+    stop = threading.Event()
+    queues = [queue.Queue(maxsize=settings.SHARD_BUFFER_PAGES) for w in windows]
+
+    def put(q, value):
+        while not stop.is_set():
+            try:
+                q.put(value, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def fetch_window(q, page_url, max_id):
+        try:
+            for data in get_pages(resource, session, page_url, headers, trace):
+                # windows of ids end partway through the page that passes the window
+                if max_id is not None and data[-1].get('id') > max_id:
+                    data = [item for item in data if item.get('id') <= max_id]
+                    if len(data) > 0:
+                        put(q, data)
+                    break
+                if not put(q, data):
+                    return
+            put(q, done)
+        except Exception as e:
+            put(q, e)
+
+    executor = ThreadPoolExecutor(max_workers=settings.SHARD_CONCURRENCY)
+    try:
+        for q, (page_url, max_id) in zip(queues, windows):
+            executor.submit(fetch_window, q, page_url, max_id)
+        for q in queues:
+            while True:
+                data = q.get()
+                if data is done:
+                    break
+                if isinstance(data, Exception):
+                    raise data
+                yield data
+    finally:
+        stop.set()
+        executor.shutdown(wait=False)
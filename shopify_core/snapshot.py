@@ -0,0 +1,67 @@
+# incremental sync; the rows of each shop's records are kept in a local sqlite snapshot
+
+import json
+import sqlite3
+import hashlib
+import itertools
+import urllib.parse
+
+from shopify_core import settings
+from shopify_core.formats import encode_rows
+from shopify_core.api import get_pages, get_response, get_shop_time, json_loads
+from shopify_core.pipeline import get_item_mapper, get_page_rows, get_properties
+
+def get_snapshot_pages(resource, session, url, url_query_params, headers, api_base_uri):
+
+    # refresh the local snapshot of the shop's records by requesting only the records
+    # updated since the last refresh, then return all the rows in the snapshot; the
+    # watermark is the shop's time of the first response, so a record that's updated
+    # after its page has been requested is requested again by the next refresh; note:
+    # the updated_at watermark doesn't capture deleted records, so these remain in the
+    # snapshot until it's removed
+    key = get_snapshot_key(api_base_uri, headers)
+    db = sqlite3.connect(settings.SNAPSHOT_PATH, timeout=30)
+    try:
+        db.execute('create table if not exists snapshot_rows (key text, resource text, id integer, rows text, primary key (key, resource, id))')
+        db.execute('create table if not exists snapshot_watermarks (key text, resource text, updated_at text, primary key (key, resource))')
+
+        row = db.execute('select updated_at from snapshot_watermarks where key = ? and resource = ?', (key, resource.name)).fetchone()
+        watermark = row[0] if row is not None else None
+
+        mapper = get_item_mapper(resource, get_properties(resource, {}))
+        url_query_params = dict(url_query_params)
+        if watermark is not None:
+            url_query_params['updated_at_min'] = watermark
+        page_url = url + '?' + urllib.parse.urlencode(url_query_params)
+
+        # merge the changed records into the snapshot and only advance the watermark
+        # once all the pages have been merged
+        response = get_response(session, page_url, headers)
+        shop_time = get_shop_time(response)
+        data_pages = [json_loads(response.content).get(resource.name, [])]
+        next_url = response.links.get('next', {}).get('url')
+        if next_url is not None:
+            data_pages = itertools.chain(data_pages, get_pages(resource, session, next_url, headers))
+        with db:
+            for data in data_pages:
+                for item in data:
+                    rows = get_page_rows(resource, [item], mapper, resource.name)
+                    db.execute('insert or replace into snapshot_rows (key, resource, id, rows) values (?, ?, ?, ?)',
+                               (key, resource.name, item.get('id'), encode_rows([rows])[0]))
+            db.execute('insert or replace into snapshot_watermarks (key, resource, updated_at) values (?, ?, ?)',
+                       (key, resource.name, shop_time))
+
+        cursor = db.execute('select rows from snapshot_rows where key = ? and resource = ? order by id', (key, resource.name))
+        while True:
+            result = cursor.fetchmany(url_query_params.get('limit', 250))
+            if len(result) == 0:
+                break
+            yield [item for r in result for item in json_loads(r[0])]
+    finally:
+        db.close()
+
+def get_snapshot_key(api_base_uri, headers):
+    # each access token has its own snapshot of a shop since tokens with different scopes
+    # may see different records; like the result cache, the token is only kept as a hash
+    key = json.dumps([api_base_uri, headers.get('X-Shopify-Access-Token')])
+    return hashlib.sha256(key.encode()).hexdigest()
@@ -0,0 +1,56 @@
+# per-call instrumentation; see settings.TRACE
+
+import sys
+import json
+import threading
+from time import perf_counter
+from collections import OrderedDict
+
+class Trace():
+
+    enabled = True
+
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.start = perf_counter()
+        self.seconds = OrderedDict((s, 0.0) for s in ['fetch', 'join', 'throttle', 'network', 'decode', 'map', 'convert', 'filter', 'encode', 'write'])
+        self.counts = OrderedDict((c, 0) for c in ['pages', 'requests', 'retries', 'throttled', 'rows', 'bytes_in', 'bytes_out'])
+
+    def now(self):
+        return perf_counter()
+
+    def lap(self, stage, start):
+        # add the time since the start to the stage and return the time as the next start
+        now = perf_counter()
+        with self.lock:
+            self.seconds[stage] += now - start
+        return now
+
+    def count(self, counter, value=1):
+        with self.lock:
+            self.counts[counter] += value
+
+    def write_summary(self):
+        summary = OrderedDict()
+        summary['function'] = self.name
+        summary['seconds'] = round(perf_counter() - self.start, 6)
+        summary['stages'] = OrderedDict((s, round(v, 6)) for s, v in self.seconds.items())
+        summary.update(self.counts)
+        sys.stderr.write(json.dumps(summary) + '\n')
+
+class NullTrace():
+
+    # does nothing so that disabled instrumentation only costs a method call
+    enabled = False
+
+    def now(self):
+        return 0
+
+    def lap(self, stage, start):
+        return start
+
+    def count(self, counter, value=1):
+        pass
+
+NULL_TRACE = NullTrace()
@@ -0,0 +1,63 @@
+# fixtures for the tests that run the functions against the local mock of the admin api
+# in benchmarks/mock_shopify.py
+
+import os
+import sys
+import copy
+import importlib.util
+
+import pytest
+
+from shopify_core import settings
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import mock_shopify
+
+FUNCTION_NAMES = ['shopify-orders', 'shopify-products', 'shopify-customers']
+FUNCTIONS = {}
+
+def load_function(name):
+    if name not in FUNCTIONS:
+        spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(ROOT, name + '.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        FUNCTIONS[name] = module
+    return FUNCTIONS[name]
+
+class Shop():
+
+    # a mock shop with a few pages of each resource; get_data() calls a function with
+    # the params and the access token 'token' unless another is passed, and run() returns
+    # its output
+    def __init__(self, mock, api_base_uri):
+        self.mock = mock
+        self.api_base_uri = api_base_uri
+
+    def get_data(self, name, access_token='token', **params):
+        params['shopify_connection'] = {'access_token': access_token, 'api_base_uri': self.api_base_uri}
+        return load_function(name).get_data(params)
+
+    def run(self, name, access_token='token', **params):
+        return ''.join(self.get_data(name, access_token, **params))
+
+@pytest.fixture(scope='session')
+def shop_data():
+    return mock_shopify.get_data(orders=700, line_items=2, products=60, variants=3, images=1, customers=300, addresses=1)
+
+@pytest.fixture
+def cache_paths(monkeypatch, tmp_path):
+    # the caches and the snapshot are kept in a temp dir, so each test starts without them
+    monkeypatch.setattr(settings, 'RESULT_CACHE_PATH', str(tmp_path / 'cache.sqlite'))
+    monkeypatch.setattr(settings, 'SNAPSHOT_PATH', str(tmp_path / 'snapshot.sqlite'))
+    monkeypatch.setattr(settings, 'METAFIELDS_CACHE_PATH', str(tmp_path / 'metafields.sqlite'))
+    return tmp_path
+
+@pytest.fixture
+def shop(shop_data, cache_paths):
+    # the data is copied since tests may change it
+    mock = mock_shopify.MockShopify(copy.deepcopy(shop_data))
+    shop = Shop(mock, mock.start())
+    yield shop
+    mock.stop()
@@ -0,0 +1,36 @@
+# the bulk fetch engine runs one bulk operation at a time for each shop
+
+import threading
+
+import pytest
+import requests
+
+from shopify_core import settings
+from shopify_core.bulk import run_bulk_operation
+
+@pytest.fixture
+def bulk(shop, monkeypatch):
+    monkeypatch.setattr(settings, 'FETCH_ENGINE', 'bulk')
+    monkeypatch.setattr(settings, 'BULK_MIN_COUNT', 1)
+    monkeypatch.setattr(settings, 'BULK_POLL_INTERVAL', 0.05)
+    shop.mock.bulk_duration = 0.5
+
+def test_concurrent_calls_wait_for_the_operation_in_progress(shop, bulk):
+    # the second call's operation can't be started until the first one has finished
+    names = ['shopify-orders', 'shopify-customers']
+    expected = {name: shop.run(name) for name in names}
+    shop.mock.operations.clear()
+    outputs = {}
+    threads = [threading.Thread(target=lambda name=name: outputs.update({name: shop.run(name)})) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert outputs == expected
+    first, second = [shop.mock.operations[id][2] for id in ('1', '2')]
+    assert second - first >= shop.mock.bulk_duration
+    assert len(shop.mock.operations) == 2
+
+def test_query_errors_are_raised(shop, bulk):
+    with requests.Session() as session, pytest.raises(RuntimeError, match="Field 'widgets' doesn't exist"):
+        run_bulk_operation('{ widgets { edges { node { id } } } }', session, shop.api_base_uri + '/admin/api/2020-04/graphql.json', {})
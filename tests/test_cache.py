@@ -0,0 +1,65 @@
+# the result cache returns the output of a call again while it's still valid
+
+import pytest
+
+from shopify_core import settings
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(settings, 'RESULT_CACHE', True)
+
+def test_hit(shop, cache):
+    expected = shop.run('shopify-orders')
+    shop.mock.reset_stats()
+    assert shop.run('shopify-orders') == expected
+    assert shop.mock.stats['requests'] == 0
+
+def test_miss_for_other_params_and_tokens(shop, cache):
+    shop.run('shopify-orders')
+    shop.mock.reset_stats()
+    shop.run('shopify-orders', properties='id,name')
+    shop.run('shopify-orders', access_token='other')
+    assert shop.mock.stats['requests'] > 2
+
+def test_revalidation(shop, cache, monkeypatch):
+    # once the ttl is up, the count and an update probe are requested and the output
+    # is returned as is
+    expected = shop.run('shopify-orders')
+    monkeypatch.setattr(settings, 'RESULT_CACHE_TTL', 0)
+    shop.mock.reset_stats()
+    assert shop.run('shopify-orders') == expected
+    assert shop.mock.stats['requests'] == 2
+    assert shop.mock.paths[0].split('?')[0].endswith('/count.json')
+    assert 'updated_at_min' in shop.mock.paths[1]
+
+def test_invalidated_by_update(shop, cache, monkeypatch):
+    shop.run('shopify-orders')
+    monkeypatch.setattr(settings, 'RESULT_CACHE_TTL', 0)
+    shop.mock.data['orders'][10]['updated_at'] = '2100-01-01T00:00:00-05:00'
+    shop.mock.reset_stats()
+    output = shop.run('shopify-orders')
+    assert '"2100-01-01T00:00:00-05:00"' in output
+    assert shop.mock.stats['requests'] > 2
+
+    # the new output is cached in turn
+    shop.mock.reset_stats()
+    monkeypatch.setattr(settings, 'RESULT_CACHE_TTL', 300)
+    assert shop.run('shopify-orders') == output
+    assert shop.mock.stats['requests'] == 0
+
+def test_invalidated_by_delete(shop, cache, monkeypatch):
+    # a deleted record doesn't change updated_at, but changes the count
+    expected = shop.run('shopify-orders')
+    monkeypatch.setattr(settings, 'RESULT_CACHE_TTL', 0)
+    del shop.mock.data['orders'][10]
+    output = shop.run('shopify-orders')
+    assert output != expected
+    assert len(output.splitlines()) == len(expected.splitlines()) - 1
+
+def test_partial_output_not_cached(shop, cache):
+    output = shop.get_data('shopify-orders')
+    next(output)
+    output.close()
+    shop.mock.reset_stats()
+    shop.run('shopify-orders')
+    assert shop.mock.stats['requests'] > 0
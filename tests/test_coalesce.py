@@ -0,0 +1,91 @@
+# calls for the same output share a single run while it's in progress
+
+import threading
+import time
+
+import pytest
+
+from shopify_core import settings
+from shopify_core.coalesce import COALESCED_OUTPUTS, get_coalesced_output
+
+@pytest.fixture
+def coalesce(shop, monkeypatch):
+    # the pages take long enough that the calls start while the run is in progress
+    monkeypatch.setattr(settings, 'COALESCE_REQUESTS', True)
+    shop.mock.latency = 0.1
+
+def run_staggered(shop, count, interval, read=None):
+    # start the calls at intervals and return their outputs in order
+    outputs = [None] * count
+    def call(i):
+        time.sleep(i * interval)
+        output = shop.get_data('shopify-orders')
+        outputs[i] = read(output) if read is not None else ''.join(output)
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outputs
+
+@pytest.mark.parametrize('memory_size', [16*1024*1024, 100000, 0])
+def test_staggered_calls_share_one_run(shop, coalesce, monkeypatch, memory_size):
+    # the calls that start after the first chunks are read replay them, whether they're
+    # in memory or spilled to the file
+    monkeypatch.setattr(settings, 'COALESCE_MEMORY_SIZE', memory_size)
+    monkeypatch.setattr(settings, 'OUTPUT_CHUNK_SIZE', 4096)
+    expected = shop.run('shopify-orders')
+    requests = shop.mock.stats['requests']
+    shop.mock.reset_stats()
+    assert run_staggered(shop, 8, 0.02) == [expected] * 8
+    assert shop.mock.stats['requests'] == requests
+    assert len(COALESCED_OUTPUTS) == 0
+
+def test_slow_call_spills_the_run(shop, coalesce, monkeypatch):
+    # a call that reads slowly doesn't hold up the run or keep more than the memory
+    # size of its chunks in memory
+    monkeypatch.setattr(settings, 'COALESCE_MEMORY_SIZE', 100000)
+    monkeypatch.setattr(settings, 'OUTPUT_CHUNK_SIZE', 4096)
+    expected = shop.run('shopify-orders')
+    flights = []
+    def read(output):
+        chunks = [next(output)]
+        flights.append(next(iter(COALESCED_OUTPUTS.values())))
+        while not flights[0].done:
+            time.sleep(0.01)
+        return ''.join(chunks + list(output))
+    assert run_staggered(shop, 2, 0.1, read) == [expected] * 2
+    assert flights[0].size <= 100000 < len(expected)
+    assert flights[0].file is None
+
+def test_abandoned_run_stops(shop, coalesce, monkeypatch):
+    # without prefetching, the pages after the first chunk's aren't requested
+    monkeypatch.setattr(settings, 'PREFETCH_PAGES', 0)
+    expected = shop.run('shopify-orders')
+    requests = shop.mock.stats['requests']
+    shop.mock.reset_stats()
+    threads = threading.active_count()
+    output = shop.get_data('shopify-orders')
+    assert expected.startswith(next(output))
+    output.close()
+    time.sleep(0.3)
+    assert shop.mock.stats['requests'] < requests
+    assert len(COALESCED_OUTPUTS) == 0
+    assert threading.active_count() == threads
+
+def test_errors_are_raised_to_each_call():
+    # both calls get the chunk before the error and then the error
+    started = threading.Event()
+    def output():
+        yield 'a'
+        started.wait()
+        raise ValueError('failed')
+    first = get_coalesced_output('key', output())
+    assert next(first) == 'a'
+    second = get_coalesced_output('key', (chunk for chunk in ()))
+    assert next(second) == 'a'
+    started.set()
+    for call in (first, second):
+        with pytest.raises(ValueError, match='failed'):
+            next(call)
+    assert len(COALESCED_OUTPUTS) == 0
@@ -0,0 +1,100 @@
+# the filter param is split into api filters and row filters, and the row filters are
+# compiled into a predicate on the rows
+
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from shopify_core.pipeline import get_filter, get_predicate
+from conftest import load_function
+
+@pytest.fixture
+def orders():
+    return load_function('shopify-orders').RESOURCE
+
+def test_api_and_row_filters(orders):
+    api_filters, row_filters = get_filter(orders, {'filter': 'financial_status=paid&currency=USD&created_at_min=2020-01-01'})
+    assert dict(api_filters) == {'financial_status': 'paid', 'created_at_min': '2020-01-01'}
+    assert dict(row_filters) == {'currency': ['USD']}
+
+def test_keys_and_values_are_trimmed(orders):
+    api_filters, row_filters = get_filter(orders, {'filter': ' ?Currency = USD & Total_Price=10.00 '})
+    assert dict(api_filters) == {}
+    assert dict(row_filters) == {'currency': ['USD'], 'total_price': ['10.00']}
+
+def test_repeated_keys(orders):
+    # ids are joined for the api; other repeated keys are row filters matching any value
+    api_filters, row_filters = get_filter(orders, {'filter': 'ids=1&ids=2,3&financial_status=paid&financial_status=refunded'})
+    assert dict(api_filters) == {'ids': '1,2,3'}
+    assert dict(row_filters) == {'financial_status': ['paid', 'refunded']}
+
+def test_encoded_values(orders):
+    api_filters, row_filters = get_filter(orders, {'filter': 'billing_address_city=New%20York&tags=a+b&note=%26%3D'})
+    assert dict(row_filters) == {'billing_address_city': ['New York'], 'tags': ['a b'], 'note': ['&=']}
+
+@pytest.mark.parametrize('filter', [None, '', '?', '&&', '=', '=x&=y', '  '])
+def test_empty_filters(orders, filter):
+    api_filters, row_filters = get_filter(orders, {'filter': filter})
+    assert len(api_filters) == 0 and len(row_filters) == 0
+    assert get_predicate(row_filters) is None
+
+@pytest.mark.parametrize('filter, row_filters', [
+    ('currency', {'currency': ['']}),
+    ('currency=&id=1', {'currency': [''], 'id': ['1']}),
+    ('currency==USD', {'currency': ['=USD']}),
+    ('%zz=1&currency=%', {'%zz': ['1'], 'currency': ['%']}),
+    (12, {'12': ['']}),
+    ('not a filter', {'not a filter': ['']}),
+])
+def test_malformed_filters(orders, filter, row_filters):
+    # malformed filters are taken as literally as a query string can be
+    assert dict(get_filter(orders, {'filter': filter})[1]) == row_filters
+
+def test_multiple_api_values_are_row_filters(orders):
+    api_filters, row_filters = get_filter(orders, {'filter': 'status=open&status=closed'})
+    assert dict(api_filters) == {}
+    assert dict(row_filters) == {'status': ['open', 'closed']}
+
+def test_predicate_strings():
+    predicate = get_predicate({'currency': ['usd', 'CAD'], 'tags': ['']})
+    assert predicate({'currency': 'USD', 'tags': None})
+    assert predicate({'currency': 'cad', 'tags': ''})
+    assert not predicate({'currency': 'EUR', 'tags': None})
+    assert not predicate({'currency': 'USD', 'tags': 'sale'})
+    assert not predicate({'tags': None})
+
+def test_predicate_numbers():
+    predicate = get_predicate({'total_price': ['10', '12.30'], 'id': ['1e3']})
+    assert predicate({'total_price': Decimal('10.00'), 'id': 1000})
+    assert predicate({'total_price': 10.0, 'id': 1000.0})
+    assert predicate({'total_price': Decimal('12.30'), 'id': 1000})
+    assert predicate({'total_price': 12.3, 'id': 1000})
+    assert predicate({'total_price': '10', 'id': 1000})
+    assert not predicate({'total_price': '10.00', 'id': 1000})
+    assert not predicate({'total_price': Decimal('12.31'), 'id': 1000})
+    assert not predicate({'total_price': 10, 'id': 1001})
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-', '1.2.3', '0x10'])
+def test_predicate_bad_numbers(value):
+    # values that aren't finite numbers still compare as strings
+    predicate = get_predicate({'total_price': [value]})
+    assert predicate({'total_price': value.upper()})
+    assert not predicate({'total_price': Decimal('10')})
+
+def test_predicate_booleans_and_dates():
+    predicate = get_predicate({'taxable': ['TRUE'], 'created_at': ['2020-01-01T00:00:00+00:00']})
+    assert predicate({'taxable': True, 'created_at': datetime(2020, 1, 1, tzinfo=timezone.utc)})
+    assert predicate({'taxable': 'true', 'created_at': '2020-01-01T00:00:00+00:00'})
+    assert not predicate({'taxable': 1, 'created_at': '2020-01-01T00:00:00+00:00'})
+    assert not predicate({'taxable': False, 'created_at': '2020-01-01T00:00:00+00:00'})
+
+def test_filtered_output(shop):
+    output = shop.run('shopify-orders', properties='id,currency', filter='billing_address_company=acme&currency=usd')
+    rows = [json.loads(row) for row in output.splitlines()]
+    assert 0 < len(rows) < 700
+    assert all(list(row.keys()) == ['id', 'currency'] and row['currency'] == 'USD' for row in rows)
+    expected = [row['id'] for row in map(json.loads, shop.run('shopify-orders').splitlines()) if row['billing_address_company'] == 'Acme']
+    assert [row['id'] for row in rows] == expected
+    assert shop.run('shopify-orders', filter='no_such_property=1') == ''
@@ -0,0 +1,82 @@
+# the mapper that's compiled from the property spec returns the same rows as looking up
+# each property's source in the record one property at a time; the properties of the spec
+# are the ones in the header of each function (see test_property_spec.py)
+
+import copy
+
+import pytest
+
+from shopify_core.pipeline import get_item_mapper
+from conftest import FUNCTION_NAMES, load_function
+
+RESOURCES = {'shopify-orders': 'orders', 'shopify-products': 'products', 'shopify-customers': 'customers'}
+
+def get_item_info(resource, header_item, detail_item, properties):
+    # e.g. 'billing_address.city' is (header_item.get('billing_address') or {}).get('city')
+    sources = {p[0]: p[2] for p in resource.property_spec}
+    info = {}
+    for p in properties:
+        path = sources[p].split('.')
+        item = header_item
+        if path[0] == '%s[]' % resource.child_key:
+            item, path = detail_item, path[1:]
+        for key in path[:-1]:
+            item = item.get(key) or {}
+        info[p] = item.get(path[-1])
+    return info
+
+def get_items(records):
+    # the records as they are, with each of their objects missing or null, and empty
+    items = []
+    for record in records:
+        items.append(record)
+        for key, value in record.items():
+            if isinstance(value, dict) or value is None:
+                items.append({k: v for k, v in record.items() if k != key})
+                items.append(dict(record, **{key: None}))
+    return items + [{}]
+
+def get_rows(resource, items, get_row):
+    rows = []
+    for header_item in items:
+        for detail_item in (resource.get_children(copy.deepcopy(header_item)) or [{}]) + [{}]:
+            rows.append(get_row(header_item, detail_item))
+    return rows
+
+@pytest.mark.parametrize('name', FUNCTION_NAMES)
+def test_mapper_matches_spec(name, shop_data):
+    resource = load_function(name).RESOURCE
+    properties = [p[0] for p in resource.property_spec]
+    items = get_items(shop_data[RESOURCES[name]][:20])
+    mapper = get_item_mapper(resource, properties)
+    expected = get_rows(resource, items, lambda h, d: get_item_info(resource, h, d, properties))
+    assert get_rows(resource, items, mapper) == expected
+    assert all(list(row.keys()) == properties for row in expected)
+
+@pytest.mark.parametrize('name', FUNCTION_NAMES)
+def test_mapper_for_each_property(name, shop_data):
+    # each property on its own, and the properties in reverse order along with ones that
+    # aren't in the spec
+    resource = load_function(name).RESOURCE
+    properties = [p[0] for p in resource.property_spec]
+    items = get_items(shop_data[RESOURCES[name]][:5])
+    for p in properties:
+        assert get_rows(resource, items, get_item_mapper(resource, [p])) == \
+               get_rows(resource, items, lambda h, d: get_item_info(resource, h, d, [p]))
+    reversed_properties = properties[::-1] + ['no_such_property']
+    rows = get_rows(resource, items, get_item_mapper(resource, reversed_properties))
+    assert rows == [dict({p: row[p] for p in properties[::-1]}, no_such_property=None)
+                    for row in get_rows(resource, items, lambda h, d: get_item_info(resource, h, d, properties))]
+    assert all(list(row.keys()) == reversed_properties for row in rows)
+
+def test_mapper_is_reused():
+    resource = load_function('shopify-orders').RESOURCE
+    assert get_item_mapper(resource, ['id', 'currency']) is get_item_mapper(resource, ('id', 'currency'))
+
+def test_mapper_join_prefix():
+    # the properties of a join with a prefix are looked up in the join's object
+    resource = load_function('shopify-products').RESOURCE
+    mapper = get_item_mapper(resource, ['id', 'metafields.custom.color', 'metafields.custom.size'])
+    item = {'id': 1, 'metafields': {'custom.color': 'red'}}
+    assert mapper(item, {}) == {'id': 1, 'metafields.custom.color': 'red', 'metafields.custom.size': None}
+    assert mapper({'id': 2, 'metafields': None}, {}) == {'id': 2, 'metafields.custom.color': None, 'metafields.custom.size': None}
@@ -0,0 +1,101 @@
+# the faster json paths give the same results as the stdlib ones they replace: the
+# shared row encoder, orjson page decoding and the incremental decoding of pages
+
+import json
+import random
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from shopify_core import api
+from shopify_core.api import get_json_items, json_loads
+from shopify_core.convert import to_string
+from shopify_core.formats import encode_money_row, encode_rows
+
+ROWS = [
+    [1, 'plain', None, True, False],
+    ['café 日本 \U0001f600', '  ', '\ud800'],
+    ['quote " backslash \\ slash / tab \t newline \n nul \x00 bell \x07'],
+    [2 ** 53 + 1, 2 ** 64, -2 ** 70, 10 ** 30],
+    [0.1, 1e-7, 1e22, -0.0, 3.141592653589793, float('inf'), float('nan')],
+    [Decimal('12.30'), Decimal('-0.01'), Decimal('1E+3'), Decimal('123456789012345678901234.5')],
+    [date(2024, 2, 29), datetime(2024, 1, 2, 3, 4, 5), datetime(2024, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc)],
+    [{'nested': ['é', Decimal('1.5'), {'b': 1, 'a': 2}]}, [], {}],
+]
+
+PAGE = json.dumps({
+    'orders': [
+        {
+            'id': 450789469 + i,
+            'name': '#%d é日 \U0001f600' % (1000 + i),
+            'note': 'line\nbreak "quoted" \\  ',
+            'total_price': '%d.%02d' % (i * 7, i),
+            'total_weight': i * 1.5,
+            'taxes_included': i % 2 == 0,
+            'closed_at': None,
+            'tags': ['a', 'b ü'],
+            'line_items': [{'id': 2 ** 40 + j, 'price': '1.99', 'grams': j * 0.25} for j in range(3)],
+        }
+        for i in range(20)
+    ],
+}, ensure_ascii=False, indent=1).encode('utf-8')
+
+@pytest.mark.parametrize('row', ROWS)
+def test_encode_rows_matches_json_dumps(row):
+    assert encode_rows([row]) == [json.dumps(row, default=to_string)]
+
+def test_encode_rows_dicts():
+    rows = [{'id': i, 'value': value} for i, value in enumerate(sum(ROWS, []))]
+    assert encode_rows(rows) == [json.dumps(row, default=to_string) for row in rows]
+
+def test_json_loads_orjson_matches_stdlib(monkeypatch):
+    orjson = pytest.importorskip('orjson')
+    monkeypatch.setattr(api, 'orjson', orjson)
+    decoded = json_loads(PAGE)
+    monkeypatch.setattr(api, 'orjson', None)
+    assert decoded == json_loads(PAGE) == json.loads(PAGE)
+
+def get_chunks(content, size):
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+def test_json_items_split_at_every_boundary():
+    # the split points include ones within multibyte utf-8 characters
+    expected = json.loads(PAGE)['orders']
+    for i in range(len(PAGE) + 1):
+        assert list(get_json_items([PAGE[:i], PAGE[i:]], 'orders')) == expected
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 1000, 1 << 20])
+def test_json_items_fixed_chunk_sizes(size):
+    assert list(get_json_items(get_chunks(PAGE, size), 'orders')) == json.loads(PAGE)['orders']
+
+def test_json_items_random_chunks():
+    rng = random.Random(0)
+    expected = json.loads(PAGE)['orders']
+    for _ in range(200):
+        points = sorted(rng.sample(range(1, len(PAGE)), rng.randint(1, 50)))
+        chunks = [PAGE[i:j] for i, j in zip([0] + points, points + [len(PAGE)])]
+        assert list(get_json_items(chunks, 'orders')) == expected
+
+def test_json_items_key_not_first():
+    content = json.dumps({'count': 2, 'orders': [{'id': 1}, {'id': 2}]}).encode('utf-8')
+    assert list(get_json_items(get_chunks(content, 5), 'orders')) == [{'id': 1}, {'id': 2}]
+
+def test_json_items_empty_list():
+    assert list(get_json_items(get_chunks(b'{"orders": [ ]}', 3), 'orders')) == []
+
+@pytest.mark.parametrize('end', [PAGE.rindex(b']'), PAGE.rindex(b'}', 0, -2), len(PAGE) // 2, 12])
+def test_json_items_truncated(end):
+    # the contents end within the list, whether between or within its objects
+    with pytest.raises(ValueError):
+        list(get_json_items(get_chunks(PAGE[:end], 7), 'orders'))
+
+def test_money_rows_are_exact_numbers():
+    # the json format writes money with the digits of the decimals, and the rest of the
+    # row the same as the row encoder
+    row = [Decimal('12.30'), 'é "x"', Decimal('-0.01'), Decimal('1E+3'), Decimal('NaN'), None, date(2024, 2, 29), Decimal('0.1')]
+    line = encode_money_row(row, [0, 2, 3, 4, 7])
+    assert line == '[12.30, "\\u00e9 \\"x\\"", -0.01, 1E+3, "NaN", null, "2024-02-29", 0.1]'
+    assert json.loads(line, parse_float=Decimal)[:4] == [Decimal('12.30'), 'é "x"', Decimal('-0.01'), Decimal('1E+3')]
+    assert encode_money_row(row, []) == encode_rows([row])[0]
+    assert encode_money_row([], []) == '[]'
@@ -0,0 +1,36 @@
+# the property spec of each function matches the 'returns' in its header, which is what
+# the properties param and the output are documented with
+
+import os
+import re
+import importlib.util
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+FUNCTIONS = ['shopify-orders', 'shopify-products', 'shopify-customers']
+
+def load_function(name):
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(ROOT, name + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def get_header_returns(name):
+    # the (name, type) of each property in the 'returns' of the header
+    with open(os.path.join(ROOT, name + '.py')) as f:
+        header = f.read().split('# ---\n')[1]
+    returns = header.split('# returns:\n')[1].split('# examples:\n')[0]
+    return re.findall(r'^#   - name: (\S+)\n#     type: (\S+)$', returns, re.MULTILINE)
+
+@pytest.mark.parametrize('name', FUNCTIONS)
+def test_spec_matches_header(name):
+    module = load_function(name)
+    assert [(p[0], p[1]) for p in module.PROPERTY_SPEC] == get_header_returns(name)
+
+@pytest.mark.parametrize('name', FUNCTIONS)
+def test_join_properties_are_in_spec(name):
+    module = load_function(name)
+    properties = set(p[0] for p in module.PROPERTY_SPEC)
+    for join in module.RESOURCE.joins:
+        assert set(join.properties) <= properties
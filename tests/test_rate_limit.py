@@ -0,0 +1,75 @@
+# requests to a shop share a rate limiter that keeps them within the shop's leaky bucket,
+# and a throttled request is retried once the api says to
+
+import copy
+import threading
+import time
+
+import pytest
+
+from shopify_core import settings
+from shopify_core.api import RateLimiter
+from conftest import Shop, mock_shopify
+
+@pytest.fixture
+def limited_shop(shop_data):
+    # a small bucket that fills up before the sharded calls are done
+    mock = mock_shopify.MockShopify(copy.deepcopy(shop_data), rate_limit=True, bucket_size=30)
+    yield Shop(mock, mock.start())
+    mock.stop()
+
+def test_reserve_within_headroom():
+    # the calls up to the headroom are made right away, then at the leak rate
+    limiter = RateLimiter(size=40)
+    waits = [limiter.reserve() for i in range(40 - settings.RATE_LIMIT_HEADROOM)]
+    assert waits == [0.0] * len(waits)
+    assert limiter.reserve() == pytest.approx(0.5, abs=0.05)
+    assert limiter.reserve() == pytest.approx(1.0, abs=0.05)
+
+def test_update_from_headers():
+    # the reported level is kept when it's higher than the estimate
+    limiter = RateLimiter()
+    limiter.reserve()
+    limiter.update(200, {'X-Shopify-Shop-Api-Call-Limit': '38/80'})
+    assert limiter.size == 80
+    assert limiter.reserve() == 0.0
+    limiter.update(200, {'X-Shopify-Shop-Api-Call-Limit': '1/80'})
+    assert limiter.level == pytest.approx(39, abs=0.1)
+    limiter.update(200, {'X-Shopify-Shop-Api-Call-Limit': 'bad'})
+    assert limiter.size == 80
+
+@pytest.mark.parametrize('retry_after, wait', [('3.0', 3.0), ('bad', 1.0), (None, 1.0)])
+def test_update_from_throttled_response(retry_after, wait):
+    limiter = RateLimiter(size=1000)
+    headers = {'Retry-After': retry_after} if retry_after is not None else {}
+    limiter.update(429, headers)
+    assert limiter.reserve() == pytest.approx(wait, abs=0.05)
+
+def test_concurrent_sharded_calls_are_not_throttled(limited_shop, monkeypatch):
+    # two functions sharded four ways make more calls than the bucket holds at once
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 4)
+    monkeypatch.setattr(settings, 'SHARD_MIN_COUNT', 1)
+    names = ['shopify-orders', 'shopify-customers']
+    outputs = {}
+    threads = [threading.Thread(target=lambda name=name: outputs.update({name: limited_shop.run(name)})) for name in names]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert limited_shop.mock.stats['requests'] > limited_shop.mock.bucket_size
+    assert limited_shop.mock.stats['throttled'] == 0
+    assert len(outputs['shopify-orders'].splitlines()) == len(limited_shop.mock.data['orders'])
+    assert len(outputs['shopify-customers'].splitlines()) == len(limited_shop.mock.data['customers'])
+
+def test_throttled_request_is_retried_after_wait(limited_shop):
+    # the bucket is full when the call starts, so its first request gets a 429 with a
+    # Retry-After of 2 seconds and is made again once that's passed
+    limited_shop.mock.bucket = limited_shop.mock.bucket_size
+    t = time.monotonic()
+    output = limited_shop.run('shopify-products', properties='id')
+    elapsed = time.monotonic() - t
+    paths = limited_shop.mock.paths
+    assert limited_shop.mock.stats['throttled'] == 1
+    assert len(paths) == 2 and paths[0] == paths[1]
+    assert elapsed >= 2.0
+    assert len(set(output.splitlines())) == len(limited_shop.mock.data['products'])
@@ -0,0 +1,103 @@
+# sharded fetching returns the same output as paging a single stream
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from urllib.parse import unquote
+
+from shopify_core import settings
+from conftest import mock_shopify
+
+@pytest.fixture
+def shards(monkeypatch):
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 4)
+    monkeypatch.setattr(settings, 'SHARD_MIN_COUNT', 1)
+
+def get_window_requests(shop):
+    # the requests made to find the windows are for counts and single records
+    return [path for path in shop.mock.paths if 'count.json' in path or 'limit=1&' in path or path.endswith('limit=1')]
+
+@pytest.mark.parametrize('name, params', [
+    ('shopify-orders', {}),
+    ('shopify-orders', {'mode': 'line_items'}),
+    ('shopify-orders', {'properties': 'id,created_at,total_price'}),
+    ('shopify-orders', {'filter': 'created_at_min=2020-01-01T02:00:00-05:00&created_at_max=2020-01-01T08:00:00-05:00'}),
+    ('shopify-orders', {'filter': 'created_at_min=2019-12-31&created_at_max=2020-01-02'}),
+    ('shopify-products', {}),
+    ('shopify-products', {'mode': 'variants', 'properties': 'id,variant_id,variant_sku'}),
+    ('shopify-customers', {}),
+])
+def test_sharded_output_matches_single_stream(shop, name, params, monkeypatch):
+    expected = shop.run(name, **params)
+    assert len(expected) > 0
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 4)
+    monkeypatch.setattr(settings, 'SHARD_MIN_COUNT', 1)
+    assert shop.run(name, **params) == expected
+
+def test_created_at_window_requests(shop, shards):
+    # orders created at a steady rate up to now take a count for each boundary or two
+    orders = shop.mock.data['orders']
+    span = (datetime.now(timezone.utc) - mock_shopify.START).total_seconds()
+    for i, order in enumerate(orders):
+        order['created_at'] = mock_shopify.get_timestamp(int(span * i / len(orders)))
+    shop.mock.reset_stats()
+    output = shop.run('shopify-orders', properties='id,created_at')
+    assert len(get_window_requests(shop)) <= 8
+    assert len(output.splitlines()) == len(orders)
+
+def test_id_window_requests(shop, shards, monkeypatch):
+    # like the api's, the ids of the customers are large and spread over a range on the
+    # order of the ids
+    customers = shop.mock.data['customers']
+    for i, customer in enumerate(customers):
+        customer['id'] = 5 * 10 ** 12 + i * 8 * 10 ** 9 + i % 7
+    shop.mock.reset_stats()
+    output = shop.run('shopify-customers', properties='id,email')
+    assert len(get_window_requests(shop)) <= 12
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 1)
+    assert output == shop.run('shopify-customers', properties='id,email')
+
+def test_uneven_created_at(shop, shards, monkeypatch):
+    # most of the orders are created within a minute; the windows are still complete
+    orders = shop.mock.data['orders']
+    for i, order in enumerate(orders):
+        seconds = i if i < 600 else 86400 * i
+        order['created_at'] = mock_shopify.get_timestamp(seconds)
+    output = shop.run('shopify-orders', properties='id,created_at')
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 1)
+    assert sorted(output.splitlines()) == sorted(shop.run('shopify-orders', properties='id,created_at').splitlines())
+
+def test_sparse_ids(shop, shards, monkeypatch):
+    customers = shop.mock.data['customers']
+    for i, customer in enumerate(customers):
+        customer['id'] = 10 ** 9 + i * i * 1000
+    output = shop.run('shopify-customers', properties='id,email')
+    assert len(output.splitlines()) == len(customers)
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 1)
+    assert output == shop.run('shopify-customers', properties='id,email')
+
+def test_created_at_windows_are_even(shop, shards):
+    shop.run('shopify-orders', properties='id')
+    windows = [path for path in shop.mock.paths if 'created_at_min' in path and 'count.json' not in path]
+    assert len(windows) == 4
+    query = [dict(p.split('=', 1) for p in path.split('?')[1].split('&')) for path in windows]
+    counts = [len([o for o in shop.mock.data['orders'] if within(o['created_at'], q)]) for q in query]
+    assert sum(counts) == len(shop.mock.data['orders'])
+    assert max(counts) - min(counts) <= len(shop.mock.data['orders']) / 4 / 4
+
+def within(created_at, query):
+    t = datetime.fromisoformat(created_at)
+    lo = datetime.fromisoformat(unquote(query['created_at_min']))
+    hi = datetime.fromisoformat(unquote(query['created_at_max'])) if 'created_at_max' in query else t + timedelta(seconds=1)
+    return lo <= t <= hi
+
+def test_small_stores_are_not_sharded(shop, monkeypatch):
+    # the count is fewer than SHARD_MIN_COUNT records, so a single stream is paged after it
+    monkeypatch.setattr(settings, 'SHARD_COUNT', 4)
+    for name in ['shopify-orders', 'shopify-customers']:
+        shop.mock.reset_stats()
+        shop.run(name)
+        paths = shop.mock.paths
+        assert 'count.json' in paths[0]
+        assert len(get_window_requests(shop)) == 1
+        assert not any('since_id' in path or 'created_at_min' in path for path in paths)
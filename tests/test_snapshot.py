@@ -0,0 +1,32 @@
+# incremental sync keeps a snapshot of each shop's records for each access token
+
+from shopify_core import settings
+
+def test_snapshot_matches_full_output(shop, monkeypatch):
+    expected = shop.run('shopify-orders')
+    monkeypatch.setattr(settings, 'INCREMENTAL_SYNC', True)
+    assert shop.run('shopify-orders') == expected
+    shop.mock.reset_stats()
+    assert shop.run('shopify-orders') == expected
+    assert all('updated_at_min' in path for path in shop.mock.paths)
+
+def test_snapshot_is_kept_for_each_token(shop, monkeypatch):
+    monkeypatch.setattr(settings, 'INCREMENTAL_SYNC', True)
+    expected = shop.run('shopify-orders', access_token='a')
+
+    # another token doesn't read the first token's snapshot, but builds its own
+    shop.mock.reset_stats()
+    assert shop.run('shopify-orders', access_token='b') == expected
+    assert not any('updated_at_min' in path for path in shop.mock.paths)
+
+    shop.mock.reset_stats()
+    assert shop.run('shopify-orders', access_token='a') == expected
+    assert all('updated_at_min' in path for path in shop.mock.paths)
+
+def test_snapshot_merges_updates(shop, monkeypatch):
+    monkeypatch.setattr(settings, 'INCREMENTAL_SYNC', True)
+    shop.run('shopify-orders')
+    shop.mock.data['orders'][10]['updated_at'] = '2100-01-01T00:00:00-05:00'
+    output = shop.run('shopify-orders')
+    assert '"2100-01-01T00:00:00-05:00"' in output
+    assert output == shop.run('shopify-orders', access_token='other')